@@ -0,0 +1,267 @@
+"""CurrInfo host Soft IOC, serving several applications in one process.
+
+The applications share the Channel Access context, so PVs used by more
+than one of them, like the DCCT and timing ones, are connected only once,
+and their PVs are served by a single server. The process loop of each
+application runs in its own thread, because the LI and TS ones block on
+their oscilloscopes. CPU time spent by each application in its process
+loop, reads, writes and PV callbacks is published in CPU usage PVs.
+"""
+
+import functools as _functools
+import logging as _log
+import os as _os
+import signal as _signal
+import sys as _sys
+from threading import Event as _Event, Lock as _Lock, Thread as _Thread
+import time as _time
+
+from epics import PV as _PV
+import pcaspy as _pcaspy
+import pcaspy.tools as _pcaspy_tools
+from siriuspy import util as _util
+from siriuspy.currinfo import BOCurrInfoApp as _BOCurrInfoApp, \
+    LICurrInfoApp as _LICurrInfoApp, SICurrInfoApp as _SICurrInfoApp, \
+    TSCurrInfoApp as _TSCurrInfoApp
+from siriuspy.envars import VACA_PREFIX as _VACA_PREFIX
+
+from .as_ap_currinfo import INTERVAL as _INTERVAL
+from .lifetime.lifetime import INTERVAL as _LT_INTERVAL
+from .lifetime.main import LifetimeApp as _LifetimeApp
+
+# application class, prefix of its PVs, version PV and process interval
+APPS = {
+    'bo': (_BOCurrInfoApp, 'BO-Glob:AP-CurrInfo:', 'Version-Cte', _INTERVAL),
+    'si': (
+        _SICurrInfoApp, '', 'SI-Glob:AP-CurrInfo:Version-Cte', _INTERVAL),
+    'li': (
+        _LICurrInfoApp, '', 'LI-Glob:AP-CurrInfo:Version-Cte', _INTERVAL),
+    'ts': (
+        _TSCurrInfoApp, '', 'TS-Glob:AP-CurrInfo:Version-Cte', _INTERVAL),
+    'lifetime': (
+        _LifetimeApp, 'SI-Glob:AP-CurrInfo:', 'VersionLifetime-Cte',
+        _LT_INTERVAL),
+}
+CPU_PREFIX = 'AS-Glob:AP-CurrInfo:CPUUsage'
+# interval between publications of the CPU usage [s]
+CPU_INTERVAL = 5.0
+STOP_EVENT = _Event()
+
+
+def _stop_now(signum, frame):
+    _ = frame
+    sname = _signal.Signals(signum).name
+    tstamp = _util.get_timestamp()
+    strf = f'{sname} received at {tstamp}'
+    _log.warning(strf)
+    _sys.stdout.flush()
+    _sys.stderr.flush()
+    STOP_EVENT.set()
+
+
+def _attribute_access_security_group(server, dbase):
+    for k, val in dbase.items():
+        if k.endswith(('-RB', '-Sts', '-Cte', '-Mon')):
+            val.update({'asg': 'rbpv'})
+    path_ = _os.path.abspath(_os.path.dirname(__file__))
+    server.initAccessSecurityFile(path_ + '/access_rules.as')
+
+
+def get_cpu_pvname(name):
+    """Return name of the CPU usage PV of an application."""
+    name = 'Lifetime' if name == 'lifetime' else name.upper()
+    return CPU_PREFIX + name + '-Mon'
+
+
+def get_database(names):
+    """Return database of the CPU usage PVs of the applications."""
+    return {
+        get_cpu_pvname(name): {
+            'type': 'float', 'prec': 2, 'unit': '%', 'value': 0.0}
+        for name in names}
+
+
+class _AppRunner:
+    """Application of the host with its process loop and CPU accounting."""
+
+    def __init__(self, name, app, prefix, interval, dbase):
+        self.name = name
+        self.app = app
+        self.prefix = prefix
+        self.interval = interval
+        self.dbase = dbase
+        self._lock = _Lock()
+        self._cpu_time = 0.0
+        self._last = (0.0, _time.monotonic())
+        self.read = self.account(app.read)
+        self.write = self.account(app.write)
+        self._process = self.account(app.process)
+        self._thread = _Thread(
+            target=self._run, name='CurrInfo' + name.upper(), daemon=True)
+
+    def account(self, fun):
+        """Return function that adds its CPU time to the application."""
+        @_functools.wraps(fun)
+        def _wrapper(*args, **kwargs):
+            tini = _time.thread_time()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                dtim = _time.thread_time() - tini
+                with self._lock:
+                    self._cpu_time += dtim
+        return _wrapper
+
+    def account_pv_callbacks(self):
+        """Account CPU time of the callbacks of the application PVs."""
+        for obj in vars(self.app).values():
+            if not isinstance(obj, _PV):
+                continue
+            for idx, (fun, kws) in list(obj.callbacks.items()):
+                obj.callbacks[idx] = (self.account(fun), kws)
+
+    def get_cpu_usage(self):
+        """Return CPU usage since last call, in [%] of one CPU."""
+        now = _time.monotonic()
+        with self._lock:
+            cpu_time = self._cpu_time
+        last_cpu, last_time = self._last
+        self._last = (cpu_time, now)
+        if now <= last_time:
+            return 0.0
+        return 100 * (cpu_time - last_cpu) / (now - last_time)
+
+    def start(self):
+        """Start process loop."""
+        self._thread.start()
+
+    def join(self):
+        """Wait for process loop to stop."""
+        self._thread.join()
+
+    def _run(self):
+        while not STOP_EVENT.is_set():
+            self._process(self.interval)
+
+
+class _PCASDriver(_pcaspy.Driver):
+
+    def __init__(self, runners):
+        """Initialize driver."""
+        super().__init__()
+        self._runners = dict()
+        for runner in runners:
+            for reason in runner.dbase:
+                self._runners[runner.prefix + reason] = (runner, reason)
+            runner.app.add_callback(self.update_pv, prefix=runner.prefix)
+
+    def read(self, reason):
+        """Read IOC pvs according to main application."""
+        runner, app_reason = self._runners.get(reason, (None, None))
+        value = None if runner is None else runner.read(app_reason)
+        if value is None:
+            return super().read(reason)
+        else:
+            return value
+
+    def write(self, reason, value):
+        """Write IOC pvs according to main application."""
+        runner, app_reason = self._runners.get(reason, (None, None))
+        if runner is None:
+            return False
+        ret_val = runner.write(app_reason, value)
+        if reason.endswith('-Cmd'):
+            value = self.getParam(reason) + 1
+        if ret_val:
+            return super().write(reason, value)
+        return False
+
+    def update_pv(self, pvname, value, prefix='', **kwargs):
+        """Update PV."""
+        _ = kwargs
+        self.setParam(prefix + pvname, value)
+        self.updatePV(prefix + pvname)
+
+
+def run(names=tuple(APPS)):
+    """Main module function.
+
+    names are the keys of APPS of the applications to host.
+    """
+    names = [name.lower() for name in names]
+
+    # define abort function
+    _signal.signal(_signal.SIGINT, _stop_now)
+    _signal.signal(_signal.SIGTERM, _stop_now)
+
+    # configure log file
+    _util.configure_log_file()
+    _log.info('Starting...')
+
+    # define IOC, init pvs database and create app objects
+    _version = _util.get_last_commit_hash()
+    _ioc_prefix = _VACA_PREFIX + ('-' if _VACA_PREFIX else '')
+    runners = list()
+    dbase = dict()
+    for name in names:
+        if name not in APPS:
+            raise ValueError('There is no App defined for '+name+'.')
+        app_class, prefix, version_pv, interval = APPS[name]
+        _log.debug('Creating App Object %s.', name)
+        app = app_class()
+        app_dbase = app.pvs_database
+        app_dbase[version_pv]['value'] = _version
+        runners.append(_AppRunner(name, app, prefix, interval, app_dbase))
+        dbase.update({prefix + k: val for k, val in app_dbase.items()})
+    dbase.update(get_database(names))
+
+    # check if another IOC is running
+    for runner in runners:
+        pvname = _ioc_prefix + runner.prefix + next(iter(runner.dbase))
+        if _util.check_pv_online(pvname, use_prefix=False):
+            raise ValueError(
+                'Another instance of '+runner.name+' IOC is already running!')
+
+    _util.print_ioc_banner(
+        ioc_name='as-ap-currinfo-host',
+        db=dbase,
+        description='AS-AP-CurrInfo Host Soft IOC ('+', '.join(names)+')',
+        version=_version,
+        prefix=_ioc_prefix)
+
+    # create a new simple pcaspy server and driver to respond client's requests
+    _log.info('Creating Server.')
+    server = _pcaspy.SimpleServer()
+    _attribute_access_security_group(server, dbase)
+    _log.info('Setting Server Database.')
+    server.createPV(_ioc_prefix, dbase)
+    _log.info('Creating Driver.')
+    driver = _PCASDriver(runners)
+    for runner in runners:
+        runner.app.init_database()
+        runner.account_pv_callbacks()
+
+    # initiate a new thread responsible for listening for client connections
+    server_thread = _pcaspy_tools.ServerThread(server)
+    _log.info('Starting Server Thread.')
+    server_thread.start()
+    for runner in runners:
+        runner.start()
+
+    # main loop
+    while not STOP_EVENT.wait(CPU_INTERVAL):
+        for runner in runners:
+            driver.setParam(
+                get_cpu_pvname(runner.name), runner.get_cpu_usage())
+        driver.updatePVs()
+
+    for runner in runners:
+        runner.join()
+        if hasattr(runner.app, 'close'):
+            runner.app.close()
+    _log.info('Stoping Server Thread...')
+    # send stop signal to server thread
+    server_thread.stop()
+    server_thread.join()
+    _log.info('Server Thread stopped.')
+    _log.info('Good Bye.')
@@ -1,3 +1,3 @@
 """AS-AP-CurrentInfo-Lifetime subpackage."""
 
-__all__ = ('lifetime', )
+__all__ = ('lifetime', 'main', 'sample_buffer')
@@ -8,9 +8,10 @@ import sys as _sys
 import pcaspy as _pcaspy
 import pcaspy.tools as _pcaspy_tools
 from siriuspy import util as _util
-from siriuspy.currinfo import SILifetimeApp as _SILifetimeApp
 from siriuspy.envars import VACA_PREFIX as _VACA_PREFIX
 
+from .main import LifetimeApp as _LifetimeApp
+
 INTERVAL = 0.1
 STOP_EVENT = False
 
@@ -80,7 +81,7 @@ def run():
     _version = _util.get_last_commit_hash()
     _ioc_prefix = _VACA_PREFIX + ('-' if _VACA_PREFIX else '')
     _ioc_prefix += 'SI-Glob:AP-CurrInfo:'
-    app = _SILifetimeApp()
+    app = _LifetimeApp()
     dbase = app.pvs_database
     dbase['VersionLifetime-Cte']['value'] = _version
 
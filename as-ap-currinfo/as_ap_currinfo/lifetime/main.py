@@ -0,0 +1,132 @@
+"""Lifetime application with ring buffers and sliding window fits.
+
+DCCT and BPM sum samples are kept in sample_buffer.SampleBuffer objects and
+the lifetime is updated for each sample at O(1) cost, instead of fitting
+the whole window at each read of the lifetime PVs. The window is the one of
+the SILifetimeApp, defined by the MaxSplIntvl, FrstSplTime and LastSplTime
+PVs.
+"""
+
+from threading import Lock as _Lock
+import time as _time
+
+from siriuspy.currinfo import SILifetimeApp as _SILifetimeApp
+from siriuspy.currinfo.csdev import Const as _Const
+
+from .sample_buffer import SampleBuffer as _SampleBuffer
+
+# same sizes as the ones of SILifetimeApp
+BUFFER_SIZE = 36000
+MIN_NR_SAMPLES = 100
+
+
+class LifetimeApp(_SILifetimeApp):
+    """Lifetime application with O(1) update per sample."""
+
+    def __init__(self):
+        """Init."""
+        # the parent init connects the callbacks of the samples
+        self._lock = _Lock()
+        tref = _time.time()
+        self._buffers = {
+            False: _SampleBuffer(BUFFER_SIZE, tref),
+            True: _SampleBuffer(BUFFER_SIZE, tref)}
+        super().__init__()
+        with self._lock:
+            self._set_fit()
+
+    def read(self, reason):
+        """Read from IOC database."""
+        if reason not in ('Lifetime-Mon', 'LifetimeBPM-Mon'):
+            return None
+        is_bpm = 'BPM' in reason
+        lt_type = 'BPM' if is_bpm else ''
+        suffix = '_bpm' if is_bpm else '_dcct'
+        buf = self._buffers[is_bpm]
+        now = _time.time()
+        with self._lock:
+            self._update_times(now)
+            first, last = self._get_window(now, is_bpm)
+            buf.set_window(first, last)
+            tstamps, values = buf.get_window()
+            if tstamps.size:
+                if first != tstamps[0]:
+                    setattr(self, '_frst_smpl_ts' + suffix, tstamps[0])
+                    self.run_callbacks('FrstSplTime'+lt_type+'-RB', tstamps[0])
+                setattr(self, '_smpl_intvl_mon' + suffix, last - first)
+                self.run_callbacks('SplIntvl'+lt_type+'-Mon', last - first)
+            values -= self._current_offset
+            self.run_callbacks('BufferValue'+lt_type+'-Mon', values)
+            self.run_callbacks('BufferTimestamp'+lt_type+'-Mon', tstamps - now)
+            self.run_callbacks('BuffSize'+lt_type+'-Mon', tstamps.size)
+            self.run_callbacks('BuffSizeTot'+lt_type+'-Mon', buf.size)
+            if buf.nr_samples <= MIN_NR_SAMPLES:
+                return None
+            return self._lifetime_bpm if is_bpm else self._lifetime
+
+    def write(self, reason, value):
+        """Write value to reason and let callback update PV database."""
+        with self._lock:
+            status = super().write(reason, value)
+            if status and reason in ('LtFitMode-Sel', 'CurrOffset-SP'):
+                self._set_fit()
+        return status
+
+    # ---------- callbacks ----------
+
+    def _callback_calclifetime(self, pvname, value, **kws):
+        _ = kws
+        with self._lock:
+            # check DCCT StoredEBeam PV
+            if not self._is_stored:
+                self._buffautorst_check()
+                return
+            if value is None:
+                return
+
+            is_bpm = 'BPM' in pvname
+            buf = self._buffers[is_bpm]
+            now = _time.time()
+            last = buf.last_timestamp
+            if last is not None and now - last < self._min_intvl_btw_spl:
+                return
+            buf.append(now, value)
+
+            # check whether the buffer must be reset
+            self._buffautorst_check()
+
+            buf.set_window(*self._get_window(now, is_bpm))
+            if buf.nr_samples <= MIN_NR_SAMPLES:
+                return
+            lifetime = buf.fit(now)
+            lt_type = 'BPM' if is_bpm else ''
+            setattr(self, '_lifetime' + ('_bpm' if is_bpm else ''), lifetime)
+            self.run_callbacks('Lifetime'+lt_type+'-Mon', lifetime)
+            self.run_callbacks('Lifetime'+lt_type+'Hour-Mon', lifetime / 3600)
+
+    # ---------- auxiliar methods ----------
+
+    def _buffautorst_check(self):
+        if self._buffautorst_mode == _Const.BuffAutoRst.Off:
+            return
+        value = self._buffers[False].get_last_values(2)
+        if value.size < 2:
+            return
+        if abs(value[-1] - value[-2]) > self._buffautorst_dcurr:
+            self._reset_buff()
+
+    def _get_window(self, now, is_bpm):
+        """Return first and last sample times, like _update_times."""
+        suffix = '_bpm' if is_bpm else '_dcct'
+        first = getattr(self, '_frst_smpl_ts' + suffix)
+        last = getattr(self, '_last_smpl_ts' + suffix)
+        if self._last_ts_set == 'last' and self._sampling_interval != -1:
+            ref = now if self._last_smpl_ts == -1 else self._last_smpl_ts
+            first = max(first, ref - self._sampling_interval)
+        last = now if last == -1 else min(last, now)
+        return first, last
+
+    def _set_fit(self):
+        exponential = self._mode == _Const.Fit.Exponential
+        for buf in self._buffers.values():
+            buf.set_fit(exponential, self._current_offset)
@@ -0,0 +1,210 @@
+"""Sample ring buffer with a sliding window least squares fit.
+
+Samples are kept in preallocated numpy arrays. The mean values and the
+co-moments of time and fitted value over the window are updated for each
+sample entering or leaving it, so the fit costs O(1) per sample whatever
+the window length. They are recalculated from the buffer, vectorized, when
+the window moves backwards, when the fit changes and periodically, to
+bound rounding errors.
+"""
+
+import numpy as _np
+
+
+class SampleBuffer:
+    """Ring buffer of samples with a sliding window fit."""
+
+    def __init__(self, size, tref=0.0):
+        """Init.
+
+        size is the maximum number of samples of the buffer and tref the
+        time reference of the fit, to keep it well conditioned.
+        """
+        self._size = size
+        self._tref = tref
+        self._tstamps = _np.zeros(size, dtype=float)
+        self._values = _np.zeros(size, dtype=float)
+        # values of the fit, nan if invalid
+        self._fitvals = _np.zeros(size, dtype=float)
+        self._exp = False
+        self._offset = 0.0
+        # indices of samples ever acquired, position in buffer is idx % size
+        self._count = 0
+        self._first = 0
+        self._last = 0
+        self._nr_updates = 0
+        self._reset_stats()
+
+    @property
+    def size(self):
+        """Number of samples in the buffer."""
+        return min(self._count, self._size)
+
+    @property
+    def nr_samples(self):
+        """Number of samples in the window."""
+        return self._last - self._first
+
+    @property
+    def last_timestamp(self):
+        """Timestamp of last sample, None if empty."""
+        if not self._count:
+            return None
+        return self._tstamps[(self._count - 1) % self._size]
+
+    def get_last_values(self, nr_values):
+        """Return last values of the buffer, older first."""
+        idcs = _np.arange(max(self._count - nr_values, 0), self._count)
+        return self._values[idcs % self._size]
+
+    def get_window(self):
+        """Return timestamps and values of the samples in the window."""
+        idcs = _np.arange(self._first, self._last) % self._size
+        return self._tstamps[idcs], self._values[idcs]
+
+    def set_fit(self, exponential, offset=0.0):
+        """Define fit of the values subtracted of offset."""
+        self._exp = bool(exponential)
+        self._offset = offset
+        size = self.size
+        self._fitvals[:size] = self._calc_fitvals(self._values[:size])
+        self._recalc()
+
+    def append(self, tstamp, value):
+        """Append sample, it enters the window with set_window."""
+        # oldest sample leaves the window before being overwritten
+        if self._count - self._first >= self._size:
+            if self._first < self._last:
+                self._remove(self._first)
+            self._first += 1
+            self._last = max(self._last, self._first)
+        pos = self._count % self._size
+        self._tstamps[pos] = tstamp
+        self._values[pos] = value
+        self._fitvals[pos] = self._calc_fitvals(_np.array([value]))[0]
+        self._count += 1
+
+    def set_window(self, first, last):
+        """Define window by the timestamps of its first and last samples."""
+        oldest = max(self._count - self._size, 0)
+        tstamps = self._tstamps
+        size = self._size
+        moved_back = (
+            (self._first > oldest and tstamps[(self._first-1) % size] >= first)
+            or (self._last > self._first and
+                tstamps[(self._last-1) % size] > last))
+        if moved_back:
+            self._first, self._last = self._search(first, last)
+            self._recalc()
+            return
+
+        while self._last < self._count and tstamps[self._last % size] <= last:
+            self._add(self._last)
+            self._last += 1
+        while self._first < self._last and tstamps[self._first % size] < first:
+            self._remove(self._first)
+            self._first += 1
+        if self._first == self._last:
+            # window is empty, skip samples before it
+            self._first = self._last = self._search(first, last)[0]
+            self._reset_stats()
+        elif self._nr_updates > size:
+            self._recalc()
+
+    def fit(self, now):
+        """Return lifetime of the fit of the window, 0 if invalid.
+
+        In linear fits the lifetime is the time to zero from now.
+        """
+        if self._nr_invalid or self._nr_valid < 2 or not self._ctt:
+            return 0.0
+        slope = self._cty / self._ctt
+        if not slope:
+            return 0.0
+        if self._exp:
+            return -1 / slope
+        value = self._mean_y + slope * (now - self._tref - self._mean_t)
+        return -value / slope
+
+    # ---------- auxiliar methods ----------
+
+    def _calc_fitvals(self, values):
+        values = values - self._offset
+        if not self._exp:
+            return values
+        fitvals = _np.full(values.size, _np.nan)
+        idcs = values > 0
+        fitvals[idcs] = _np.log(values[idcs])
+        return fitvals
+
+    def _search(self, first, last):
+        """Return indices of the window by a search in the buffer."""
+        oldest = max(self._count - self._size, 0)
+        idcs = _np.arange(oldest, self._count)
+        tstamps = self._tstamps[idcs % self._size]
+        ini = oldest + _np.searchsorted(tstamps, first, side='left')
+        fin = oldest + _np.searchsorted(tstamps, last, side='right')
+        return int(ini), int(max(ini, fin))
+
+    def _reset_stats(self):
+        self._nr_valid = 0
+        self._nr_invalid = 0
+        self._mean_t = 0.0
+        self._mean_y = 0.0
+        self._ctt = 0.0
+        self._cty = 0.0
+        self._nr_updates = 0
+
+    def _recalc(self):
+        self._reset_stats()
+        idcs = _np.arange(self._first, self._last) % self._size
+        fitvals = self._fitvals[idcs]
+        valid = ~_np.isnan(fitvals)
+        self._nr_invalid = int(valid.size - _np.count_nonzero(valid))
+        tstamps = self._tstamps[idcs][valid] - self._tref
+        fitvals = fitvals[valid]
+        self._nr_valid = tstamps.size
+        if not tstamps.size:
+            return
+        self._mean_t = tstamps.mean()
+        self._mean_y = fitvals.mean()
+        dtt = tstamps - self._mean_t
+        self._ctt = _np.dot(dtt, dtt)
+        self._cty = _np.dot(dtt, fitvals - self._mean_y)
+
+    def _add(self, idx):
+        pos = idx % self._size
+        yval = self._fitvals[pos]
+        self._nr_updates += 1
+        if _np.isnan(yval):
+            self._nr_invalid += 1
+            return
+        tval = self._tstamps[pos] - self._tref
+        self._nr_valid += 1
+        dtt = tval - self._mean_t
+        self._mean_t += dtt / self._nr_valid
+        self._mean_y += (yval - self._mean_y) / self._nr_valid
+        self._ctt += dtt * (tval - self._mean_t)
+        self._cty += dtt * (yval - self._mean_y)
+
+    def _remove(self, idx):
+        pos = idx % self._size
+        yval = self._fitvals[pos]
+        self._nr_updates += 1
+        if _np.isnan(yval):
+            self._nr_invalid -= 1
+            return
+        if self._nr_valid == 1:
+            nr_invalid = self._nr_invalid
+            self._reset_stats()
+            self._nr_invalid = nr_invalid
+            return
+        tval = self._tstamps[pos] - self._tref
+        nrv = self._nr_valid
+        mean_t = (nrv * self._mean_t - tval) / (nrv - 1)
+        mean_y = (nrv * self._mean_y - yval) / (nrv - 1)
+        self._ctt -= (tval - mean_t) * (tval - self._mean_t)
+        self._cty -= (tval - mean_t) * (yval - self._mean_y)
+        self._nr_valid -= 1
+        self._mean_t = mean_t
+        self._mean_y = mean_y
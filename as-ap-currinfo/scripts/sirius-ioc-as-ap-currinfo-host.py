@@ -0,0 +1,16 @@
+#!/usr/bin/env python-sirius
+"""AS-AP-CurrentInfo host IOC executable."""
+
+import argparse as _argparse
+
+from as_ap_currinfo import host as ioc_module
+
+parser = _argparse.ArgumentParser(
+    description="Run several CurrInfo IOCs in one process.")
+parser.add_argument(
+    'apps', type=str, nargs='*', default=list(ioc_module.APPS),
+    choices=sorted(ioc_module.APPS),
+    help="Applications to host. (all)")
+
+args = parser.parse_args()
+ioc_module.run(args.apps)
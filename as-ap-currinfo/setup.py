@@ -28,6 +28,7 @@ setup(
         'scripts/sirius-ioc-bo-ap-currinfo.py',
         'scripts/sirius-ioc-si-ap-currinfo.py',
         'scripts/sirius-ioc-si-ap-currinfo-lifetime.py',
+        'scripts/sirius-ioc-as-ap-currinfo-host.py',
         ],
     zip_safe=False
 )
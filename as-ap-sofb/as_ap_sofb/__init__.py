@@ -1,5 +1,9 @@
-from .as_ap_sofb import run
+def run(*args, **kwargs):
+    """Start the IOC."""
+    # imported on call, so that the BLAS settings of the launchers are
+    # applied before the IOC module imports numpy
+    from .as_ap_sofb import run as _run
+    return _run(*args, **kwargs)
 
-del as_ap_sofb
 
 __all__ = ('as_ap_sofb')
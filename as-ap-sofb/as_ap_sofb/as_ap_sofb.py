@@ -4,16 +4,20 @@
 import logging as _log
 import os as _os
 import signal as _signal
+from threading import Lock as _Lock
+import time as _time
 
-import numpy as _np
 import pcaspy as _pcaspy
 import pcaspy.tools as _pcaspy_tools
 import siriuspy.util as _util
 from siriuspy import csdev as _csdev
 from siriuspy.envars import VACA_PREFIX as _VACA_PREFIX
-from siriuspy.sofb import EpicsCorrectors as _EpicsCorrectors, \
-    EpicsMatrix as _EpicsMatrix, EpicsOrbit as _EpicsOrbit, SOFB as _SOFB
-from siriuspy.thread import LoopQueueThread as _LoopQueueThread
+from siriuspy.sofb import EpicsOrbit as _EpicsOrbit, SOFB as _SOFB
+
+from . import corrector_batch as _corrector_batch, \
+    matrix_cache as _matrix_cache, orbit_buffer as _orbit_buffer, \
+    profiling as _profiling, tuning as _tuning, write_lanes as _write_lanes, \
+    write_log as _write_log
 
 stop_event = False
 __version__ = _util.get_last_commit_hash()
@@ -38,8 +42,19 @@ class _PCASDriver(_pcaspy.Driver):
 
     def __init__(self, app):
         super().__init__()
-        self._write_queue = _LoopQueueThread(is_cathread=True)
-        self._write_queue.start()
+        # configuration and bulk writes change state shared by the SOFB
+        # objects, like enable lists and response matrix, so they are
+        # executed one at a time, as before the lanes.
+        self._conf_lock = _Lock()
+        self._lanes = {
+            lane: _write_lanes.WriteLane(
+                lane, _write_lanes.LANE_SIZES[lane],
+                self._write if lane == 'Ctrl' else self._write_conf,
+                callback=self._update_lane_pvs)
+            for lane in _write_lanes.LANES}
+        self._reason_lanes = dict()
+        self._write_log = _write_log.WriteLogger()
+        self._write_handlers = dict()
         self.app = app
         self.app.add_callback(self.update_pv)
 
@@ -51,30 +66,58 @@ class _PCASDriver(_pcaspy.Driver):
     def write(self, reason, value):
         if not self._is_valid(reason, value):
             return False
-        self._write_queue.put(
-            (self._write, (reason, value)), block=False)
+        lane = self._lanes[self._get_lane(reason)]
+        # commands are never superseded, every one of them is executed
+        if not lane.put(reason, value, supersede=not reason.endswith('-Cmd')):
+            _log.warning(
+                'NO write %s: %s write lane is full', reason, lane.name)
+            return False
         return True
 
+    def _get_lane(self, reason):
+        lane = self._reason_lanes.get(reason)
+        if lane is not None:
+            return lane
+        if reason.startswith(_write_lanes.CTRL_PREFIXES):
+            lane = 'Ctrl'
+        elif self.getParamInfo(reason, info_keys=('count', ))['count'] > 1:
+            lane = 'Bulk'
+        else:
+            lane = 'Conf'
+        self._reason_lanes[reason] = lane
+        return lane
+
+    def _update_lane_pvs(self, lane):
+        self.update_pv(f'WriteLatency{lane.name}-Mon', lane.histogram)
+        self.update_pv(f'WriteQueue{lane.name}-Mon', lane.size)
+
+    def add_write_handler(self, reason, handler):
+        """Handle writes of reason with handler instead of the app."""
+        self._write_handlers[reason] = handler
+
+    def shutdown(self):
+        """Stop write lanes."""
+        for lane in self._lanes.values():
+            lane.stop()
+
+    def _write_conf(self, reason, value):
+        with self._conf_lock:
+            self._write(reason, value)
+
     def _write(self, reason, value):
-        ret_val = self.app.write(reason, value)
+        tini = _time.perf_counter()
+        handler = self._write_handlers.get(reason)
+        if handler is not None:
+            ret_val = handler(value)
+        else:
+            ret_val = self.app.write(reason, value)
+        duration = _time.perf_counter() - tini
         oldval = self.getParam(reason)
         if reason.endswith('-Cmd'):
             value = oldval + 1
 
-        if isinstance(value, (_np.ndarray, list, tuple)):
-            pval = f'{value[0]}...{value[-1]}'
-        else:
-            pval = f'{value}'
-        if isinstance(oldval, (_np.ndarray, list, tuple)):
-            opval = f'{oldval[0]}...{oldval[-1]}'
-        else:
-            opval = f'{oldval}'
-
-        if ret_val:
-            _log.info('YES Write %s: %s', reason, pval)
-        else:
-            _log.warning(
-                'NO write %s: %s current value is %s', reason, opval, pval)
+        self._write_log.log(reason, ret_val, value, oldval, duration)
+        if not ret_val:
             value = oldval
         self.setParam(reason, value)
         self.updatePV(reason)
@@ -85,6 +128,12 @@ class _PCASDriver(_pcaspy.Driver):
             self.setParamInfo(pvname, kwargs)
         self.updatePV(pvname)
 
+    def update_pvs(self, values):
+        """Update several PVs, posting them at once."""
+        for pvname, value in values.items():
+            self.setParam(pvname, value)
+        self.updatePVs()
+
     def _is_valid(self, reason, val):
         if reason.endswith(('-Sts', '-RB', '-Mon', '-Cte')):
             strf = f'PV {reason:s} is read only.'
@@ -101,8 +150,16 @@ class _PCASDriver(_pcaspy.Driver):
         return True
 
 
-def run(acc='SI', debug=False, tests=False):
-    """Start the IOC."""
+def run(
+        acc='SI', debug=False, tests=False, orbit_buffer=None,
+        loop_cpus=None):
+    """Start the IOC.
+
+    If orbit_buffer is not None, the averaged orbit is also published in a
+    shared memory ring buffer file, at its default path if orbit_buffer is
+    an empty string. If loop_cpus is given, the correction loop thread is
+    pinned to these CPUs.
+    """
     _util.configure_log_file(debug=debug)
     _log.info('Starting...')
 
@@ -115,6 +172,8 @@ def run(acc='SI', debug=False, tests=False):
     app = _SOFB(acc=acc, tests=tests)
     db = app.csorb.get_ioc_database()
     db.update({'Version-Cte': {'type': 'string', 'value': __version__}})
+    db.update(_write_lanes.get_database())
+    db.update(_profiling.get_database())
     ioc_prefix = _VACA_PREFIX + ('-' if _VACA_PREFIX else '')
     ioc_prefix += acc.upper() + '-Glob:AP-SOFB:'
     ioc_name = acc.lower() + '-ap-sofb'
@@ -145,13 +204,33 @@ def run(acc='SI', debug=False, tests=False):
     _log.info('Starting Server Thread.')
     server_thread.start()
 
-    app.orbit = _EpicsOrbit(
-        acc=app.acc, prefix=app.prefix, callback=driver.update_pv)
-    app.correctors = _EpicsCorrectors(
-        acc=app.acc, prefix=app.prefix, callback=driver.update_pv)
-    app.matrix = _EpicsMatrix(
+    if orbit_buffer is not None:
+        path = orbit_buffer or _orbit_buffer.default_path(ioc_name)
+        ring = _orbit_buffer.OrbitRingWriter(path, app.csorb.nr_bpms)
+        _log.info('Publishing orbit in %s.', path)
+        app.orbit = _orbit_buffer.BufferedOrbit(
+            acc=app.acc, prefix=app.prefix, callback=driver.update_pv,
+            ring=ring)
+    else:
+        app.orbit = _EpicsOrbit(
+            acc=app.acc, prefix=app.prefix, callback=driver.update_pv)
+    app.correctors = _corrector_batch.BatchedCorrectors(
+        acc=app.acc, prefix=app.prefix, callback=driver.update_pv,
+        update_pvs=driver.update_pvs)
+    app.matrix = _matrix_cache.CachedMatrix(
         acc=app.acc, prefix=app.prefix, callback=driver.update_pv)
 
+    # instrument the correction loop stages
+    timers = _profiling.StageTimers()
+    timers.instrument(app)
+    profiler = _profiling.SamplingProfiler(
+        ioc_name, timers, update_pv=driver.update_pv)
+    driver.add_write_handler('ProfileDuration-SP', profiler.set_duration)
+    driver.add_write_handler('ProfileDump-Cmd', profiler.start)
+    process = timers.timers['Process'].time(app.process)
+    if loop_cpus:
+        _tuning.pin_thread(app, '_do_auto_corr', loop_cpus)
+
     _log.info('Waiting for PVs to connect.')
     app.wait_for_connection(timeout=20)
     _log.info('All PVs connected.')
@@ -160,13 +239,15 @@ def run(acc='SI', debug=False, tests=False):
     _log.info('Done')
     # main loop
     while not stop_event:
-        app.process()
+        process()
+        timers.publish(driver.update_pv)
 
     _log.info('Stoping Server Thread...')
     # sends stop signal to server thread
     server_thread.stop()
     server_thread.join()
     _log.info('Server Thread stopped.')
+    driver.shutdown()
     app.orbit.shutdown()
     app.correctors.shutdown()
     _log.info('Good Bye.')
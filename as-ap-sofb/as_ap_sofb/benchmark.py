@@ -0,0 +1,108 @@
+"""SOFB BLAS threading benchmark.
+
+Measures the response matrix inversion and orbit correction times of a
+matrix of SOFB size for several BLAS thread counts. The BLAS thread count
+is fixed when numpy is loaded, so each count runs in its own process.
+
+Run with:
+    python -m as_ap_sofb.benchmark [--threads 1 2 4 8] [--cpus 0-3]
+"""
+
+import argparse as _argparse
+import json as _json
+import os as _os
+import subprocess as _subprocess
+import sys as _sys
+import time as _time
+
+from . import tuning as _tuning
+
+# number of BPMs and correctors of the SI SOFB
+NR_BPMS = 160
+NR_CORRS = 120 + 160 + 1
+
+
+def _measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        tini = _time.perf_counter()
+        func()
+        times.append(_time.perf_counter() - tini)
+    times.sort()
+    return {
+        'mean': 1000 * sum(times) / len(times), 'min': 1000 * times[0],
+        'p99': 1000 * times[min(len(times) - 1, int(0.99 * len(times)))]}
+
+
+def run_worker(nr_bpms, nr_corrs, repeat):
+    """Measure times in this process and return them [ms]."""
+    import numpy as _np
+
+    rng = _np.random.default_rng(0)
+    mat = rng.normal(size=(2 * nr_bpms, nr_corrs))
+    orb = rng.normal(size=2 * nr_bpms)
+    inv = None
+
+    def invert():
+        nonlocal inv
+        umat, svals, vhmat = _np.linalg.svd(mat, full_matrices=False)
+        inv = vhmat.T @ (umat.T / svals[:, None])
+
+    invert()
+    return {
+        'inversion': _measure(invert, repeat),
+        'correction': _measure(lambda: inv @ orb, 100 * repeat),
+    }
+
+
+def get_args():
+    """Return command line arguments."""
+    parser = _argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--threads', type=int, nargs='+', default=[1, 2, 4, 8],
+        help="BLAS thread counts to measure.")
+    parser.add_argument(
+        '--cpus', type=_tuning.parse_cpus, default=None,
+        help="CPUs of the benchmark processes, like '0-3,6'.")
+    parser.add_argument('--bpms', type=int, default=NR_BPMS)
+    parser.add_argument('--corrs', type=int, default=NR_CORRS)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--worker', action='store_true', help='internal')
+    return parser.parse_args()
+
+
+def main():
+    """Run benchmark."""
+    args = get_args()
+    if args.worker:
+        _tuning.set_thread_affinity(args.cpus)
+        print(_json.dumps(run_worker(args.bpms, args.corrs, args.repeat)))
+        return
+
+    print(
+        f'matrix {2 * args.bpms} x {args.corrs}, times in ms '
+        '(mean / p99 / min)')
+    print(f'{"threads":>7s}  {"inversion":>26s}  {"correction":>26s}')
+    for nthreads in args.threads:
+        env = dict(_os.environ)
+        env.update({var: str(nthreads) for var in _tuning.BLAS_ENVARS})
+        cmd = [
+            _sys.executable, '-m', 'as_ap_sofb.benchmark', '--worker',
+            '--bpms', str(args.bpms), '--corrs', str(args.corrs),
+            '--repeat', str(args.repeat)]
+        if args.cpus:
+            cmd += ['--cpus', ','.join(str(cpu) for cpu in sorted(args.cpus))]
+        out = _subprocess.run(
+            cmd, env=env, capture_output=True, text=True, check=True)
+        res = _json.loads(out.stdout.splitlines()[-1])
+        line = f'{nthreads:7d}'
+        for name in ('inversion', 'correction'):
+            stats = res[name]
+            line += (
+                f'  {stats["mean"]:8.3f} / {stats["p99"]:8.3f} / '
+                f'{stats["min"]:8.3f}')
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Correctors of the SOFB IOC with batched setpoints and readbacks.
+
+Kicks of the orbit correctors are queued in Channel Access and sent with
+a single flush, instead of one flush per setpoint. Readbacks are gathered
+in one pass into an array and compared at once, and the kick PVs of the
+IOC are published with a single driver update.
+"""
+
+import logging as _log
+import time as _time
+import traceback as _traceback
+
+import numpy as _np
+from epics import ca as _ca, dbr as _dbr
+from siriuspy.pwrsupply.csdev import Const as _PSConst
+from siriuspy.sofb import EpicsCorrectors as _EpicsCorrectors, \
+    correctors as _correctors
+from siriuspy.sofb.csdev import ConstTLines as _ConstTLines
+
+
+def _queue_put(pvobj, value):
+    """Queue put of a scalar value, sent by the next CA flush."""
+    ftype = _ca.field_type(pvobj.chid)
+    data = (1 * _dbr.Map[ftype])()
+    data[0] = value
+    _ca.PySEVCHK(
+        'put', _ca.libca.ca_array_put(ftype, 1, pvobj.chid, data))
+
+
+class BatchedCorrectors(_EpicsCorrectors):
+    """Correctors with batched kick application."""
+
+    def __init__(self, *args, update_pvs=None, **kwargs):
+        """Init.
+
+        update_pvs is called with a dictionary of PV names and values to
+        publish them at once.
+        """
+        # the parent init starts the strength update thread
+        self._update_pvs = update_pvs
+        super().__init__(*args, **kwargs)
+
+    def apply_kicks(self, values):
+        """Apply kicks.
+
+        Return values are the ones of EpicsCorrectors.apply_kicks.
+        """
+        if self.acc == "BO":
+            msg = "ERR: Cannot correct Orbit in Booster. Use Ramp Interface!"
+            self._update_log(msg)
+            _log.error(msg[5:])
+            return 0
+
+        strn = '    TIMEIT: {0:20s} - {1:7.3f}'
+        _log.debug('    TIMEIT: BEGIN')
+        time1 = _time.time()
+
+        # Send orbit correctors setpoints at once, then the other ones
+        others = []
+        for corr, value in zip(self._corrs, values):
+            if _np.isnan(value) or not self._is_ready(corr):
+                continue
+            pvobj = self._get_setpoint_pv(corr)
+            if pvobj is None:
+                others.append((corr, value))
+            else:
+                _queue_put(pvobj, value)
+        _ca.flush_io()
+        for corr, value in others:
+            corr.value = value
+        time2 = _time.time()
+        _log.debug(strn.format('send sp:', 1000*(time2-time1)))
+
+        # Wait for readbacks to be updated
+        if _correctors.WAIT_CORRS and self._timed_out(values, mode='ready'):
+            return -1
+        time3 = _time.time()
+        _log.debug(strn.format('check ready:', 1000*(time3-time2)))
+
+        # Send trigger signal for implementation
+        self.send_evt()
+        time4 = _time.time()
+        _log.debug(strn.format('send evt:', 1000*(time4-time3)))
+
+        # Wait for references to be updated
+        if _correctors.WAIT_CORRS:
+            self._timed_out(values, mode='applied')
+        time5 = _time.time()
+        _log.debug(strn.format('check applied:', 1000*(time5-time4)))
+        _log.debug('    TIMEIT: END')
+        return 0
+
+    def get_strength(self):
+        """Get the correctors strengths."""
+        corr_values = self._gather(mode='applied')
+        for idx in _np.nonzero(_np.isnan(corr_values))[0]:
+            msg = "ERR: Failed to get value from "
+            msg += self._corrs[idx].name
+            self._update_log(msg)
+            _log.error(msg[5:])
+        corr_values[_np.isnan(corr_values)] = 0
+        return corr_values
+
+    def _update_corrs_strength(self):
+        if self._update_pvs is None:
+            super()._update_corrs_strength()
+            return
+        try:
+            corr_vals = self.get_strength()
+            nr_ch = self._csorb.nr_ch
+            nr_chcv = self._csorb.nr_chcv
+            pvs = {
+                "KickCH-Mon": corr_vals[:nr_ch],
+                "KickCV-Mon": corr_vals[nr_ch:nr_chcv]}
+            if self.isring and corr_vals[-1] > 0:
+                # NOTE: zero RF frequency means failure to read it.
+                rfv = corr_vals[-1]
+                pvs["KickRF-Mon"] = rfv
+                pvs["OrbLength-Mon"] = (
+                    1 / rfv * self._csorb.harm_number * 299792458)
+            self._update_pvs(pvs)
+        except Exception as err:
+            self._update_log("ERR: " + str(err))
+            _log.error(_traceback.format_exc())
+
+    def _timed_out(self, values, mode="ready"):
+        values = _np.asarray(values, dtype=float)
+        atol = _np.full(values.size, _ConstTLines.TINY_KICK)
+        if self.isring:
+            atol[-1] = _correctors.RFCtrl.TINY_VAR
+        pending = _np.nonzero(~_np.isnan(values))[0]
+        for _ in range(self.NUM_TIMEOUT):
+            vals = self._gather(mode, pending)
+            okg = _np.isclose(
+                values[pending], vals, atol=atol[pending], rtol=0)
+            pending = pending[~okg]
+            if not pending.size:
+                return False
+            _time.sleep(self.TINY_INTERVAL)
+
+        okg = _np.ones(len(self._corrs), dtype=bool)
+        okg[pending] = False
+        self._print_guilty(okg, mode=mode)
+        return True
+
+    def _gather(self, mode, idcs=None):
+        """Return readbacks or references of correctors, nan if missing."""
+        if idcs is None:
+            idcs = range(len(self._corrs))
+        vals = _np.full(len(idcs), _np.nan)
+        for j, idx in enumerate(idcs):
+            corr = self._corrs[idx]
+            pvs = self._get_readback_pvs(corr, mode)
+            if pvs is None:
+                val = corr.value if mode == "ready" else corr.refvalue
+            elif all(pvo.connected for pvo in pvs):
+                val = pvs[-1].value
+            else:
+                val = None
+            if val is not None:
+                vals[j] = val
+        return vals
+
+    def _is_ready(self, corr):
+        if not corr.connected:
+            msg = "ERR: " + corr.name + " not connected."
+        elif not corr.state:
+            msg = "ERR: " + corr.name + " is off."
+        elif not corr.opmode_ok:
+            msg = "ERR: " + corr.name + " mode not configured."
+        else:
+            return True
+        self._update_log(msg)
+        _log.error(msg[5:])
+        return False
+
+    @staticmethod
+    def _is_rmpwfm(corr):
+        return corr._config_ok_vals['OpMode'] == _PSConst.OpMode.RmpWfm
+
+    def _get_setpoint_pv(self, corr):
+        """Return setpoint PV of orbit corrector, None for other ones."""
+        # RF and septa setpoints need their own conversions
+        if not isinstance(corr, _correctors.CHCV):
+            return None
+        pvs = corr._pvs
+        return pvs['wfm_offset_sp'] if self._is_rmpwfm(corr) else pvs['sp']
+
+    def _get_readback_pvs(self, corr, mode):
+        """Return PVs that must be connected, the last one with the value."""
+        if not isinstance(corr, _correctors.CHCV):
+            return None
+        pvs = corr._pvs
+        main = pvs['rb'] if mode == "ready" else pvs['ref']
+        if self._is_rmpwfm(corr):
+            return main, pvs['wfm_offset_rb']
+        return (main, )
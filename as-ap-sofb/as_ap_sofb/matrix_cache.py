@@ -0,0 +1,334 @@
+"""Response matrix of the SOFB IOC with cached SVD.
+
+The SVD of the selected response matrix is cached, so that changes of the
+minimum singular value or of the Tikhonov constant only filter the cached
+singular values again. Changes of the matrix, of its mode or of the enable
+lists need a new SVD, which is calculated in a background thread while the
+previous inverse matrix stays in use by the correction loop. Changes are
+committed once the new inverse matrix is in use and rolled back if it
+cannot be calculated.
+"""
+
+import logging as _log
+import threading as _threading
+
+import numpy as _np
+from siriuspy.sofb import EpicsMatrix as _EpicsMatrix
+
+
+def calc_inverse(uuu, sing, vvv, min_sing_val, tikhonov_reg_const):
+    """Return inverse matrix and processed singular values of an SVD."""
+    idcs = sing > min_sing_val
+    singr = sing[idcs]
+
+    # Apply Tikhonov regularization:
+    regc = tikhonov_reg_const
+    regc *= regc
+    inv_s = _np.zeros(sing.size, dtype=float)
+    inv_s[idcs] = singr / (singr * singr + regc)
+
+    # calculate processed singular values
+    singp = _np.zeros(sing.size, dtype=float)
+    singp[idcs] = 1 / inv_s[idcs]
+    return _np.dot(vvv.T * inv_s, uuu.T), singp
+
+
+class _SVD:
+    """SVD of the selected response matrix."""
+
+    def __init__(self, key, selecbpm, seleccor, mat):
+        self.key = key
+        self.selecbpm = selecbpm
+        self.seleccor = seleccor
+        self.uuu, self.sing, self.vvv = _np.linalg.svd(
+            mat, full_matrices=False)
+
+    def matches(self, key):
+        """Whether SVD was calculated for the state key."""
+        # matrices are compared by identity, they are replaced on change
+        return self.key[0] is key[0] and self.key[1:] == key[1:]
+
+
+class CachedMatrix(_EpicsMatrix):
+    """Response matrix with cached SVD and background recalculation.
+
+    Changes that need a new SVD are validated synchronously for sizes,
+    selections and finiteness. They are committed, publishing their
+    readbacks and saving the matrix file, only once the SVD and the
+    inverse matrix succeed; otherwise they are rolled back.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Init."""
+        # the parent init loads the response matrix
+        self._lock = _threading.Lock()
+        self._svd = None
+        # commit and rollback functions of changes waiting for the SVD
+        self._pending = []
+        self._dirty = _threading.Event()
+        self._thread = _threading.Thread(
+            target=self._run_recalc, name='SOFBMatrix', daemon=True)
+        self._thread.start()
+        super().__init__(*args, **kwargs)
+
+    def set_respmat_mode(self, mode):
+        """Set the response matrix mode."""
+        msg = "Setting New RespMatMode."
+        self._update_log(msg)
+        _log.info(msg)
+        old_ = self._respmat_mode
+        if mode not in self._csorb.RespMatMode:
+            self.run_callbacks("RespMatMode-Sel", old_)
+            return False
+
+        def commit():
+            self.run_callbacks("RespMatMode-Sts", mode)
+
+        def rollback():
+            self._respmat_mode = old_
+            self.run_callbacks("RespMatMode-Sel", old_)
+
+        with self._lock:
+            self._respmat_mode = mode
+            return self._submit(commit, rollback)
+
+    def set_respmat(self, mat):
+        """Set the response matrix in memory and save it in file."""
+        msg = "Setting New RespMat."
+        self._update_log(msg)
+        _log.info(msg)
+        old_ = self.respmat
+        if mat is None:
+            self.run_callbacks("RespMat-SP", list(old_.ravel()))
+            return False
+        mat = _np.reshape(mat, [-1, self._csorb.nr_corrs])
+
+        def commit():
+            self._save_respmat(mat)
+            self.run_callbacks("RespMat-RB", list(mat.ravel()))
+
+        def rollback():
+            self.respmat = old_
+            self.run_callbacks("RespMat-SP", list(old_.ravel()))
+
+        with self._lock:
+            self.respmat = mat
+            return self._submit(commit, rollback)
+
+    def set_enbllist(self, key, val):
+        """."""
+        msg = "Setting {0:s} EnblList".format(key.upper())
+        self._update_log(msg)
+        _log.info(msg)
+
+        bkup = self.select_items[key]
+        new_ = _np.array(val, dtype=bool)
+        if key == "rf":
+            pass
+        elif new_.size >= bkup.size:
+            new_ = new_[: bkup.size]
+        else:
+            new2_ = bkup.copy()
+            new2_[: new_.size] = new_
+            new_ = new2_
+        pvn = self.selection_pv_names[key]
+
+        def commit():
+            self.run_callbacks(pvn, bool(new_) if new_.size == 1 else new_)
+
+        def rollback():
+            self.select_items[key] = bkup
+            self.run_callbacks(
+                pvn.replace("-RB", "-SP"),
+                bool(bkup) if bkup.size == 1 else bkup)
+
+        with self._lock:
+            self.select_items[key] = new_
+            self._submit(commit, rollback)
+        return True
+
+    def set_min_sing_value(self, num):
+        """."""
+        bkup = self.min_sing_val
+        num = float(num)
+
+        def commit():
+            self.run_callbacks("MinSingValue-RB", num)
+
+        def rollback():
+            self.min_sing_val = bkup
+            self.run_callbacks("MinSingValue-SP", bkup)
+
+        with self._lock:
+            self.min_sing_val = num
+            return self._submit(commit, rollback)
+
+    def set_tikhonov_reg_const(self, num):
+        """."""
+        bkup = self.tikhonov_reg_const
+        num = float(num)
+
+        def commit():
+            self.run_callbacks("TikhonovRegConst-RB", num)
+
+        def rollback():
+            self.tikhonov_reg_const = bkup
+            self.run_callbacks("TikhonovRegConst-SP", bkup)
+
+        with self._lock:
+            self.tikhonov_reg_const = num
+            return self._submit(commit, rollback)
+
+    def _calc_matrices(self):
+        with self._lock:
+            return self._submit(None, None)
+
+    def _get_key(self):
+        return (
+            self.respmat, self._respmat_mode, self.bpm_enbllist.tobytes(),
+            self.corrs_enbllist.tobytes())
+
+    def _check_matrices(self):
+        selecbpm = self.bpm_enbllist
+        seleccor = self.corrs_enbllist
+        if not any(selecbpm):
+            msg = "ERR: No BPM selected in EnblList"
+            self._update_log(msg)
+            _log.error(msg[5:])
+            return False
+        if not any(seleccor):
+            msg = "ERR: No Corrector selected in EnblList"
+            self._update_log(msg)
+            _log.error(msg[5:])
+            return False
+        if selecbpm.size * seleccor.size != self.respmat.size:
+            return False
+        if not _np.all(_np.isfinite(self.respmat)):
+            msg = "ERR: RespMat contains nan or inf."
+            self._update_log(msg)
+            _log.error(msg[5:])
+            return False
+        return True
+
+    def _submit(self, commit, rollback):
+        """Calculate matrices of the new state, called with lock held.
+
+        Return False if the state was rolled back.
+        """
+        if not self._check_matrices():
+            if rollback is not None:
+                rollback()
+            return False
+        if not self._pending and self._svd is not None and \
+                self._svd.matches(self._get_key()):
+            msg = "Calculating Inverse Matrix from cached SVD."
+            self._update_log(msg)
+            _log.info(msg)
+            if not self._apply_svd(self._svd):
+                if rollback is not None:
+                    rollback()
+                return False
+            if commit is not None:
+                commit()
+            return True
+        self._pending.append((commit, rollback))
+        self._dirty.set()
+        msg = "Calculating SVD in background."
+        self._update_log(msg)
+        _log.info(msg)
+        return True
+
+    def _get_selected_matrix(self, respmat, mode, selecbpm, seleccor):
+        mat = respmat.copy()
+        nr_bpms = self._csorb.nr_bpms
+        nr_ch = self._csorb.nr_ch
+        nr_chcv = self._csorb.nr_chcv
+        if mode != self._csorb.RespMatMode.Full:
+            mat[:nr_bpms, nr_ch:nr_chcv] = 0
+            mat[nr_bpms:, :nr_ch] = 0
+            mat[nr_bpms:, nr_chcv:] = 0
+        if mode == self._csorb.RespMatMode.Mxx:
+            mat[nr_bpms:] = 0
+        elif mode == self._csorb.RespMatMode.Myy:
+            mat[:nr_bpms] = 0
+        return mat[selecbpm][:, seleccor]
+
+    def _run_recalc(self):
+        while True:
+            self._dirty.wait()
+            with self._lock:
+                self._dirty.clear()
+                key = self._get_key()
+                selecbpm = self.bpm_enbllist
+                seleccor = self.corrs_enbllist
+            mat = self._get_selected_matrix(
+                key[0], key[1], selecbpm, seleccor)
+            try:
+                svd = _SVD(key, selecbpm, seleccor, mat)
+            except _np.linalg.LinAlgError:
+                msg = "ERR: Could not calculate SVD"
+                self._update_log(msg)
+                _log.error(msg[5:])
+                svd = None
+            with self._lock:
+                # discard SVD of a state changed during the calculation
+                if self._dirty.is_set() or not self._pending:
+                    continue
+                if svd is not None and svd.matches(self._get_key()) and \
+                        self._apply_svd(svd):
+                    self._svd = svd
+                    self._finish_pending(commit=True)
+                    continue
+                msg = "ERR: Rolling back to previous matrices."
+                self._update_log(msg)
+                _log.error(msg[5:])
+                self._finish_pending(commit=False)
+
+    def _finish_pending(self, commit):
+        """Commit changes waiting for the SVD or roll them back, newest first."""
+        pending = self._pending if commit else self._pending[::-1]
+        self._pending = []
+        for funs in pending:
+            fun = funs[0] if commit else funs[1]
+            if fun is not None:
+                fun()
+
+    def _apply_svd(self, svd):
+        uuu, sing, vvv = svd.uuu, svd.sing, svd.vvv
+        nr_sv = _np.sum(sing > self.min_sing_val)
+        if not nr_sv:
+            msg = "ERR: All Singular Values below minimum."
+            self._update_log(msg)
+            _log.error(msg[5:])
+            return False
+
+        inv_mat, singp = calc_inverse(
+            uuu, sing, vvv, self.min_sing_val, self.tikhonov_reg_const)
+        if not _np.all(_np.isfinite(inv_mat)):
+            msg = "ERR: Inverse contains nan or inf."
+            self._update_log(msg)
+            _log.error(msg[5:])
+            return False
+
+        sel_mat = svd.selecbpm[:, None] * svd.seleccor[None, :]
+        inv_respmat = _np.zeros(self.respmat.shape, dtype=float).T
+        inv_respmat[sel_mat.T] = inv_mat.ravel()
+        respmat_processed = _np.zeros(self.respmat.shape, dtype=float)
+        respmat_processed[sel_mat] = _np.dot(uuu * singp, vvv).ravel()
+        # replaced at once, the correction loop never sees partial results
+        self.inv_respmat = inv_respmat
+        self.respmat_processed = respmat_processed
+
+        sing_vals = _np.zeros(self._csorb.nr_svals, dtype=float)
+        sing_vals[: sing.size] = sing
+        self.run_callbacks("SingValuesRaw-Mon", sing_vals)
+        sing_vals = _np.zeros(self._csorb.nr_svals, dtype=float)
+        sing_vals[: singp.size] = singp
+        self.run_callbacks("SingValues-Mon", sing_vals)
+        self.run_callbacks("NrSingValues-Mon", nr_sv)
+        self.run_callbacks("InvRespMat-Mon", list(inv_respmat.ravel()))
+        self.run_callbacks("RespMat-Mon", list(respmat_processed.ravel()))
+        msg = "Ok!"
+        self._update_log(msg)
+        _log.info(msg)
+        return True
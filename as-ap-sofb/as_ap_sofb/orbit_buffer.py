@@ -0,0 +1,185 @@
+"""Shared memory ring buffer of the SOFB averaged orbit.
+
+The SOFB IOC writes each new averaged orbit into a memory-mapped file,
+so that other processes on the same host can read it without subscribing
+to the BPM PVs. The orbit is the one used by the correction, in all orbit
+modes of all accelerators: the slow orbit, the single pass orbit or the
+selected multi-turn orbit. The file has a header followed by a ring of
+slots:
+
+    header: magic (8s), nr_bpms (Q), nr_slots (Q), last sequence (Q)
+    slot:   sequence (Q), timestamp (d), orbit X (nr_bpms d),
+            orbit Y (nr_bpms d)
+
+A slot sequence is odd while the slot is being written and twice the orbit
+number once it is complete; readers retry when the sequence changes while
+they copy a slot.
+"""
+
+import mmap as _mmap
+import os as _os
+import struct as _struct
+import time as _time
+
+import numpy as _np
+from siriuspy.sofb import EpicsOrbit as _EpicsOrbit
+
+_MAGIC = b'SOFBORB1'
+_HEADER = _struct.Struct('<8sQQQ')
+# default location, in memory on Linux hosts
+DEFAULT_DIR = '/dev/shm'
+
+
+def _slot_size(nr_bpms):
+    return 16 + 16 * nr_bpms
+
+
+class _OrbitRing:
+    """Mapped ring buffer file."""
+
+    def __init__(self, fil, nr_bpms, nr_slots, access):
+        self.nr_bpms = nr_bpms
+        self.nr_slots = nr_slots
+        self._map = _mmap.mmap(fil.fileno(), 0, access=access)
+        self._header = _np.ndarray(
+            (3, ), dtype='<u8', buffer=self._map, offset=8)
+        size = _slot_size(nr_bpms)
+        self._seqs = _np.ndarray(
+            (nr_slots, ), dtype='<u8', buffer=self._map,
+            offset=_HEADER.size, strides=(size, ))
+        self._times = _np.ndarray(
+            (nr_slots, ), dtype='<f8', buffer=self._map,
+            offset=_HEADER.size + 8, strides=(size, ))
+        self._orbs = _np.ndarray(
+            (nr_slots, 2, nr_bpms), dtype='<f8', buffer=self._map,
+            offset=_HEADER.size + 16, strides=(size, 8 * nr_bpms, 8))
+
+    @property
+    def last(self):
+        """Number of the last orbit written."""
+        return int(self._header[2])
+
+    def close(self):
+        """Unmap file."""
+        del self._header, self._seqs, self._times, self._orbs
+        self._map.close()
+
+
+class OrbitRingWriter(_OrbitRing):
+    """Writer of the orbit ring buffer."""
+
+    def __init__(self, path, nr_bpms, nr_slots=64):
+        """Create ring buffer file."""
+        size = _HEADER.size + nr_slots * _slot_size(nr_bpms)
+        # replace the file, so that readers of a previous one are not broken
+        tmp = path + '.tmp'
+        with open(tmp, 'w+b') as fil:
+            fil.truncate(size)
+            fil.write(_HEADER.pack(_MAGIC, nr_bpms, nr_slots, 0))
+            fil.flush()
+            super().__init__(fil, nr_bpms, nr_slots, _mmap.ACCESS_WRITE)
+        _os.replace(tmp, path)
+        self.path = path
+        self._orbx = None
+
+    def write(self, orbx, orby, timestamp=None):
+        """Write orbit to the next slot."""
+        num = self.last + 1
+        idx = num % self.nr_slots
+        self._seqs[idx] = 2 * num - 1
+        self._times[idx] = _time.time() if timestamp is None else timestamp
+        self._orbs[idx, 0] = orbx
+        self._orbs[idx, 1] = orby
+        self._seqs[idx] = 2 * num
+        self._header[2] = num
+
+
+class BufferedOrbit(_EpicsOrbit):
+    """Orbit of the SOFB IOC that also feeds an orbit ring buffer."""
+
+    def __init__(self, *args, ring=None, **kwargs):
+        """Init.
+
+        ring is the OrbitRingWriter fed with each new averaged orbit.
+        """
+        # the parent init starts the orbit update thread
+        self._ring = ring
+        self._last_orbx = None
+        super().__init__(*args, **kwargs)
+
+    def _update_orbits(self):
+        super()._update_orbits()
+        if self._ring is None:
+            return
+        if self.is_multiturn():
+            orbs, getorb = self.smooth_mtorb, self._get_orbit_multiturn
+        elif self.is_singlepass():
+            orbs, getorb = self.smooth_sporb, self._get_orbit_singlepass
+        elif self.is_sloworb():
+            orbs, getorb = self.smooth_orb, self._get_orbit_online
+        else:
+            return
+        with self._lock_raw_orbs:
+            # averaged orbits are replaced, not changed, when updated
+            if orbs['X'] is None or orbs['Y'] is None or \
+                    orbs['X'] is self._last_orbx:
+                return
+            self._last_orbx = orbs['X']
+            orbx, orby = getorb(orbs)
+        if len(orbx) == len(orby) == self._ring.nr_bpms:
+            self._ring.write(orbx, orby)
+
+
+class OrbitRingReader(_OrbitRing):
+    """Reader of the orbit ring buffer."""
+
+    def __init__(self, path):
+        """Map ring buffer file."""
+        with open(path, 'rb') as fil:
+            magic, nr_bpms, nr_slots, _ = _HEADER.unpack(
+                fil.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f'{path} is not an orbit ring buffer.')
+            super().__init__(fil, nr_bpms, nr_slots, _mmap.ACCESS_READ)
+
+    def read(self, num):
+        """Return timestamp, orbit X and Y of orbit num, or None.
+
+        None is returned if the orbit was not written yet or has already
+        been overwritten.
+        """
+        idx = num % self.nr_slots
+        for _ in range(10):
+            seq = int(self._seqs[idx])
+            if seq != 2 * num:
+                return None
+            tstamp = float(self._times[idx])
+            orbs = self._orbs[idx].copy()
+            if int(self._seqs[idx]) == seq:
+                return tstamp, orbs[0], orbs[1]
+        return None
+
+    def latest(self):
+        """Return number, timestamp, orbit X and Y of the last orbit."""
+        for _ in range(10):
+            num = self.last
+            if not num:
+                return None
+            data = self.read(num)
+            if data is not None:
+                return (num, ) + data
+        return None
+
+    def wait_next(self, num, timeout=1.0, interval=0.001):
+        """Wait for an orbit newer than num and return it, or None."""
+        tfin = _time.monotonic() + timeout
+        while self.last <= num:
+            if _time.monotonic() > tfin:
+                return None
+            _time.sleep(interval)
+        return self.latest()
+
+
+def default_path(ioc_name):
+    """Return default ring buffer file of the IOC."""
+    return _os.path.join(DEFAULT_DIR, ioc_name + '-orbit.ring')
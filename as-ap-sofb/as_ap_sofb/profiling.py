@@ -0,0 +1,199 @@
+"""Hot path instrumentation of the SOFB IOC.
+
+Stage timers measure each call of the correction loop stages (orbit
+acquisition, kick calculation and corrector application) and of the main
+loop. A sampling profiler dumps, on demand, where all IOC threads spend
+their time.
+"""
+
+import collections as _collections
+import functools as _functools
+import logging as _log
+import os as _os
+import sys as _sys
+import tempfile as _tempfile
+import threading as _threading
+import time as _time
+
+import numpy as _np
+
+# instrumented stages: attribute of the SOFB app and method
+STAGES = {
+    'GetOrbit': ('orbit', 'get_orbit'),
+    'CalcKicks': ('matrix', 'calc_kicks'),
+    'ApplyKicks': ('correctors', 'apply_kicks'),
+}
+STATS = ('Mean', 'P99', 'Max')
+# interval between publications of the stage statistics [s]
+PUBLISH_INTERVAL = 2.0
+# interval between stack samples of the sampling profiler [s]
+SAMPLE_INTERVAL = 0.005
+
+
+def get_database():
+    """Return database of the stage timing and profiler PVs."""
+    dbase = dict()
+    for stage in list(STAGES) + ['Process', ]:
+        for stat in STATS:
+            dbase[f'Time{stage}{stat}-Mon'] = {
+                'type': 'float', 'prec': 3, 'unit': 'ms', 'value': 0.0}
+    dbase.update({
+        'ProfileDuration-SP': {
+            'type': 'float', 'prec': 1, 'unit': 's', 'value': 10.0,
+            'lolim': 1.0, 'hilim': 600.0},
+        'ProfileDuration-RB': {
+            'type': 'float', 'prec': 1, 'unit': 's', 'value': 10.0},
+        'ProfileDump-Cmd': {'type': 'int', 'value': 0},
+        'ProfileDumpFile-Mon': {'type': 'char', 'count': 1000, 'value': ''},
+    })
+    return dbase
+
+
+class StageTimer:
+    """Durations of the last calls of a stage."""
+
+    def __init__(self, name, size=1000):
+        """Init."""
+        self.name = name
+        self._durations = _np.zeros(size, dtype=float)
+        self._count = 0
+
+    def record(self, duration):
+        """Record duration of a call [s]."""
+        self._durations[self._count % self._durations.size] = duration
+        self._count += 1
+
+    def time(self, func):
+        """Return func wrapped to record the duration of its calls."""
+        @_functools.wraps(func)
+        def _timed(*args, **kwargs):
+            tini = _time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(_time.perf_counter() - tini)
+        return _timed
+
+    def stats(self):
+        """Return mean, 99th percentile and maximum durations [ms]."""
+        durs = self._durations[:min(self._count, self._durations.size)]
+        if not durs.size:
+            return 0.0, 0.0, 0.0
+        durs = durs * 1000
+        return durs.mean(), _np.percentile(durs, 99), durs.max()
+
+
+class StageTimers:
+    """Timers of the SOFB loop stages."""
+
+    def __init__(self):
+        """Init."""
+        self.timers = {
+            stage: StageTimer(stage)
+            for stage in list(STAGES) + ['Process', ]}
+        self._last_publish = _time.monotonic()
+
+    def instrument(self, app):
+        """Wrap stage methods of the app objects with their timers."""
+        for stage, (attr, meth) in STAGES.items():
+            obj = getattr(app, attr)
+            setattr(obj, meth, self.timers[stage].time(getattr(obj, meth)))
+
+    def publish(self, update_pv, force=False):
+        """Publish stage statistics if the publish interval has elapsed."""
+        now = _time.monotonic()
+        if not force and now - self._last_publish < PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        for stage, timer in self.timers.items():
+            for stat, value in zip(STATS, timer.stats()):
+                update_pv(f'Time{stage}{stat}-Mon', value)
+
+    def summary(self):
+        """Return text summary of the stage statistics."""
+        lines = []
+        for stage, timer in self.timers.items():
+            mean, p99, max_ = timer.stats()
+            lines.append(
+                f'{stage:12s} mean {mean:9.3f} ms  p99 {p99:9.3f} ms  '
+                f'max {max_:9.3f} ms')
+        return '\n'.join(lines)
+
+
+class SamplingProfiler:
+    """Sample the stacks of all threads and dump the busiest functions."""
+
+    def __init__(self, name, stage_timers=None, update_pv=None):
+        """Init."""
+        self.name = name
+        self.stage_timers = stage_timers
+        self.update_pv = update_pv
+        self.duration = 10.0
+        self._thread = None
+
+    @property
+    def is_running(self):
+        """Whether a profile is being taken."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_duration(self, value):
+        """Set duration of the profiles [s]."""
+        self.duration = float(value)
+        if self.update_pv is not None:
+            self.update_pv('ProfileDuration-RB', self.duration)
+        return True
+
+    def start(self, _=None):
+        """Start profile, return False if one is being taken."""
+        if self.is_running:
+            return False
+        self._thread = _threading.Thread(
+            target=self._run, args=(self.duration, ), daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, duration):
+        own = _threading.get_ident()
+        names = {thr.ident: thr.name for thr in _threading.enumerate()}
+        total = _collections.Counter()
+        leaf = _collections.Counter()
+        nr_samples = 0
+        tfin = _time.monotonic() + duration
+        while _time.monotonic() < tfin:
+            for ident, frame in _sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread = names.get(ident, str(ident))
+                funcs = set()
+                first = True
+                while frame is not None:
+                    code = frame.f_code
+                    func = (
+                        thread, f'{code.co_filename}:{code.co_firstlineno}'
+                        f'({code.co_name})')
+                    if first:
+                        leaf[func] += 1
+                        first = False
+                    funcs.add(func)
+                    frame = frame.f_back
+                total.update(funcs)
+            nr_samples += 1
+            _time.sleep(SAMPLE_INTERVAL)
+        nr_samples = max(nr_samples, 1)
+
+        fname = _os.path.join(
+            _tempfile.gettempdir(),
+            self.name + _time.strftime('-profile-%Y%m%d-%H%M%S.txt'))
+        with open(fname, 'w') as fil:
+            fil.write(f'{nr_samples} samples in {duration:.1f} s\n\n')
+            if self.stage_timers is not None:
+                fil.write(self.stage_timers.summary() + '\n\n')
+            fil.write('  total%    self%  thread: function\n')
+            for func, count in total.most_common(100):
+                fil.write(
+                    f'{100*count/nr_samples:7.1f}  '
+                    f'{100*leaf[func]/nr_samples:7.1f}  '
+                    f'{func[0]}: {func[1]}\n')
+        _log.info('Profile dumped to %s', fname)
+        if self.update_pv is not None:
+            self.update_pv('ProfileDumpFile-Mon', fname)
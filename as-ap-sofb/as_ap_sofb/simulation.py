@@ -0,0 +1,401 @@
+"""Closed loop simulation of the SOFB correction loop.
+
+The real SOFB application of the IOC runs its automatic correction loop
+with orbit, correctors and response matrix objects backed by an in-process
+linear model of the machine, assigned to it like the IOC assigns the EPICS
+ones. So the loop runs at its maximum rate, without BPM and corrector PVs,
+and changes of the SOFB loop, of the cached matrix or of the kick
+processing show up in the results. Stored beam and AMC clock checks and
+the FOFB interaction are skipped, as there is no beam. The stage times
+are the ones published by the IOC, the loop rate is the effective rate
+calculated by the SOFB loop and throughput is the number of applied kicks
+per second. The SOFB definitions come from the constants server, like in
+the IOC.
+
+The model has the BPMs and correctors of SI. Smaller systems are simulated
+by enabling only the first BPMs and correctors in the enable lists of the
+matrix, so the SVD and the correction use only them. The arrays of the
+loop keep the sizes of SI, with zeros for the disabled items, like in the
+IOC. Orbit rms values are calculated on the enabled BPMs.
+
+BLAS threads are defined by the usual environment variables, like
+OMP_NUM_THREADS, as numpy is loaded by this module.
+
+Run with:
+    python -m as_ap_sofb.simulation [--bpms 80] [--corrs 60] [--noise 0.1]
+        [--duration 10]
+"""
+
+import argparse as _argparse
+import json as _json
+from threading import Event as _Event
+import time as _time
+from types import SimpleNamespace as _SimpleNamespace
+
+import numpy as _np
+from siriuspy.sofb import SOFB as _SOFB
+from siriuspy.sofb.correctors import BaseCorrectors as _BaseCorrectors
+from siriuspy.sofb.orbit import BaseOrbit as _BaseOrbit
+
+from . import matrix_cache as _matrix_cache, profiling as _profiling
+
+# time to wait for the SVD of the response matrix [s]
+MATRIX_TIMEOUT = 30.0
+
+
+class LinearMachine:
+    """Linear model of orbit and correctors of a machine.
+
+    Orbits are in [um] and kicks in [urad].
+    """
+
+    def __init__(
+            self, nr_bpms, nr_corrs, noise=0.1, orbit_error=10.0, seed=0,
+            corrs_enbl=None):
+        """Init.
+
+        corrs_enbl selects the correctors that create the initial orbit
+        distortion, all by default.
+        """
+        self._rng = _np.random.default_rng(seed)
+        # columns with orbit rms of 10 um per urad
+        self.respmat = self._rng.normal(
+            scale=10.0, size=(2 * nr_bpms, nr_corrs))
+        self.noise = noise
+        self.kicks = _np.zeros(nr_corrs, dtype=float)
+        self.nr_applied = 0
+        # orbit distortion that the correctors are able to correct
+        kicks0 = self._rng.normal(size=nr_corrs)
+        if corrs_enbl is not None:
+            kicks0[~_np.asarray(corrs_enbl)] = 0
+        orbit0 = _np.dot(self.respmat, kicks0)
+        self.orbit0 = orbit0 * orbit_error / orbit0.std()
+
+    @property
+    def orbit(self):
+        """Orbit without noise."""
+        return self.orbit0 + _np.dot(self.respmat, self.kicks)
+
+    def measure_respmat(self, error=0.05):
+        """Return response matrix with relative measurement error."""
+        err = self._rng.normal(scale=error, size=self.respmat.shape)
+        return self.respmat * (1 + err)
+
+    def get_orbit(self):
+        """Return orbit with BPM noise."""
+        orb = self.orbit
+        orb += self._rng.normal(scale=self.noise, size=orb.size)
+        return orb
+
+    def get_strength(self):
+        """Return corrector kicks."""
+        return self.kicks.copy()
+
+    def apply_kicks(self, kicks):
+        """Set corrector kicks, NaN kicks are not changed."""
+        kicks = _np.array(kicks, dtype=float)
+        notnan = ~_np.isnan(kicks)
+        self.kicks[notnan] = kicks[notnan]
+        self.nr_applied += 1
+        return 0
+
+
+class ModelOrbit(_BaseOrbit):
+    """Orbit of the SOFB acquired from a linear machine."""
+
+    def __init__(self, machine, acc, prefix='', callback=None):
+        """Init."""
+        super().__init__(acc, prefix=prefix, callback=callback)
+        self.machine = machine
+        self.bpms = [
+            _SimpleNamespace(name=name, connected=True)
+            for name in self._csorb.bpm_names]
+        self.connected = True
+
+    def get_orbit(self, reset=False, synced=False, timeout=None):
+        """Return orbit of the machine."""
+        _, _, _ = reset, synced, timeout
+        return self.machine.get_orbit()
+
+    def wait_for_connection(self, timeout=None):
+        """Return True, there is no PV to connect."""
+        _ = timeout
+        return True
+
+    def shutdown(self):
+        """Do nothing, there is no acquisition to stop."""
+
+
+class ModelCorrectors(_BaseCorrectors):
+    """Correctors of the SOFB set in a linear machine."""
+
+    def __init__(self, machine, acc, prefix='', callback=None):
+        """Init."""
+        super().__init__(acc, prefix=prefix, callback=callback)
+        self.machine = machine
+        self.sync_kicks = self._csorb.CorrSync.Off
+        self.connected = True
+
+    def get_strength(self):
+        """Return kicks of the machine correctors."""
+        return self.machine.get_strength()
+
+    def apply_kicks(self, values):
+        """Apply kicks to the machine correctors."""
+        return self.machine.apply_kicks(values)
+
+    def wait_for_connection(self, timeout=None):
+        """Return True, there is no PV to connect."""
+        _ = timeout
+        return True
+
+    def shutdown(self):
+        """Do nothing, there is no thread to stop."""
+
+
+class ModelMatrix(_matrix_cache.CachedMatrix):
+    """Response matrix of the IOC that does not use its matrix file."""
+
+    def __init__(self, *args, **kwargs):
+        """Init."""
+        self.committed = _Event()
+        super().__init__(*args, **kwargs)
+
+    def _load_respmat(self):
+        pass
+
+    def _save_respmat(self, mat):
+        # called when a new matrix is in use by the correction loop
+        _ = mat
+        self.committed.set()
+
+
+class _NoFOFB:
+    """FOFB that is neither connected nor in closed loop."""
+
+    connected = False
+    loop_state = False
+
+
+class SimSOFB(_SOFB):
+    """SOFB application without beam, AMC clocks and FOFB."""
+
+    def __init__(self, *args, **kwargs):
+        """Init."""
+        super().__init__(*args, **kwargs)
+        self.fofb = _NoFOFB()
+
+    @property
+    def havebeam(self):
+        """Simulated beam is always stored."""
+        return True
+
+    @property
+    def is_amc_connected(self):
+        """There are no AMCs in the simulation."""
+        return True
+
+    @property
+    def is_amc_locked(self):
+        """There are no AMCs in the simulation."""
+        return True
+
+
+class _Monitor:
+    """Last values of the PVs updated by the SOFB objects."""
+
+    def __init__(self):
+        self.values = dict()
+        self.errors = []
+        self.loop_opened = _Event()
+
+    def update_pv(self, pvname, value, **kwargs):
+        _ = kwargs
+        self.values[pvname] = value
+        if pvname == 'Log-Mon' and value.startswith('ERR'):
+            self.errors.append(value[5:])
+        elif pvname == 'LoopState-Sts' and not value:
+            self.loop_opened.set()
+
+
+def create(
+        tests=False, nr_bpms=None, nr_corrs=None, noise=0.1,
+        orbit_error=10.0, matrix_error=0.05, min_sing_value=0.2,
+        tikhonov=0.0, seed=0, callback=None):
+    """Return SOFB application of SI backed by a linear machine.
+
+    nr_bpms is the number of BPMs enabled in each plane and nr_corrs the
+    number of CH and of CV correctors enabled, the first ones of SI. All
+    are enabled by default. callback receives the PV updates of the SOFB
+    objects.
+    """
+    app = SimSOFB(acc='SI', tests=tests, callback=callback)
+    csorb = app.csorb
+    nr_bpms = csorb.nr_bpms if nr_bpms is None else nr_bpms
+    nr_corrs = max(csorb.nr_ch, csorb.nr_cv) if nr_corrs is None else nr_corrs
+    if not 0 < nr_bpms <= csorb.nr_bpms:
+        raise ValueError(f'Number of BPMs must be in [1, {csorb.nr_bpms}].')
+    if nr_corrs <= 0:
+        raise ValueError('Number of correctors must be positive.')
+    app.matrix = ModelMatrix(
+        acc=app.acc, prefix=app.prefix, callback=callback)
+    # enable lists are set before the response matrix, whose SVD uses them
+    sel = app.matrix.select_items
+    sel['bpmx'][nr_bpms:] = False
+    sel['bpmy'][nr_bpms:] = False
+    sel['ch'][nr_corrs:] = False
+    sel['cv'][nr_corrs:] = False
+
+    machine = LinearMachine(
+        csorb.nr_bpms, csorb.nr_corrs, noise=noise, orbit_error=orbit_error,
+        seed=seed, corrs_enbl=app.matrix.corrs_enbllist)
+    app.orbit = ModelOrbit(
+        machine, acc=app.acc, prefix=app.prefix, callback=callback)
+    app.correctors = ModelCorrectors(
+        machine, acc=app.acc, prefix=app.prefix, callback=callback)
+
+    app.matrix.set_respmat(machine.measure_respmat(matrix_error))
+    if not app.matrix.committed.wait(MATRIX_TIMEOUT):
+        raise RuntimeError('Could not calculate the inverse matrix.')
+    app.matrix.set_min_sing_value(min_sing_value)
+    app.matrix.set_tikhonov_reg_const(tikhonov)
+    return app, machine
+
+
+def simulate(app, machine, duration=10.0, max_iters=None, settings=None):
+    """Close the SOFB loop and return its performance.
+
+    settings maps SOFB setpoint PVs, like LoopPIDKiCH-SP, to values
+    written before closing the loop. Times are in [ms], rates in [Hz] and
+    orbits in [um].
+    """
+    monitor = _Monitor()
+    app.add_callback(monitor.update_pv)
+    for pvname, value in (settings or dict()).items():
+        if not app.write(pvname, value):
+            raise ValueError(f'Could not set {pvname} to {value}.')
+
+    timers = _profiling.StageTimers()
+    timers.instrument(app)
+    enbl = app.matrix.bpm_enbllist
+    rms_ini = machine.orbit[enbl].std()
+    nr_ini = machine.nr_applied
+    tini = _time.perf_counter()
+    if not app.set_auto_corr(app.csorb.LoopState.Closed):
+        raise RuntimeError('Could not close the loop.')
+    tfin = tini + duration
+    while _time.perf_counter() < tfin and not monitor.loop_opened.is_set():
+        if max_iters is not None and \
+                machine.nr_applied - nr_ini >= max_iters:
+            break
+        _time.sleep(0.01)
+    app.set_auto_corr(app.csorb.LoopState.Open)
+    monitor.loop_opened.wait()
+    elapsed = _time.perf_counter() - tini
+    nr_iters = machine.nr_applied - nr_ini
+
+    res = {
+        'iterations': nr_iters,
+        'throughput': nr_iters / elapsed if elapsed else 0.0,
+        'loop_rate': monitor.values.get('LoopEffectiveRate-Mon', 0.0),
+        'orbit_rms_initial': rms_ini,
+        'orbit_rms_final': machine.orbit[enbl].std(),
+        'errors': monitor.errors,
+    }
+    for stage, timer in timers.timers.items():
+        if stage in _profiling.STAGES:
+            res[stage] = dict(zip(
+                (stat.lower() for stat in _profiling.STATS), timer.stats()))
+    return res
+
+
+def get_args():
+    """Return command line arguments."""
+    parser = _argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--tests', action='store_true',
+        help="Run the SOFB in tests mode, with random orbits and no PID "
+        "integral gain, like the IOC.")
+    parser.add_argument(
+        '--bpms', type=int, default=None,
+        help="Number of BPMs enabled in each plane (default: all).")
+    parser.add_argument(
+        '--corrs', type=int, default=None,
+        help="Number of CH and of CV correctors enabled (default: all).")
+    parser.add_argument(
+        '--noise', type=float, default=0.1, help="BPM noise rms [um].")
+    parser.add_argument(
+        '--orbit-error', type=float, default=10.0,
+        help="Initial orbit rms [um].")
+    parser.add_argument(
+        '--matrix-error', type=float, default=0.05,
+        help="Relative error of the measured response matrix.")
+    parser.add_argument(
+        '--min-sing-value', type=float, default=0.2)
+    parser.add_argument(
+        '--tikhonov', type=float, default=0.0,
+        help="Tikhonov regularization constant.")
+    parser.add_argument(
+        '--ki', type=float, default=0.2,
+        help="Integral gain of the loop PID.")
+    parser.add_argument(
+        '--max-delta-kick', type=float, default=5.0,
+        help="Maximum kick change per iteration [urad].")
+    parser.add_argument(
+        '--max-orbit-dist', type=float, default=1000.0,
+        help="Maximum orbit distortion to close the loop [um].")
+    parser.add_argument(
+        '--print-every', type=int, default=100,
+        help="Iterations between calculations of the loop rate.")
+    parser.add_argument(
+        '--duration', type=float, default=10.0, help="Duration [s].")
+    parser.add_argument('--iters', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--json', action='store_true', help="Print results as JSON.")
+    return parser.parse_args()
+
+
+def main():
+    """Run simulation."""
+    args = get_args()
+    app, machine = create(
+        tests=args.tests, nr_bpms=args.bpms, nr_corrs=args.corrs,
+        noise=args.noise, orbit_error=args.orbit_error,
+        matrix_error=args.matrix_error, min_sing_value=args.min_sing_value,
+        tikhonov=args.tikhonov, seed=args.seed)
+    settings = {
+        'LoopPIDKiCH-SP': args.ki,
+        'LoopPIDKiCV-SP': args.ki,
+        'MaxDeltaKickCH-SP': args.max_delta_kick,
+        'MaxDeltaKickCV-SP': args.max_delta_kick,
+        'LoopMaxOrbDistortion-SP': args.max_orbit_dist,
+        'LoopPrintEveryNumIters-SP': args.print_every,
+    }
+    res = simulate(
+        app, machine, duration=args.duration, max_iters=args.iters,
+        settings=settings)
+    if args.json:
+        print(_json.dumps(res))
+        return
+
+    print(
+        f'{app.matrix.bpm_enbllist.sum()} BPM readings, '
+        f'{app.matrix.corrs_enbllist.sum()} correctors, {res["iterations"]} '
+        f'iterations, {res["throughput"]:.1f} Hz, loop rate '
+        f'{res["loop_rate"]:.1f} Hz')
+    print(
+        f'orbit rms {res["orbit_rms_initial"]:.3f} um -> '
+        f'{res["orbit_rms_final"]:.3f} um')
+    for err in res['errors']:
+        print(f'error: {err}')
+    print(f'{"stage":>10s}  {"mean":>9s}  {"p99":>9s}  {"max":>9s}  [ms]')
+    for stage in _profiling.STAGES:
+        stats = res[stage]
+        print(
+            f'{stage:>10s}  {stats["mean"]:9.3f}  {stats["p99"]:9.3f}  '
+            f'{stats["max"]:9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""BLAS threading and CPU affinity settings of the SOFB IOC.
+
+BLAS settings only take effect if applied before numpy is imported, so
+this module must not import numpy at module level. CPU affinities are set
+per thread and are inherited by the threads created afterwards:
+configure() pins the BLAS pool while numpy creates it and then pins the
+calling thread, and with it every thread the IOC creates later (CA,
+server and write lanes). pin_thread() pins the correction loop thread.
+"""
+
+import functools as _functools
+import logging as _log
+import os as _os
+import threading as _threading
+
+BLAS_ENVARS = (
+    'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS')
+# numpy was slow with many threads in our servers
+DEFAULT_BLAS_THREADS = 2
+
+
+def parse_cpus(text):
+    """Return set of CPUs of a list like '0-3,6'."""
+    if not text:
+        return None
+    cpus = set()
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def add_arguments(parser):
+    """Add BLAS and affinity options to argument parser."""
+    parser.add_argument(
+        '--blas-threads', type=int, default=DEFAULT_BLAS_THREADS,
+        help="Number of BLAS threads (default: %(default)s).")
+    parser.add_argument(
+        '--blas-cpus', type=parse_cpus, default=None, metavar='CPUS',
+        help="CPUs of the BLAS threads, like '0-3,6'.")
+    parser.add_argument(
+        '--cpus', type=parse_cpus, default=None, metavar='CPUS',
+        help="CPUs of the IOC threads, including CA threads.")
+    parser.add_argument(
+        '--loop-cpus', type=parse_cpus, default=None, metavar='CPUS',
+        help="CPUs of the correction loop thread.")
+
+
+def set_thread_affinity(cpus):
+    """Pin calling thread to cpus."""
+    if cpus and hasattr(_os, 'sched_setaffinity'):
+        _os.sched_setaffinity(0, cpus)
+
+
+def configure(blas_threads=DEFAULT_BLAS_THREADS, blas_cpus=None, cpus=None):
+    """Configure BLAS pool and pin the calling thread.
+
+    Without cpus, the calling thread gets back its previous affinity once
+    the BLAS pool is created. Must be called before numpy is imported.
+    """
+    for var in BLAS_ENVARS:
+        _os.environ[var] = str(blas_threads)
+    if blas_cpus and hasattr(_os, 'sched_getaffinity'):
+        # BLAS threads inherit the affinity of the thread loading numpy
+        cpus = cpus or _os.sched_getaffinity(0)
+        set_thread_affinity(blas_cpus)
+        import numpy as _np
+        _np.ones((64, 64)) @ _np.ones((64, 64))
+    set_thread_affinity(cpus)
+
+
+def pin_thread(obj, meth, cpus):
+    """Wrap thread target method to pin the thread running it."""
+    func = getattr(obj, meth)
+
+    @_functools.wraps(func)
+    def _pinned(*args, **kwargs):
+        set_thread_affinity(cpus)
+        _log.info(
+            'Thread %s pinned to CPUs %s.',
+            _threading.current_thread().name, sorted(cpus))
+        return func(*args, **kwargs)
+    setattr(obj, meth, _pinned)
@@ -0,0 +1,97 @@
+"""Prioritized write lanes of the SOFB IOC driver.
+
+Writes are executed by one queue thread per lane, so that control loop
+commands never wait behind configuration changes or bulk uploads.
+A write to a reason that is still waiting in its lane supersedes the
+waiting value instead of being queued again. The IOC driver executes the
+Conf and Bulk lanes under one lock, so only Ctrl writes run concurrently
+with them.
+"""
+
+import time as _time
+from threading import Lock as _Lock
+
+import numpy as _np
+from siriuspy.thread import LoopQueueThread as _LoopQueueThread
+
+# lanes in order of priority and their maximum number of waiting writes
+LANES = ('Ctrl', 'Conf', 'Bulk')
+LANE_SIZES = {'Ctrl': 16, 'Conf': 64, 'Bulk': 4}
+# control loop PVs, executed in the Ctrl lane
+CTRL_PREFIXES = (
+    'LoopState', 'ApplyDelta', 'ManCorrGain', 'MaxKick', 'MaxDeltaKick',
+    'DeltaKick', 'MeasRespMat-Cmd')
+# upper edges of the write latency histogram bins [ms]
+LATENCY_BINS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def get_database():
+    """Return database of the write lanes PVs."""
+    dbase = {
+        'WriteLatencyBins-Cte': {
+            'type': 'float', 'count': len(LATENCY_BINS),
+            'value': list(LATENCY_BINS), 'unit': 'ms'},
+    }
+    for lane in LANES:
+        dbase[f'WriteLatency{lane}-Mon'] = {
+            'type': 'int', 'count': len(LATENCY_BINS) + 1,
+            'value': [0] * (len(LATENCY_BINS) + 1)}
+        dbase[f'WriteQueue{lane}-Mon'] = {'type': 'int', 'value': 0}
+    return dbase
+
+
+class WriteLane:
+    """Bounded write queue executed by its own thread."""
+
+    def __init__(self, name, maxsize, execute, callback=None):
+        """Init."""
+        self.name = name
+        self.maxsize = maxsize
+        self._execute = execute
+        self._callback = callback
+        self._lock = _Lock()
+        self._pending = dict()
+        # last bin counts latencies above the last edge
+        self.histogram = _np.zeros(len(LATENCY_BINS) + 1, dtype=int)
+        self._queue = _LoopQueueThread(is_cathread=True)
+        self._queue.start()
+
+    @property
+    def size(self):
+        """Number of waiting writes."""
+        return self._queue.qsize()
+
+    def put(self, reason, value, supersede=True):
+        """Queue write, return False if the lane is full."""
+        now = _time.monotonic()
+        with self._lock:
+            if supersede and reason in self._pending:
+                # keep the time of the first write for latency accounting
+                self._pending[reason][0] = value
+                return True
+            if self.size >= self.maxsize:
+                return False
+            if supersede:
+                self._pending[reason] = [value, now]
+                operation = (self._run_pending, (reason, ))
+            else:
+                operation = (self._run, (reason, value, now))
+            return self._queue.put(operation, block=False)
+
+    def _run_pending(self, reason):
+        with self._lock:
+            value, tstamp = self._pending.pop(reason)
+        self._run(reason, value, tstamp)
+
+    def _run(self, reason, value, tstamp):
+        try:
+            self._execute(reason, value)
+        finally:
+            latency = (_time.monotonic() - tstamp) * 1000
+            self.histogram[_np.searchsorted(LATENCY_BINS, latency)] += 1
+            if self._callback is not None:
+                self._callback(self)
+
+    def stop(self):
+        """Stop lane thread."""
+        self._queue.stop()
@@ -0,0 +1,65 @@
+"""Write logging of the SOFB IOC driver.
+
+Written values are only formatted when a record is emitted, and records of
+each reason are rate limited, so that scripts streaming large arrays do not
+pay for logging on the write path.
+"""
+
+import logging as _log
+import time as _time
+import zlib as _zlib
+
+import numpy as _np
+
+# minimum interval between logged writes of the same reason [s]
+MIN_INTERVAL = 1.0
+
+
+class _Value:
+    """Value formatted only when the log record is emitted."""
+
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        if not isinstance(self.value, (_np.ndarray, list, tuple)):
+            return f'{self.value}'
+        arr = _np.asarray(self.value)
+        if not arr.size:
+            return f'<{arr.dtype}[0]>'
+        crc = _zlib.crc32(_np.ascontiguousarray(arr).tobytes())
+        return (
+            f'<{arr.dtype}[{arr.size}] crc={crc:08x}> '
+            f'{arr.flat[0]}...{arr.flat[-1]}')
+
+
+class WriteLogger:
+    """Rate limited logger of driver writes."""
+
+    def __init__(self, min_interval=MIN_INTERVAL):
+        """Init."""
+        self.min_interval = min_interval
+        self._last = dict()
+
+    def log(self, reason, accepted, value, oldval, duration):
+        """Log write of value, taking duration seconds."""
+        level = _log.INFO if accepted else _log.WARNING
+        if not _log.root.isEnabledFor(level):
+            return
+        now = _time.monotonic()
+        last, suppressed = self._last.get(reason, (None, 0))
+        if last is not None and now - last < self.min_interval:
+            self._last[reason] = (last, suppressed + 1)
+            return
+        self._last[reason] = (now, 0)
+        if accepted:
+            _log.info(
+                'YES Write %s: %s (%.1f ms, %d suppressed)', reason,
+                _Value(value), duration * 1000, suppressed)
+        else:
+            _log.warning(
+                'NO write %s: %s current value is %s (%.1f ms, '
+                '%d suppressed)', reason, _Value(value), _Value(oldval),
+                duration * 1000, suppressed)
@@ -2,13 +2,8 @@
 """SI SOFB IOC executable."""
 
 import argparse as _argparse
-import os
 
-# NOTE: Avoid creation of a large number of threads by numpy.
-# This was making numpy operations very slow in our servers.
-os.environ['OMP_NUM_THREADS'] = '2'
-
-from as_ap_sofb import run
+from as_ap_sofb import run, tuning as _tuning
 
 if __name__ == '__main__':
     parser = _argparse.ArgumentParser(description="Run SI SOFB IOC.")
@@ -21,5 +16,15 @@ if __name__ == '__main__':
             "Starts IOC in test mode. The automatic loop ignores the "
             "existence of stored beam, the current of the dipoles and the BPM "
             "readings, sending random kicks to the correctors."))
+    parser.add_argument(
+        '--orbit-buffer', nargs='?', const='', default=None,
+        metavar='PATH', help=(
+            "Publish the averaged orbit in a shared memory ring buffer "
+            "file (default: /dev/shm/<ioc name>-orbit.ring)."))
+    _tuning.add_arguments(parser)
     args = parser.parse_args()
-    run(acc='SI', debug=args.debug, tests=args.tests)
+    # NOTE: must be applied before numpy is imported.
+    _tuning.configure(args.blas_threads, args.blas_cpus, args.cpus)
+    run(
+        acc='SI', debug=args.debug, tests=args.tests,
+        orbit_buffer=args.orbit_buffer, loop_cpus=args.loop_cpus)
@@ -3,12 +3,22 @@
 
 import argparse as _argparse
 
-from as_ap_sofb import run
+from as_ap_sofb import run, tuning as _tuning
 
 if __name__ == '__main__':
     parser = _argparse.ArgumentParser(description="Run TS SOFB IOC.")
     parser.add_argument(
         '-d', '--debug', action='store_true', default=False,
         help="Starts IOC in Debug Mode.")
+    parser.add_argument(
+        '--orbit-buffer', nargs='?', const='', default=None,
+        metavar='PATH', help=(
+            "Publish the averaged orbit in a shared memory ring buffer "
+            "file (default: /dev/shm/<ioc name>-orbit.ring)."))
+    _tuning.add_arguments(parser)
     args = parser.parse_args()
-    run(acc='TS', debug=args.debug)
+    # NOTE: must be applied before numpy is imported.
+    _tuning.configure(args.blas_threads, args.blas_cpus, args.cpus)
+    run(
+        acc='TS', debug=args.debug,
+        orbit_buffer=args.orbit_buffer, loop_cpus=args.loop_cpus)
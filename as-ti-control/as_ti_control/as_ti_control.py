@@ -5,6 +5,7 @@ import os as _os
 import signal as _signal
 from threading import Event as _Event
 
+import numpy as _np
 import pcaspy as _pcaspy
 from pcaspy.tools import ServerThread
 from siriuspy import csdev as _csdev, util as _util
@@ -12,6 +13,7 @@ from siriuspy.envars import VACA_PREFIX as _VACA_PREFIX
 from siriuspy.search import HLTimeSearch as _HLTimeSearch
 from siriuspy.thread import LoopQueueThread as _LoopQueueThread
 
+from . import shards as _shards, snapshot as _snapshot
 from .main import App
 
 __version__ = _util.get_last_commit_hash()
@@ -115,8 +117,18 @@ class _Driver(_pcaspy.Driver):
         return True
 
 
-def run(section='as', wait=5, debug=False):
-    """Start the IOC."""
+def run(
+        section='as', wait=5, debug=False, plan=None, shard=0,
+        snapshot=None):
+    """Start the IOC.
+
+    If plan, a file created by the shards planner, is given, the IOC
+    serves the triggers of the given shard instead of those of section.
+
+    If snapshot, a file path, is given, setpoints are restored from it at
+    boot and saved to it on change. An empty path selects the default file
+    of the IOC.
+    """
     _util.configure_log_file(debug=debug)
     _log.info('Starting...')
 
@@ -125,7 +137,11 @@ def run(section='as', wait=5, debug=False):
     _signal.signal(_signal.SIGTERM, _stop_now)
 
     # get IOC name and triggers list
-    ioc_name, ioc_prefix, trig_list = _get_ioc_name_and_triggers(section)
+    if plan is not None:
+        ioc_name, ioc_prefix, trig_list = _shards.load_shard(plan, shard)
+    else:
+        ioc_name, ioc_prefix, trig_list = _get_ioc_name_and_triggers(
+            section)
     if not trig_list:
         _log.fatal('Must select some triggers to run IOC.')
         return
@@ -135,6 +151,13 @@ def run(section='as', wait=5, debug=False):
     app = App(trig_list=trig_list)
 
     db = app.get_database()
+    snap, desired = None, dict()
+    if snapshot is not None:
+        snap = _snapshot.Snapshot(snapshot or _snapshot.default_path(ioc_name))
+        # start with the last known state, before low level PVs connect
+        desired = {pv: val for pv, val in snap.values.items() if pv in db}
+        for pv, value in desired.items():
+            db[pv]['value'] = value
     db[ioc_prefix + 'Version-Cte'] = {'type': 'string', 'value': __version__}
     # add PV Properties-Cte with list of all IOC PVs:
     db = _csdev.add_pvslist_cte(db, prefix=ioc_prefix)
@@ -157,9 +180,6 @@ def run(section='as', wait=5, debug=False):
     _log.info('Setting Server Database.')
     server.createPV(prefix, db)
 
-    _log.info('Waiting 5s for PVs to connect...')
-    app.wait_for_connection(5)
-
     _log.info('Creating Driver.')
     _Driver(app)
 
@@ -168,32 +188,47 @@ def run(section='as', wait=5, debug=False):
     server_thread.daemon = True
     server_thread.start()
 
-    tm = max(2, wait)
-    strf = 'Waiting ' + str(tm) + ' seconds to start locking Low Level.'
+    strf = 'Waiting up to ' + str(wait) + ' seconds for PVs to connect '
+    strf += 'and get values...'
     _log.info(strf)
-    stop_event.wait(tm)
+    if not app.wait_for_connection(wait):
+        _log.warning(
+            'Triggers not connected: %s', ', '.join(app.disconnected_triggers))
     _log.info('Start locking now.')
     if not stop_event.is_set():
-        # First Set the correct initial state
-        db = app.get_database()
+        # First Set the correct initial state, posting all PVs at once.
+        # Setpoints of the snapshot are written only where the low level
+        # differs from them, the other ones are kept from the low level.
         m2w = app.get_map2writepvs()
+        nr_writes = 0
         for pv, fun in app.get_map2readpvs().items():
             val = fun()
             value = val.pop('value')
-            if value is None:
+            if _snapshot.is_state_pv(pv):
+                target = desired.get(pv, value)
+                if target is None:
+                    continue
+                if pv not in desired or not _np.array_equal(target, value):
+                    m2w[pv](target)
+                    nr_writes += 1
+                value = target
+            elif value is None:
                 continue
-            if pv.endswith(('-SP', '-Sel')) and not pv.endswith('LvlLock-Sel'):
-                m2w[pv](value)
             try:
                 app.driver.setParam(pv, value)
             except TypeError as err:
                 print(pv, value)
                 raise err
             app.driver.setParamStatus(pv, **val)
-            app.driver.updatePV(pv)
+        app.driver.updatePVs()
+        _log.info('Initial state set with %d writes.', nr_writes)
 
         # Start locking
         app.locked = True
+        if snap is not None:
+            for pv in m2w:
+                snap.update(pv, app.driver.getParam(pv))
+            app.snapshot = snap
 
     # main loop
     while not stop_event.is_set():
@@ -204,4 +239,6 @@ def run(section='as', wait=5, debug=False):
     server_thread.stop()
     server_thread.join()
     _log.info('Server Thread stopped.')
+    if app.snapshot is not None:
+        app.snapshot.save()
     _log.info('Good Bye.')
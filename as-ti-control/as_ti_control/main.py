@@ -1,13 +1,17 @@
 """Module with main IOC Class."""
 
 import time as _time
-from functools import reduce as _reduce
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+from functools import partial as _partial, reduce as _reduce
 from operator import and_ as _and_
+from threading import Lock as _Lock
 import logging as _log
 
 from siriuspy.timesys.hl_classes import HLTrigger as _HLTrigger
 
 _TIMEOUT = 0.05
+# number of threads used to create and connect triggers
+_NR_WORKERS = 16
 
 
 class App:
@@ -15,24 +19,37 @@ class App:
 
     def get_database(self):
         """Get the database."""
-        db = dict()
-        for obj in self._objects:
-            db.update(obj.get_database())
-        return db
+        return dict(self._database)
 
     def __init__(self, driver=None, trig_list=[]):
         """Initialize the instance.
 
         driver : is the driver associated with this app;
         triggers_list: is the list of the high level triggers to be managed;
+
+        If the attribute snapshot is set to a snapshot.Snapshot object,
+        accepted writes and setpoint updates are recorded in it.
+
+        Triggers are created concurrently and their database and maps of
+        PVs are built only once.
         """
         self.driver = driver
+        self.snapshot = None
         self._objects = list()
-        if trig_list:
-            for pref in trig_list:
-                self._objects.append(_HLTrigger(pref, self._update_driver))
-        self._map2writepvs = self.get_map2writepvs()
-        self._map2readpvs = self.get_map2readpvs()
+        self._database = dict()
+        self._map2writepvs = dict()
+        self._map2readpvs = dict()
+        with _ThreadPoolExecutor(max_workers=_NR_WORKERS) as pool:
+            for obj, dbase, map2write, map2read in pool.map(
+                    self._create_trigger, trig_list):
+                self._objects.append(obj)
+                self._database.update(dbase)
+                self._map2writepvs.update(map2write)
+                self._map2readpvs.update(map2read)
+        # triggers to be processed in the next cycle
+        self._dirty_lock = _Lock()
+        self._dirty = set(range(len(self._objects)))
+        self._monitor_injection_table()
 
     @property
     def connected(self):
@@ -40,9 +57,24 @@ class App:
         return all(map(lambda x: x.connected, self._objects))
 
     def wait_for_connection(self, timeout=None):
-        """."""
-        return all(map(
-            lambda x: x.wait_for_connection(timeout=timeout), self._objects))
+        """Wait for all triggers to connect and get values, concurrently.
+
+        timeout is the time to wait for all triggers, not for each PV.
+        """
+        if not self._objects:
+            return True
+        deadline = None
+        if timeout is not None:
+            deadline = _time.monotonic() + timeout
+        with _ThreadPoolExecutor(max_workers=_NR_WORKERS) as pool:
+            return all(pool.map(
+                _partial(self._wait_for_trigger, deadline=deadline),
+                self._objects))
+
+    @property
+    def disconnected_triggers(self):
+        """Return prefixes of the triggers not connected."""
+        return [obj.prefix for obj in self._objects if not obj.connected]
 
     @property
     def locked(self):
@@ -56,16 +88,24 @@ class App:
             obj.locked = lock
 
     def process(self, interval):
-        """Run continuously in the main thread."""
+        """Run continuously in the main thread.
+
+        Only triggers whose injection table state may have changed since
+        the last call are processed.
+        """
         t0 = _time.time()
-        for obj in self._objects:
-            obj.process()
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        for idx in dirty:
+            self._objects[idx].process()
         tf = _time.time()
         dt = interval - (tf-t0)
         if dt > 0:
             _time.sleep(dt)
         else:
-            _log.warning('process took {0:f}ms.'.format((tf-t0)*1000))
+            _log.warning(
+                'process of {0:d} triggers took {1:f}ms.'.format(
+                    len(dirty), (tf-t0)*1000))
 
     def write(self, reason, value):
         """Write value in objects and database."""
@@ -73,7 +113,10 @@ class App:
         if fun_ is None:
             _log.warning('Not OK: PV %s is not settable.', reason)
             return False
-        return fun_(value)
+        ret = fun_(value)
+        if ret and self.snapshot is not None:
+            self.snapshot.update(reason, value)
+        return ret
 
     def read(self, reason, from_db=False):
         """Read PV value from objects or database."""
@@ -86,17 +129,64 @@ class App:
 
     def get_map2writepvs(self):
         """Get dictionary to write pvs to objects."""
-        map2writepvs = dict()
-        for obj in self._objects:
-            map2writepvs.update(obj.get_map2writepvs())
-        return map2writepvs
+        return self._map2writepvs
 
     def get_map2readpvs(self):
         """Get dictionary to read pvs from objects."""
-        map2readpvs = dict()
-        for obj in self._objects:
-            map2readpvs.update(obj.get_map2readpvs())
-        return map2readpvs
+        return self._map2readpvs
+
+    def _wait_for_trigger(self, obj, deadline=None):
+        """Wait for the low level PVs of a trigger to have values."""
+        for ll_obj in obj.get_ll_triggers():
+            pvs = list(ll_obj._readpvs.values())
+            pvs += list(ll_obj._writepvs.values())
+            pvs.append(ll_obj._base_freq_pv)
+            for evt in ll_obj._events.values():
+                pvs += [evt.pv_object(p) for p in evt.properties_in_use]
+            for pvo in pvs:
+                if not self._wait_for_value(pvo, deadline):
+                    _log.info('%s has no value.', pvo.pvname)
+                    return False
+        return True
+
+    @staticmethod
+    def _wait_for_value(pvo, deadline=None):
+        """Wait for PV to connect and receive its first value."""
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - _time.monotonic(), 0)
+        if not pvo.wait_for_connection(timeout=timeout):
+            return False
+        while pvo.value is None:
+            if deadline is not None and _time.monotonic() >= deadline:
+                return False
+            _time.sleep(_TIMEOUT)
+        return True
+
+    def _create_trigger(self, prefix):
+        obj = _HLTrigger(prefix, self._update_driver)
+        return (
+            obj, obj.get_database(), obj.get_map2writepvs(),
+            obj.get_map2readpvs())
+
+    def _monitor_injection_table(self):
+        """Mark triggers to be processed when their events change mode.
+
+        Changes of source and state of the triggers already update their
+        injection table state through the low level callbacks.
+        """
+        for idx, obj in enumerate(self._objects):
+            callback = _partial(self._set_dirty, idx)
+            for ll_obj in obj.get_ll_triggers():
+                for evt in ll_obj._events.values():
+                    pvo = evt.pv_object('Mode-Sts')
+                    pvo.add_callback(callback)
+                    pvo.connection_callbacks.append(callback)
+
+    def _set_dirty(self, idx, *args, **kwargs):
+        _, _ = args, kwargs
+        with self._dirty_lock:
+            self._dirty.add(idx)
 
     def _update_driver(
             self, pvname, value, alarm=None, severity=None, **kwargs):
@@ -109,5 +199,7 @@ class App:
         if value is not None:
             self.driver.setParam(pvname, value)
             _log.debug('{0:40s}: updated'.format(pvname))
+            if self.snapshot is not None:
+                self.snapshot.update(pvname, value)
 
         self.driver.updatePV(pvname)
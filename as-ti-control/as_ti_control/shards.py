@@ -0,0 +1,170 @@
+"""Partitioning of high level triggers among timing IOC shards.
+
+The planner balances triggers among N IOCs by their load, estimated from
+the number of low level PVs of each trigger and, optionally, from the
+update rate of their PVs measured in the running machine. The plan is a
+JSON file consumed by the IOC launcher with the --plan and --shard
+options. High level PV names are given by the trigger names, so they do
+not depend on the shard serving them.
+
+Run with:
+    python -m as_ti_control.shards -n 4 [--measure 30] -o plan.json
+"""
+
+import argparse as _argparse
+import collections as _collections
+import json as _json
+import logging as _log
+import time as _time
+
+from siriuspy.search import HLTimeSearch as _HLTimeSearch
+from siriuspy.timesys.csdev import get_hl_trigger_database as \
+    _get_hl_trigger_database
+
+# weight of one update per second relative to one low level PV
+UPDATE_WEIGHT = 1.0
+
+
+def get_shard_name(shard):
+    """Return IOC name and prefix of a shard."""
+    return f'as-ti-trig-shard{shard:d}', f'AS-Glob:TI-Trig-Shard{shard:d}:'
+
+
+def count_ll_pvs(hl_trigger):
+    """Return number of low level PVs of a trigger.
+
+    Each low level trigger has about one PV per high level PV.
+    """
+    nr_ll = len(_HLTimeSearch.get_ll_trigger_names(hl_trigger))
+    return nr_ll * len(_get_hl_trigger_database(hl_trigger=hl_trigger))
+
+
+class _CountingDriver:
+    """Driver that counts the PV updates of each trigger."""
+
+    def __init__(self):
+        self.counts = _collections.Counter()
+
+    def setParam(self, reason, value):
+        _ = reason, value
+
+    def setParamStatus(self, reason, **kwargs):
+        _ = reason, kwargs
+
+    def updatePV(self, reason):
+        self.counts[reason.rsplit(':', 1)[0]] += 1
+
+
+def measure_update_rates(triggers, duration, timeout=10):
+    """Return updates per second of the PVs of each trigger."""
+    from .main import App
+
+    app = App(trig_list=triggers)
+    if not app.wait_for_connection(timeout):
+        _log.warning(
+            'Triggers not connected: %s', ', '.join(app.disconnected_triggers))
+    driver = _CountingDriver()
+    app.driver = driver
+    _time.sleep(duration)
+    app.driver = None
+    return {trig: driver.counts[trig] / duration for trig in triggers}
+
+
+def plan(loads, nr_shards):
+    """Return triggers of each shard, balancing their loads.
+
+    Triggers are assigned from the heaviest one to the least loaded shard,
+    ties broken by name so that plans are reproducible.
+    """
+    shards = [[] for _ in range(nr_shards)]
+    shard_loads = [0.0] * nr_shards
+    for trig in sorted(loads, key=lambda trg: (-loads[trg], trg)):
+        idx = min(range(nr_shards), key=lambda i: (shard_loads[i], i))
+        shards[idx].append(trig)
+        shard_loads[idx] += loads[trig]
+    return [sorted(trigs) for trigs in shards], shard_loads
+
+
+def make_plan(nr_shards, triggers=None, rates=None, weight=UPDATE_WEIGHT):
+    """Return plan of the shards as a dictionary.
+
+    If rates, a dictionary of updates per second of each trigger, is given,
+    they add to the load of the triggers.
+    """
+    if triggers is None:
+        triggers = _HLTimeSearch.get_hl_triggers()
+    rates = rates or dict()
+    nr_pvs = {trig: count_ll_pvs(trig) for trig in triggers}
+    loads = {
+        trig: nr_pvs[trig] + weight * rates.get(trig, 0.0)
+        for trig in triggers}
+    shards, shard_loads = plan(loads, nr_shards)
+    data = {'nr_shards': nr_shards, 'update_weight': weight, 'shards': []}
+    for idx, (trigs, load) in enumerate(zip(shards, shard_loads)):
+        ioc_name, ioc_prefix = get_shard_name(idx)
+        data['shards'].append({
+            'ioc_name': ioc_name,
+            'ioc_prefix': ioc_prefix,
+            'load': load,
+            'nr_ll_pvs': sum(nr_pvs[trig] for trig in trigs),
+            'triggers': trigs})
+    return data
+
+
+def load_shard(fname, shard):
+    """Return IOC name, prefix and triggers of a shard of a plan file."""
+    with open(fname, 'r') as fil:
+        data = _json.load(fil)
+    if not 0 <= shard < data['nr_shards']:
+        raise ValueError(
+            f'shard must be in [0, {data["nr_shards"]:d}) for plan {fname}.')
+    dic = data['shards'][shard]
+    return dic['ioc_name'], dic['ioc_prefix'], dic['triggers']
+
+
+def get_args():
+    """Return command line arguments."""
+    parser = _argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '-n', '--nr-shards', type=int, required=True,
+        help="Number of timing IOCs.")
+    parser.add_argument(
+        '--measure', type=float, default=0, metavar='DURATION',
+        help="Measure update rates of the triggers for DURATION [s].")
+    parser.add_argument(
+        '--rates', type=str, default=None, metavar='FILE',
+        help="JSON file with update rates of the triggers [Hz].")
+    parser.add_argument(
+        '--weight', type=float, default=UPDATE_WEIGHT,
+        help="Load of one update per second relative to one low level PV.")
+    parser.add_argument(
+        '-o', '--output', type=str, default=None,
+        help="Output plan file (default: print it).")
+    return parser.parse_args()
+
+
+def main():
+    """Plan shards."""
+    args = get_args()
+    triggers = _HLTimeSearch.get_hl_triggers()
+    rates = None
+    if args.rates:
+        with open(args.rates, 'r') as fil:
+            rates = _json.load(fil)
+    elif args.measure:
+        rates = measure_update_rates(triggers, args.measure)
+    data = make_plan(args.nr_shards, triggers, rates, args.weight)
+    text = _json.dumps(data, indent=2)
+    if args.output is None:
+        print(text)
+        return
+    with open(args.output, 'w') as fil:
+        fil.write(text + '\n')
+    for dic in data['shards']:
+        print(
+            f'{dic["ioc_name"]:s}: {len(dic["triggers"]):4d} triggers, '
+            f'{dic["nr_ll_pvs"]:6d} LL PVs, load {dic["load"]:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Persistent snapshot of the high level trigger setpoints.
+
+The snapshot maps the setpoint PVs of the triggers to their values. It is
+written atomically to a JSON file shortly after each change and loaded at
+boot, so that the IOC database starts with the last known state and the
+reconciliation with the low level IOCs only writes what differs.
+"""
+
+import json as _json
+import logging as _log
+import os as _os
+import tempfile as _tempfile
+from threading import Event as _Event, Lock as _Lock, Thread as _Thread
+import time as _time
+
+DEFAULT_DIR = '/home/sirius/iocs-log'
+# time to gather changes before writing the snapshot file [s]
+INTERVAL = 1.0
+
+
+def default_path(ioc_name):
+    """Return default snapshot file of the IOC."""
+    return _os.path.join(DEFAULT_DIR, ioc_name, 'snapshot.json')
+
+
+def is_state_pv(pvname):
+    """Whether PV holds state kept in the snapshot."""
+    return (
+        pvname.endswith(('-SP', '-Sel')) and
+        not pvname.endswith('LvlLock-Sel'))
+
+
+class Snapshot:
+    """Snapshot of the trigger setpoints saved in a file."""
+
+    def __init__(self, path, interval=INTERVAL):
+        """Load snapshot file and start saving thread."""
+        self.path = path
+        self.interval = interval
+        self._lock = _Lock()
+        self._save_lock = _Lock()
+        self._changed = _Event()
+        self._values = self._load()
+        dirname = _os.path.dirname(path)
+        if dirname:
+            _os.makedirs(dirname, exist_ok=True)
+        self._thread = _Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def values(self):
+        """Return copy of the values of the snapshot."""
+        with self._lock:
+            return dict(self._values)
+
+    def update(self, pvname, value):
+        """Update value of a PV, if it is a state PV."""
+        if value is None or not is_state_pv(pvname):
+            return
+        if hasattr(value, 'tolist'):
+            value = value.tolist()
+        with self._lock:
+            if self._values.get(pvname) == value:
+                return
+            self._values[pvname] = value
+        self._changed.set()
+
+    def save(self):
+        """Write snapshot file atomically.
+
+        Saves are serialized, so that the file is never replaced by an
+        older snapshot.
+        """
+        with self._save_lock:
+            self._changed.clear()
+            with self._lock:
+                text = _json.dumps(self._values, indent=1, sort_keys=True)
+            dirname = _os.path.dirname(self.path) or '.'
+            fd, tmp = _tempfile.mkstemp(dir=dirname, suffix='.tmp')
+            try:
+                with _os.fdopen(fd, 'w') as fil:
+                    fil.write(text)
+                    fil.flush()
+                    _os.fsync(fil.fileno())
+                _os.replace(tmp, self.path)
+            except Exception:
+                _os.remove(tmp)
+                raise
+
+    def _load(self):
+        if not _os.path.isfile(self.path):
+            _log.info('No snapshot in %s.', self.path)
+            return dict()
+        try:
+            with open(self.path, 'r') as fil:
+                values = _json.load(fil)
+        except (OSError, ValueError) as err:
+            _log.error('Could not load snapshot %s: %s', self.path, err)
+            return dict()
+        _log.info('Loaded %d values from snapshot %s.', len(values), self.path)
+        return values
+
+    def _run(self):
+        while True:
+            self._changed.wait()
+            # gather changes made in bursts
+            _time.sleep(self.interval)
+            try:
+                self.save()
+            except OSError as err:
+                _log.error('Could not save snapshot %s: %s', self.path, err)
@@ -11,13 +11,32 @@ parser.add_argument(
     )
 parser.add_argument(
     '-w', '--wait', type=float, default=5,
-    help='In case -l is not given, this is the time to wait in [s]' +
-         'before start locking. (5s)'
+    help='Maximum time to wait in [s] for all low level PVs to connect ' +
+         'and get their values before start locking. (5s)'
     )
 parser.add_argument(
     '-d', '--debug', action='store_true', default=False,
     help="Starts IOC in Debug Mode. (False)"
     )
+parser.add_argument(
+    '-p', '--plan', type=str, default=None,
+    help="Shards plan file created by 'python -m as_ti_control.shards'. " +
+         "If given, --section is ignored."
+    )
+parser.add_argument(
+    '--shard', type=int, default=0,
+    help="Shard of the plan served by this IOC. (0)"
+    )
+
+parser.add_argument(
+    '--snapshot', type=str, nargs='?', default=None, const='',
+    metavar='FILE',
+    help="Restore setpoints from FILE at boot and save them on change. " +
+         "Without FILE, use the default file of the IOC in " +
+         "/home/sirius/iocs-log/<ioc-name>/."
+    )
 
 args = parser.parse_args()
-run(section=args.section, wait=args.wait, debug=args.debug)
+run(
+    section=args.section, wait=args.wait, debug=args.debug,
+    plan=args.plan, shard=args.shard, snapshot=args.snapshot)
@@ -47,6 +47,17 @@ def getArgs():  # noqa: N802
         default=cte.AUTOSAVE_DEFAULT_REQUEST_FILE,
         help="Autosave request file name"
         )
+    parser.add_argument(
+        '--recorder-file', dest='recorder_file', type=str, required=False,
+        default=cte.RECORDER_DEFAULT_FILE,
+        help="Motion recorder file name"
+        )
+    parser.add_argument(
+        '--device', dest='devices', action='append', required=False,
+        default=None, metavar='PV_PREFIX,BBB_ADDR[,MSG_PORT,IO_PORT]',
+        help="EPU served by the IOC, may be repeated; overrides "
+             "--pv-prefix and --beaglebone-addr"
+        )
     args = parser.parse_args()
     return args
 
@@ -0,0 +1,157 @@
+"""EPU50 driver benchmark.
+
+Runs the Epu driver against the bridge simulator and measures the
+standstill poll cycle time, the position update rate during motion and
+the latency of operator commands.
+
+Run with:
+    python -m si_id_epu50.benchmark [--delay 0.005] [--cycles 20]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from . import epu as _epu
+from .simulator import EpuSimulator
+
+_HOST = "127.0.0.1"
+_IDNAME = "SI-10SB:ID-EPU50"
+
+
+class _Events:
+    """Timestamps of driver callbacks."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = []
+        self.update = []
+        self.status_event = threading.Event()
+
+    def on_status(self):
+        with self.lock:
+            self.status.append(time.monotonic())
+        self.status_event.set()
+
+    def on_update(self):
+        with self.lock:
+            self.update.append(time.monotonic())
+
+
+def _summary(name, values, unit="ms", scale=1e3):
+    if not values:
+        print(f"{name:<28s}: no samples")
+        return
+    values = sorted(scale * val for val in values)
+    pct95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+    print(
+        f"{name:<28s}: mean {statistics.mean(values):8.2f} {unit}, "
+        f"p95 {pct95:8.2f} {unit}, max {values[-1]:8.2f} {unit} "
+        f"(n={len(values)})")
+
+
+def _timed(func, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0_ = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - t0_)
+    return times
+
+
+def bench_poll_cycle(events, cycles):
+    """Measure interval between standstill poll cycles."""
+    with events.lock:
+        events.status.clear()
+    while True:
+        with events.lock:
+            if len(events.status) > cycles:
+                stamps = list(events.status)
+                break
+        events.status_event.wait(1.0)
+        events.status_event.clear()
+    return [t1 - t0 for t0, t1 in zip(stamps[:-1], stamps[1:])]
+
+
+def bench_motion(driver, events, distance):
+    """Move the gap and return position update rate [Hz] and duration [s]."""
+    target = driver.gap - distance
+    driver.gap_set(target)
+    # motion ends when the gap reaches the target read back by the poller
+    driver._wait_for_state(lambda: abs(driver.gap_target - target) < 1e-3, 5)
+    driver.gap_enable_and_release_halt(True)
+    with events.lock:
+        events.update.clear()
+    t0_ = time.monotonic()
+    driver.gap_start(True)
+    while not driver.gap_start_event.is_set():
+        time.sleep(0.01)
+    while driver.gap_start_event.is_set():
+        time.sleep(0.01)
+    duration = time.monotonic() - t0_
+    with events.lock:
+        count = len(events.update)
+    return count / duration, duration
+
+
+def get_args():
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--msg-port", dest="msg_port", type=int, default=15052)
+    parser.add_argument("--io-port", dest="io_port", type=int, default=15050)
+    parser.add_argument(
+        "--delay", type=float, default=0.005,
+        help="simulated answer delay [s]")
+    parser.add_argument(
+        "--jitter", type=float, default=0.0,
+        help="maximum random extra answer delay [s]")
+    parser.add_argument(
+        "--drop-rate", dest="drop_rate", type=float, default=0.0,
+        help="probability of dropping each answer byte")
+    parser.add_argument(
+        "--cycles", type=int, default=20, help="poll cycles to measure")
+    parser.add_argument(
+        "--distance", type=float, default=2.0, help="gap move distance [mm]")
+    return parser.parse_args()
+
+
+def main():
+    """Run benchmark."""
+    args = get_args()
+    sim = EpuSimulator(
+        host=_HOST, msg_port=args.msg_port, io_port=args.io_port,
+        delay=args.delay, jitter=args.jitter, drop_rate=args.drop_rate)
+    sim.start()
+
+    events = _Events()
+    t0_ = time.monotonic()
+    driver = _epu.Epu(
+        args=_epu.Namespace(
+            pv_prefix=_IDNAME,
+            msg_port=args.msg_port,
+            io_port=args.io_port,
+            beaglebone_addr=_HOST),
+        callback_update=events.on_update,
+        callback_status=events.on_status)
+    print(f"{'driver initialization':<28s}: {time.monotonic() - t0_:8.2f} s")
+
+    _summary("poll cycle", bench_poll_cycle(events, args.cycles))
+    _summary("gap enable status", _timed(driver.gap_enable_status))
+    _summary("phase setpoint read", _timed(lambda: driver.phase_setpoint))
+    _summary("gap velocity set", _timed(
+        driver.gap_set_velocity, driver.gap_target_velocity))
+    rate, duration = bench_motion(driver, events, args.distance)
+    print(
+        f"{'gap motion update rate':<28s}: {rate:8.2f} Hz "
+        f"({duration:.2f} s move)")
+
+    for link, stats in driver.get_bus_stats().items():
+        print(
+            f"{link + ' link wait max':<28s}: "
+            + ", ".join(f"{val:.2f}" for val in stats["wait_max"]) + " ms")
+    sim.stop()
+
+
+if __name__ == "__main__":
+    main()
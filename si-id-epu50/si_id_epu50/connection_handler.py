@@ -5,6 +5,8 @@ import time
 import atexit
 import logging
 
+from .scheduler import BusScheduler
+
 # Create a logger instance
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,8 @@ class TCPClient:
         self.sock = None
         self.connected = False
         self.last_data = None
+        # every user of this link must go through its scheduler
+        self.bus = BusScheduler(f"{server_ip}:{server_port}")
 
         atexit.register(self.close)
 
@@ -29,6 +33,7 @@ class TCPClient:
                 self.sock.settimeout(5)
                 self.sock.connect((self.server_ip, self.server_port))
                 self.connected = True
+                self.bus.selected_address = None
                 logger.info("Connected to %s:%s.", self.server_ip, self.server_port)
             except ConnectionRefusedError:
                 logger.error(
@@ -116,11 +121,85 @@ class TCPClient:
             logger.debug(e)
             return
 
+    def receive_bytes(self):
+        """Receive serial reply up to its '>' or '?' terminator."""
+        if not self.connected:
+            logger.error("Not connected to server. Call connect() method first.")
+            return
+
+        data = bytearray()
+        try:
+            while True:
+                chunk = self.sock.recv(64)
+                if not chunk:
+                    break
+                data += chunk
+                if chunk[-1] in b">?":
+                    break
+            return bytes(data)
+
+        except ConnectionResetError:
+            logger.error("Connection lost. Retrying...")
+            self.connected = False
+            self.connect()
+            return
+
+        except Exception as e:
+            logger.debug("Error receiving data.")
+            logger.debug(e)
+            return
+
+    def transact(self, messages, terminator, depth=1, timeout=None):
+        """Send serial messages pipelined and return their replies.
+
+        At most depth messages are sent ahead of their replies, which are
+        split on terminator. The returned list is shorter than messages if
+        the link went silent for timeout seconds or was lost.
+        """
+        if not self.connected:
+            logger.error("Not connected to server. Call connect() method first.")
+            return []
+
+        replies = []
+        buffer = bytearray()
+        sent = 0
+        previous_timeout = self.sock.gettimeout()
+        if timeout is not None:
+            self.sock.settimeout(timeout)
+        try:
+            while len(replies) < len(messages):
+                # keep the pipeline full
+                burst = messages[sent:len(replies) + depth]
+                if burst:
+                    self.sock.sendall(
+                        "".join(f"{msg}\r" for msg in burst).encode())
+                    sent += len(burst)
+                chunk = self.sock.recv(4096)
+                if not chunk:
+                    break
+                buffer += chunk
+                while True:
+                    end = buffer.find(terminator)
+                    if end < 0:
+                        break
+                    end += len(terminator)
+                    replies.append(bytes(buffer[:end]))
+                    del buffer[:end]
+
+        except (socket.timeout, ConnectionResetError, BrokenPipeError) as e:
+            logger.debug("Pipelined transaction interrupted.")
+            logger.debug(e)
+
+        finally:
+            self.sock.settimeout(previous_timeout)
+        return replies
+
     def close(self):
         """Close the TCP connection."""
         if self.connected:
             self.sock.close()
             self.connected = False
+            self.bus.selected_address = None
             print("Connection closed.")
 
     def reconnect(self):
@@ -138,7 +217,9 @@ class TCPClient:
         Returns:
             None
         """
+        timeout = self.sock.gettimeout()
         self.sock.settimeout(2)
+        self.bus.selected_address = None
 
         try:
             while True:
@@ -150,4 +231,4 @@ class TCPClient:
             pass
 
         finally:
-            self.sock.settimeout(None)
+            self.sock.settimeout(timeout)
@@ -33,6 +33,7 @@ AUTOSAVE_DEFAULT_SAVE_LOCATION = DEFAULT_PATH
 AUTOSAVE_DEFAULT_REQUEST_FILE = _os.path.join(
     _os.path.dirname(__file__), "config", "autosave_epu.req"
 )
+RECORDER_DEFAULT_FILE = _os.path.join(DEFAULT_PATH, "epu_motion.rec")
 
 
 class EpuConfig:
@@ -86,14 +87,38 @@ autosave_num_backup_files = 10
 
 ## Driver configuration
 driver_update_rate = 0.2
+### standstill polling interval for position readbacks and diag codes [s]
+standstill_fast_interval = 1.5
+### back-off limit of the standstill polling interval [s]
+standstill_max_interval = 4.0
+### heartbeat for reading target positions and velocities [s]
+standstill_slow_interval = 10.0
+### serial link wait above which standstill polling backs off [s]
+standstill_busy_wait = 0.05
+### maximum age of cached target positions and velocities for move checks [s]
+param_cache_max_age = 1.0
+### maximum number of serial messages sent ahead of their replies
+rs485_pipeline_depth = 8
+### timeout for each reply of a pipelined serial transaction [s]
+rs485_batch_timeout = 0.5
+### polarization change: timeout for reference readback [s]
+pol_readback_timeout = 5.0
+### polarization change: timeout for each motion step [s]
+pol_motion_timeout = 300.0
 
 ## Device support
 ### error msg array size
 error_msg_arr_size = 10
 ### interval for reading from driver
 poll_interval = 0.1
+### maximum interval between status publications [s]
+publish_heartbeat = 1.0
 ### tolerance for speed difference between drives
 speed_tol = 0.0
+### interval for publishing serial/GPIO link statistics [s]
+bus_stats_interval = 5.0
+### maximum number of commands waiting in each command lane
+cmd_queue_size = 4
 ### IOC messages
 msg_clear = ""
 msg_device_busy = "Cmd failed: Device is busy"
@@ -102,6 +127,7 @@ msg_device_busy = "Cmd failed: Device is busy"
 ### rec units string
 no_units = ""
 position_units = "mm"
+time_units = "ms"
 velo_units = "mm/s"
 # array size limits
 max_msg_size = 200
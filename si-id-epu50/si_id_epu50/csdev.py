@@ -69,6 +69,24 @@ pv_pwr_si_mon = "PwrPhase-Mon"
 pv_tcp_connected_mon = "TCPConnected-Mon"
 pv_gpio_connected_mon = "GPIOConnected-Mon"
 pv_epu_connected_mon = "EPUConnected-Mon"
+# serial and GPIO link scheduling statistics
+# (waveforms indexed by request priority: motion, command, poll)
+pv_serial_wait_time_mean_mon = "SerialWaitTimeMean-Mon"
+pv_serial_wait_time_max_mon = "SerialWaitTimeMax-Mon"
+pv_serial_hold_time_mean_mon = "SerialHoldTimeMean-Mon"
+pv_serial_hold_time_max_mon = "SerialHoldTimeMax-Mon"
+pv_serial_queue_mon = "SerialQueue-Mon"
+pv_gpio_wait_time_max_mon = "GPIOWaitTimeMax-Mon"
+pv_gpio_hold_time_max_mon = "GPIOHoldTimeMax-Mon"
+pv_gap_cmd_last_mon = "GapCmdLast-Mon"
+pv_gap_cmd_elapsed_mon = "GapCmdElapsed-Mon"
+pv_gap_cmd_queue_mon = "GapCmdQueue-Mon"
+pv_phase_cmd_last_mon = "PhaseCmdLast-Mon"
+pv_phase_cmd_elapsed_mon = "PhaseCmdElapsed-Mon"
+pv_phase_cmd_queue_mon = "PhaseCmdQueue-Mon"
+pv_drives_cmd_last_mon = "DrivesCmdLast-Mon"
+pv_drives_cmd_elapsed_mon = "DrivesCmdElapsed-Mon"
+pv_drives_cmd_queue_mon = "DrivesCmdQueue-Mon"
 # drive A
 pv_drive_a_resolver_pos_mon = "DriveAResolverPos-Mon"
 pv_drive_a_encoder_pos_mon = "DriveAEncoderPos-Mon"
@@ -111,7 +129,7 @@ def get_pvdb(idname):
     minimum_gap = _idparams.KPARAM_MIN
     maximum_gap = _idparams.KPARAM_MAX
     minimum_phase = _idparams.PPARAM_MIN
-    maximum_phase = _idparams.PARAM_MAX
+    maximum_phase = _idparams.PPARAM_MAX
 
     pvdb = {
         pv_polarization_mon: {
@@ -656,6 +674,136 @@ def get_pvdb(idname):
             "asg": "readonly",
         },
         #############################################
+        # Command execution
+        pv_gap_cmd_last_mon: {
+            "type": "string",
+            "count": 1,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_gap_cmd_elapsed_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 1,
+            "unit": _cte.time_units,
+            "value": 0.0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_gap_cmd_queue_mon: {
+            "type": "int",
+            "count": 1,
+            "value": 0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_phase_cmd_last_mon: {
+            "type": "string",
+            "count": 1,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_phase_cmd_elapsed_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 1,
+            "unit": _cte.time_units,
+            "value": 0.0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_phase_cmd_queue_mon: {
+            "type": "int",
+            "count": 1,
+            "value": 0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_drives_cmd_last_mon: {
+            "type": "string",
+            "count": 1,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_drives_cmd_elapsed_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 1,
+            "unit": _cte.time_units,
+            "value": 0.0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_drives_cmd_queue_mon: {
+            "type": "int",
+            "count": 1,
+            "value": 0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        # Link scheduling statistics
+        pv_serial_wait_time_mean_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 3,
+            "unit": _cte.time_units,
+            "value": [0.0, 0.0, 0.0],
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_serial_wait_time_max_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 3,
+            "unit": _cte.time_units,
+            "value": [0.0, 0.0, 0.0],
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_serial_hold_time_mean_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 3,
+            "unit": _cte.time_units,
+            "value": [0.0, 0.0, 0.0],
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_serial_hold_time_max_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 3,
+            "unit": _cte.time_units,
+            "value": [0.0, 0.0, 0.0],
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_serial_queue_mon: {
+            "type": "int",
+            "count": 1,
+            "value": 0,
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_gpio_wait_time_max_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 3,
+            "unit": _cte.time_units,
+            "value": [0.0, 0.0, 0.0],
+            "asyn": False,
+            "asg": "readonly",
+        },
+        pv_gpio_hold_time_max_mon: {
+            "type": "float",
+            "prec": 1,
+            "count": 3,
+            "unit": _cte.time_units,
+            "value": [0.0, 0.0, 0.0],
+            "asyn": False,
+            "asg": "readonly",
+        },
+        #############################################
         # Drive A
         pv_drive_a_resolver_pos_mon: {
             "type": "float",
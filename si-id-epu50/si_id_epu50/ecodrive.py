@@ -1,19 +1,45 @@
 #!/usr/bin/env python-sirius
 import logging
-import threading
 import time
 
+from . import constants as _cte
+from . import parameters as _params
 from .connection_handler import TCPClient
-from .utils import DriveCOMError
+from .utils import DriveCOMError, ParameterParseError
 
 logger = logging.getLogger(__name__)
 
+# reset of class 1 diagnostics and of the drive error state
+_CLEAR_ERROR_SEQUENCE = (
+    "S-0-0099,3,r",
+    "S-0-0099,7,w,11",
+    "S-0-0099,1,w,0",
+    "S-0-0099,2,r",
+    "S-0-0099,3,r",
+    "S-0-0099,7,w,0",
+    "S-0-0095,3,r",
+    "S-0-0095,7,r",
+    "S-0-0099,1,w,0",
+    "S-0-0099,2,r",
+    "S-0-0099,3,r",
+    "S-0-0099,7,w,0",
+    "S-0-0014,7,r",
+    "S-0-0099,3,r",
+    "S-0-0099,7,w,11",
+    "P-0-4023,7,W,11",
+    "S-0-0099,7,W,11",
+    "P-0-4023,7,W,10",
+    "S-0-0099,7,W,00",
+    "S-0-0127,7,W,11",
+    "S-0-0127,7,W,00",
+    "S-0-0128,7,W,11",
+    "S-0-0128,7,W,00",
+)
+
 
 class EcoDrive:
     """EcoDrive."""
 
-    _lock = threading.RLock()
-
     def __init__(
         self,
         tcp_client: TCPClient,
@@ -35,8 +61,12 @@ class EcoDrive:
         self.LOWER_LIMIT = min_limit
         self.DRIVE_NAME = drive_name
         self.sock = tcp_client
+        # the RS485 bus is shared by all drives behind the same bridge
+        self.bus = tcp_client.bus
         self.tcp_connected = False
         self.rs485_connected = False
+        # last parsed parameter values
+        self.cache = _params.ParameterCache()
 
         if not self.sock.connected:
             self.sock.connect()
@@ -54,7 +84,7 @@ class EcoDrive:
         Keeps trying to connect to drive until it succeeds.
         Success is achieved when the drive responds correctly.
         """
-        with EcoDrive._lock:
+        with self.bus.request():
             while True:
                 time.sleep(1)
                 answer = self.tcp_read_parameter(
@@ -66,6 +96,7 @@ class EcoDrive:
                     logger.debug(
                         f"{self.DRIVE_NAME} connected to ecodrive address {self.ADDRESS}"
                     )
+                    self.bus.selected_address = self.ADDRESS
                     return True
                 else:
                     logger.error(
@@ -79,83 +110,92 @@ class EcoDrive:
     # @utils.timer # prints the execution time of the function
     def tcp_read_parameter(
                 self, message: str, change_drive: bool = True) -> bytes:
-        with EcoDrive._lock:
-            if change_drive:
+        with self.bus.request():
+            # the drive stays addressed until another BCD is sent,
+            # so only switch drives if the bus is addressing another one
+            switched = False
+            if change_drive and self.bus.selected_address != self.ADDRESS:
                 self.sock.send_data(f"BCD:{self.ADDRESS}\r")
-                if f"{self.ADDRESS}" not in self.sock.receive_data():
+                answer = self.sock.receive_bytes()
+                if not answer or str(self.ADDRESS).encode() not in answer:
                     self.sock.clean_socket_buffer()
                     return None
+                self.bus.selected_address = self.ADDRESS
+                switched = True
 
             self.sock.send_data(f"{message}\r")
-            data = self.sock.receive_data()
+            data = self.sock.receive_bytes()
+            if not data:
+                # unknown bus state, address drive again on next request
+                self.bus.selected_address = None
 
-            if change_drive:
+            if switched:
                 time.sleep(0.02)  # makes significant difference
-            return data.encode() if data else b""
+            return data or b""
+
+    def read_parameter(
+        self, parameter: str, change_drive: bool = True,
+        max_age: float = 0.0
+    ):
+        """Return value of parameter parsed according to its schema.
+
+        A value read less than max_age seconds ago is returned from the
+        cache, without querying the drive.
+        """
+        value = self.cache.get(parameter, max_age)
+        if value is not None:
+            return value
+        # a previous cached read may have skipped addressing this drive
+        change_drive = \
+            change_drive or self.bus.selected_address != self.ADDRESS
+        response = self.tcp_read_parameter(f"{parameter},7,R", change_drive)
+        try:
+            value = _params.parse_reply(parameter, response, self.ADDRESS)
+        except ParameterParseError as err:
+            logger.error(f"{self.DRIVE_NAME}, {parameter}: {err}")
+            raise
+        self.cache.set(parameter, value)
+        return value
 
     def read_parameter_data(
         self, parameter: str, change_drive: bool = True,
         treat_answer: bool = True
     ) -> str:
         response = self.tcp_read_parameter(f"{parameter},7,R", change_drive)
-        response = response.decode() if response else None
 
         if not response:
             logger.error(f"No response received from {self.DRIVE_NAME}.")
             return None
 
-        if f"E{self.ADDRESS}" not in response:
-            logger.error(f"Address not found in response from {self.DRIVE_NAME}.")
-            return None
-
-        if treat_answer:
-            try:
-                parameter_data = response.split("\r\n")[1]
-                return parameter_data
-            except IndexError:
-                logger.error(f"IndexError in response from {self.DRIVE_NAME}.")
-                logger.debug(f"Response: {response}")
-                return None
-        else:
-            return response
-
-    # Position and velocity functions
+        if not treat_answer:
+            return response.decode(errors="replace")
 
-    def read_resolver(self, change_drive=True) -> float:
         try:
-            answer = self.read_parameter_data(
-                "S-0-0051", change_drive=change_drive)
-            pos = float(answer)
-            return pos
-
-        except (ValueError, TypeError):
-            raise
+            return _params.extract_data(response, self.ADDRESS).decode()
+        except ParameterParseError as err:
+            logger.error(f"{self.DRIVE_NAME}: {err}")
+            return None
 
-    def read_encoder(self, change_drive: bool = True) -> float:
-        try:
-            answer = self.read_parameter_data(
-                "S-0-0053", change_drive=change_drive)
-            pos = float(answer)
-            return pos
+    # Position and velocity functions
 
-        except (ValueError, TypeError):
-            raise
+    def read_resolver(
+            self, change_drive: bool = True, max_age: float = 0.0) -> float:
+        return self.read_parameter("S-0-0051", change_drive, max_age)
 
-    def get_target_position(self, change_drive: bool = True) -> float:
-        try:
-            answer = self.read_parameter_data(
-                "P-0-4006", change_drive=change_drive)
-            pos = float(answer)
-            return pos
+    def read_encoder(
+            self, change_drive: bool = True, max_age: float = 0.0) -> float:
+        return self.read_parameter("S-0-0053", change_drive, max_age)
 
-        except (ValueError, TypeError):
-            raise
+    def get_target_position(
+            self, change_drive: bool = True, max_age: float = 0.0) -> float:
+        return self.read_parameter("P-0-4006", change_drive, max_age)
 
     def set_target_position(self, target: float) -> bool:
         if not (self.LOWER_LIMIT <= target <= self.UPPER_LIMIT):
             raise ValueError("Target position out of limits.")
 
-        with EcoDrive._lock:
+        with self.bus.request():
+            self.cache.invalidate("P-0-4006")
             response = self.tcp_read_parameter("P-0-4006,7,W,>")
             if b"?" not in response:
                 logger.error(f"Error: {response}")
@@ -185,17 +225,12 @@ class EcoDrive:
                     f"Drive {self.DRIVE_NAME} target position "
                     f"changed to {target} mm."
                 )
+                self.cache.set("P-0-4006", float(target))
                 return True
 
-    def get_max_velocity(self, change_drive: bool = True) -> float:
-        try:
-            answer = self.read_parameter_data(
-                "P-0-4007", change_drive=change_drive)
-            pos = float(answer)
-            return pos
-
-        except (ValueError, TypeError):
-            raise
+    def get_max_velocity(
+            self, change_drive: bool = True, max_age: float = 0.0) -> float:
+        return self.read_parameter("P-0-4007", change_drive, max_age)
 
     # TODO: put limits outside the function
     def set_target_velocity(self, target: float) -> bool:
@@ -203,7 +238,8 @@ class EcoDrive:
             if not (30 <= target <= 500):
                 raise ValueError("Target velocity out of limits.")
 
-            with EcoDrive._lock:
+            with self.bus.request():
+                self.cache.invalidate("P-0-4007")
                 response = self.tcp_read_parameter("P-0-4007,7,W,>")
                 if b"?" not in response:
                     logger.error(f"Error: {response}")
@@ -230,6 +266,7 @@ class EcoDrive:
                     f"Drive {self.DRIVE_NAME} velocity changed "
                     f"to {target} mm/s ({target * .001} m/s)."
                 )
+                self.cache.set("P-0-4007", float(target))
                 return True
 
         except Exception as e:
@@ -238,70 +275,31 @@ class EcoDrive:
 
     # Status functions
 
-    def get_diagnostic_code(self, change_drive: bool = True) -> str:
-        answer = self.read_parameter_data(
-            "S-0-0390", change_drive=change_drive)
-        if isinstance(answer, str):
-            return answer[:-1]
-        else:
+    def get_diagnostic_code(
+            self, change_drive: bool = True, max_age: float = 0.0) -> str:
+        try:
+            return self.read_parameter("S-0-0390", change_drive, max_age)
+        except ParameterParseError:
             return ""
 
     def get_halten_status(self, change_drive: bool = True) -> tuple:
-        try:
-            return tuple(
-                [
-                    int(x)
-                    for x in self.read_parameter_data(
-                        "S-0-0134", change_drive=change_drive
-                    )[1:3]
-                ]
-            )
-
-        except Exception as e:
-            raise e
+        bits = self.read_parameter("S-0-0134", change_drive)
+        if len(bits) < 3:
+            raise ParameterParseError("Control word too short.")
+        return bits[1:3]
 
     def get_target_position_reached(self) -> bool:
-        byte_message = self.tcp_read_parameter("S-0-0013,7,R")
-        str_message = byte_message.decode()
-
-        if "S-0-0013" not in str_message:
-            logger.error(
-                f"Parameter reading error: Drive address "
-                f"{self.ADDRESS}; answer: {str_message}"
-            )
-            raise RuntimeError("Parameter reading error.")
-
-        targ_pos_reached_bit = str_message.split("\r\n")[1][1]
-        if targ_pos_reached_bit not in ("0", "1"):
-            logger.error(
-                f"Parameter reading error: Drive address {self.ADDRESS}; "
-                f"answer: {str_message}"
-            )
-            raise RuntimeError("Parameter reading error.")
-
-        return bool(int(targ_pos_reached_bit))
+        bits = self.read_parameter("S-0-0013")
+        if len(bits) < 2:
+            raise ParameterParseError("Status word too short.")
+        return bool(bits[1])
 
     # Do not use it yet
     def get_movement_status(self, change_drive=True) -> bool:
-        try:
-            byte_message = self.tcp_read_parameter(
-                "S-0-0013,7,R", change_drive=change_drive
-            )
-        except Exception as e:
-            logger.exception("Communication error in tcp_read_parameter().")
-            raise e
-        else:
-            str_message = byte_message.decode().replace("\r", "").split("\n")
-            try:
-                is_moving = bool(str_message[1][1])
-            except ValueError as e:
-                logger.exception(
-                    "Error while trying to convert max velocity value "
-                    "received from drive."
-                )
-                raise e
-            else:
-                return is_moving
+        bits = self.read_parameter("S-0-0013", change_drive)
+        if len(bits) < 2:
+            raise ParameterParseError("Status word too short.")
+        return bool(bits[1])
 
     def get_rs485_delay(self):
         return self.tcp_read_parameter("P-0-4050,7,R")
@@ -311,33 +309,45 @@ class EcoDrive:
         delay = answer.decode().split("\r\n")
         return delay
 
-    def clear_error(self):
-        with EcoDrive._lock:
-            self.tcp_read_parameter(f"BCD:{self.ADDRESS}", False)
-            self.tcp_read_parameter("S-0-0099,3,r", False)
-            self.tcp_read_parameter("S-0-0099,7,w,11", False)
-            self.tcp_read_parameter("S-0-0099,1,w,0", False)
-            self.tcp_read_parameter("S-0-0099,2,r", False)
-            self.tcp_read_parameter("S-0-0099,3,r", False)
-            self.tcp_read_parameter("S-0-0099,7,w,0", False)
-            self.tcp_read_parameter("S-0-0095,3,r", False)
-            self.tcp_read_parameter("S-0-0095,7,r", False)
-            self.tcp_read_parameter("S-0-0099,1,w,0", False)
-            self.tcp_read_parameter("S-0-0099,2,r", False)
-            self.tcp_read_parameter("S-0-0099,3,r", False)
-            self.tcp_read_parameter("S-0-0099,7,w,0", False)
-            self.tcp_read_parameter("S-0-0014,7,r", False)
-            self.tcp_read_parameter("S-0-0099,3,r", False)
-            self.tcp_read_parameter("S-0-0099,7,w,11", False)
-            self.tcp_read_parameter("P-0-4023,7,W,11", False)
-            self.tcp_read_parameter("S-0-0099,7,W,11", False)
-            self.tcp_read_parameter("P-0-4023,7,W,10", False)
-            self.tcp_read_parameter("S-0-0099,7,W,00", False)
-            self.tcp_read_parameter("S-0-0127,7,W,11", False)
-            self.tcp_read_parameter("S-0-0127,7,W,00", False)
-            self.tcp_read_parameter("S-0-0128,7,W,11", False)
-            self.tcp_read_parameter("S-0-0128,7,W,00", False)
+    def run_batch(self, messages, name="batch"):
+        """Run message sequence as one pipelined transaction.
+
+        Every message must be answered with its echo followed by the drive
+        prompt. Raises DriveCOMError naming the first step that failed.
+        """
+        prompt = f"E{self.ADDRESS}>".encode()
+        with self.bus.request():
+            if self.bus.selected_address != self.ADDRESS:
+                answer = self.tcp_read_parameter(
+                    f"BCD:{self.ADDRESS}", change_drive=False)
+                if prompt not in answer:
+                    self.sock.clean_socket_buffer()
+                    raise DriveCOMError(
+                        f"{self.DRIVE_NAME} {name}: drive not selected, "
+                        f"answer was {answer!r}.")
+                self.bus.selected_address = self.ADDRESS
+                time.sleep(0.02)
+            replies = self.sock.transact(
+                messages, prompt, _cte.rs485_pipeline_depth,
+                _cte.rs485_batch_timeout)
+            for step, message in enumerate(messages):
+                reply = replies[step] if step < len(replies) else None
+                if reply is not None and reply.startswith(message.encode()) \
+                        and b"!" not in reply[len(message):]:
+                    continue
+                if reply is None or len(replies) < len(messages):
+                    # unanswered messages may still be answered later
+                    self.sock.clean_socket_buffer()
+                self.bus.selected_address = None
+                raise DriveCOMError(
+                    f"{self.DRIVE_NAME} {name}: step {step + 1} of "
+                    f"{len(messages)} ({message}) failed, "
+                    f"answer was {reply!r}.")
 
+    def clear_error(self):
+        self.cache.invalidate()
+        self.run_batch(_CLEAR_ERROR_SEQUENCE, "clear error")
+        self.cache.invalidate()
 
 if __name__ == "__main__":
     pass
@@ -1,5 +1,6 @@
 """EPU module."""
 
+import contextlib
 import logging
 import logging.handlers
 import threading
@@ -10,9 +11,11 @@ import socket
 from siriuspy.search import IDSearch as _IDSearch
 
 from . import constants as _cte
+from . import recorder as _recorder
 from . import utils
 from .connection_handler import TCPClient
 from .ecodrive import EcoDrive
+from .scheduler import PRIO_COMMAND, PRIO_MOTION, PRIO_POLL
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +33,7 @@ default_args = Namespace(
     msg_port=5052,
     io_port=5050,
     beaglebone_addr="10.128.110.160",
+    recorder_file=None,
     )
 
 
@@ -92,8 +96,9 @@ def send_bsmp_message(bsmp_enable_message, tcp_client: TCPClient) -> bytes:
     if not tcp_client.connected:
         tcp_client.connect()
 
-    tcp_client.send_data(bsmp_enable_message.decode())
-    return tcp_client.receive_data(conn="io")
+    with tcp_client.bus.request():
+        tcp_client.send_data(bsmp_enable_message.decode())
+        return tcp_client.receive_data(conn="io")
 
 
 def set_digital_signal(
@@ -214,10 +219,37 @@ def read_digital_status(tcp_client, bsmp_id: int) -> bytes:
     return send_bsmp_message(bsmp_enable_message, tcp_client)
 
 
+class _StepLog:
+    """Record elapsed times of the steps of a sequence."""
+
+    def __init__(self, name):
+        self.name = name
+        self.steps = []
+        self._start = self._last = time.monotonic()
+
+    def mark(self, step):
+        """Record end of step."""
+        now = time.monotonic()
+        self.steps.append((step, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        """Elapsed time since start [s]."""
+        return self._last - self._start
+
+    def log(self):
+        """Log step times."""
+        lines = [f"{step}: {dt:.2f} s" for step, dt in self.steps]
+        logger.info(
+            "%s done in %.2f s (%s).", self.name, self.total, "; ".join(lines))
+
+
 class Epu:
-    """Create a singleton instance of the EPU class.
+    """EPU class.
 
-    This class is used to communicate with the EPU.
+    This class is used to communicate with one EPU. Each instance has its
+    own links and schedules, so several EPUs can be served by one process.
     Four EcoDrive objects are created, one for each drive in the EPU.
     The EPU class also creates a
     TCPClient object, that is passed to the EcoDrive objects, to communicate
@@ -234,95 +266,113 @@ class Epu:
 
     """
 
-    _instance = None
+    _AXIS_IDS = {"gap": _recorder.AXIS_GAP, "phase": _recorder.AXIS_PHASE}
 
-    def __new__(cls, *args, **kwargs):
+    def __init__(
+            self, args, callback_update=lambda: 1, callback_status=lambda: 1):
         """."""
-        if cls._instance is None:
-            cls._instance = super(Epu, cls).__new__(cls)
-        return cls._instance
+        self.args = args
+        self._serial_socket = TCPClient(args.beaglebone_addr, args.msg_port)
+        self._gpio_socket = TCPClient(args.beaglebone_addr, args.io_port)
+        self._serial_socket.connect()
+        self._gpio_socket.connect()
+        self.callback_update = callback_update
+        self.callback_status = callback_status
+        # motion history, kept in memory only if no file is given
+        self.recorder = _recorder.MotionRecorder(
+            getattr(args, "recorder_file", None))
+        self.message = None
+        self.rs485_connected = self._gpio_socket.connected
+        self.gpio_connected = self._serial_socket.connected
+        self.tcp_connected = self.rs485_connected and self.gpio_connected
 
-    def __init__(self, args, callback_update=lambda: 1):
-        """."""
-        # Ensure that the instance has not been initialized before
-        if not hasattr(self, "initialized"):
-            self.args = args
-            self._serial_socket = TCPClient(args.beaglebone_addr, args.msg_port)
-            self._gpio_socket = TCPClient(args.beaglebone_addr, args.io_port)
-            self._serial_socket.connect()
-            self._gpio_socket.connect()
-            self.callback_update = callback_update
-            self.message = None
-            self.rs485_connected = self._gpio_socket.connected
-            self.gpio_connected = self._serial_socket.connected
-            self.tcp_connected = self.rs485_connected and self.gpio_connected
-            self.polarization_mode = self._pol_undef
-
-            idname = self.args.pv_prefix
-            self.idparams = _IDSearch.conv_idname_2_parameters(idname)
-            self._pol_state_sel_str = \
-                _IDSearch.conv_idname_2_polarizations(idname)
-            self._pol_state_mon_str = \
-                _IDSearch.conv_idname_2_polarizations_sts(idname)
-            self._pol_none = \
-                self._pol_state_mon_str.index(_IDSearch.POL_NONE_STR)
-            self._pol_undef = \
-                self._pol_state_mon_str.index(_IDSearch.POL_UNDEF_STR)
-
-            self.a_drive = EcoDrive(
-                tcp_client=self._serial_socket,
-                address=_cte.a_drive_address,
-                min_limit=self.idparams.KPARAM_MIN,
-                max_limit=self.idparams.KPARAM_MAX,
-                drive_name="A",
-            )
-
-            self.b_drive = EcoDrive(
-                tcp_client=self._serial_socket,
-                address=_cte.b_drive_address,
-                min_limit=self.idparams.KPARAM_MIN,
-                max_limit=self.idparams.KPARAM_MAX,
-                drive_name="B",
-            )
+        idname = self.args.pv_prefix
+        self.idparams = _IDSearch.conv_idname_2_parameters(idname)
+        self._pol_state_sel_str = \
+            _IDSearch.conv_idname_2_polarizations(idname)
+        self._pol_state_mon_str = \
+            _IDSearch.conv_idname_2_polarizations_sts(idname)
+        self._pol_none = \
+            self._pol_state_mon_str.index(_IDSearch.POL_NONE_STR)
+        self._pol_undef = \
+            self._pol_state_mon_str.index(_IDSearch.POL_UNDEF_STR)
+        self.polarization_mode = self._pol_undef
+
+        self.a_drive = EcoDrive(
+            tcp_client=self._serial_socket,
+            address=_cte.a_drive_address,
+            min_limit=self.idparams.KPARAM_MIN,
+            max_limit=self.idparams.KPARAM_MAX,
+            drive_name="A",
+        )
 
-            self.i_drive = EcoDrive(
-                tcp_client=self._serial_socket,
-                address=_cte.i_drive_address,
-                min_limit=self.idparams.PPARAM_MIN,
-                max_limit=self.idparams.PPARAM_MAX,
-                drive_name="I",
-            )
+        self.b_drive = EcoDrive(
+            tcp_client=self._serial_socket,
+            address=_cte.b_drive_address,
+            min_limit=self.idparams.KPARAM_MIN,
+            max_limit=self.idparams.KPARAM_MAX,
+            drive_name="B",
+        )
 
-            self.s_drive = EcoDrive(
-                tcp_client=self._serial_socket,
-                address=_cte.s_drive_address,
-                min_limit=self.idparams.PPARAM_MIN,
-                max_limit=self.idparams.PPARAM_MAX,
-                drive_name="S",
-            )
+        self.i_drive = EcoDrive(
+            tcp_client=self._serial_socket,
+            address=_cte.i_drive_address,
+            min_limit=self.idparams.PPARAM_MIN,
+            max_limit=self.idparams.PPARAM_MAX,
+            drive_name="I",
+        )
 
-            logger.info("All drives initialized.")
+        self.s_drive = EcoDrive(
+            tcp_client=self._serial_socket,
+            address=_cte.s_drive_address,
+            min_limit=self.idparams.PPARAM_MIN,
+            max_limit=self.idparams.PPARAM_MAX,
+            drive_name="S",
+        )
 
-            # Threads and events
-            self._epu_lock = threading.RLock()
-            self.gap_start_event = threading.Event()
-            self.phase_start_event = threading.Event()
-            self.monitor_phase_movement_thread = Thread(
-                target=self._monitor_phase_movement, daemon=True
-            )
-            self.monitor_gap_movement_thread = Thread(
-                target=self._monitor_gap_movement, daemon=True
-            )
+        logger.info("All drives initialized.")
+
+        # Threads and events
+        # gap and phase operations are serialized per axis; access to
+        # the serial and GPIO links is arbitrated by their schedulers
+        self._gap_lock = threading.RLock()
+        self._phase_lock = threading.RLock()
+        self.gap_start_event = threading.Event()
+        # standstill polling
+        self._drives = (
+            self.a_drive, self.b_drive, self.i_drive, self.s_drive)
+        self._drive_attrs = self._get_drive_attrs()
+        self._axis_drives = {
+            "gap": (self.a_drive, self.b_drive),
+            "phase": (self.i_drive, self.s_drive),
+        }
+        self._drive_axis = {
+            drive.ADDRESS: self._AXIS_IDS[axis]
+            for axis, drives in self._axis_drives.items()
+            for drive in drives}
+        self._static_lock = threading.Lock()
+        self._static_pending = set()
+        self._static_timestamp = time.monotonic()
+        self._standstill_wakeup = threading.Event()
+        # notified whenever positions, targets or motion status change
+        self._state_cond = threading.Condition()
+        self.pol_step_log = []
+        self.phase_start_event = threading.Event()
+        self.monitor_phase_movement_thread = Thread(
+            target=self._monitor_phase_movement, daemon=True
+        )
+        self.monitor_gap_movement_thread = Thread(
+            target=self._monitor_gap_movement, daemon=True
+        )
 
-            self._init_variables()
+        self._init_variables()
 
-            # Starts threads
-            self._standstill_monitoring()
-            self.monitor_phase_movement_thread.start()
-            self.monitor_gap_movement_thread.start()
+        # Starts threads
+        self._standstill_monitoring()
+        self.monitor_phase_movement_thread.start()
+        self.monitor_gap_movement_thread.start()
 
-            self.update_polarization_status()
-            self.initialized = True
+        self.update_polarization_status()
 
     # Motion monitoring
 
@@ -387,10 +437,8 @@ class Epu:
             self.phase_enable and self.phase_halt_released
         )
 
-        self._read_drive_a()
-        self._read_drive_b()
-        self._read_drive_i()
-        self._read_drive_s()
+        self._request_static_refresh(*self._drives)
+        self._poll_drives()
 
         logger.info("Variables initialized.")
 
@@ -399,67 +447,94 @@ class Epu:
             start_event.wait()
             setattr(self, f"{attribute}_is_moving", True)
             target = getattr(self, f"{attribute}_target")
-            with self._epu_lock:
-                logger.info("%s started.", logger_message)
-                drive.connect_to_drive()
-                start = time.monotonic()
-                update_count = 0
-                loop_count = 0
-                prev_value = getattr(self, attribute)
-
-                while start_event.is_set():
-                    value = drive.read_encoder(False)
-                    if isinstance(value, float):
-                        setattr(self, attribute, value)
-                        if attribute == "gap":
-                            setattr(self, f"a_encoder_{attribute}", value)
-                        if attribute == "phase":
-                            setattr(self, f"i_encoder_{attribute}", value)
-                        self.callback_update()
-                        logger.info("%s: %s", attribute, value)
-                        self.update_polarization_status()
-                        update_count += 1
-
-                    if abs(getattr(self, attribute) - target) < 0.001:
+            velocity = getattr(self, f"{attribute}_target_velocity")
+            axis = self._AXIS_IDS[attribute]
+            self.recorder.record_event(
+                axis, _recorder.EVENT_MOVE_START,
+                f"from {getattr(self, attribute)} to {target}")
+            end_reason = "stopped"
+            self.callback_status()
+            # the axis lock is not held during motion: encoder reads go
+            # through the serial bus with motion priority, so they pre-empt
+            # background polling without blocking the other axis
+            logger.info("%s started.", logger_message)
+            start = time.monotonic()
+            update_count = 0
+            loop_count = 0
+            prev_value = getattr(self, attribute)
+
+            while start_event.is_set():
+                try:
+                    with drive.bus.request(PRIO_MOTION):
+                        value = drive.read_encoder()
+                except (ValueError, TypeError):
+                    value = None
+                if isinstance(value, float):
+                    setattr(self, attribute, value)
+                    if attribute == "gap":
+                        setattr(self, f"a_encoder_{attribute}", value)
+                    if attribute == "phase":
+                        setattr(self, f"i_encoder_{attribute}", value)
+                    self.callback_update()
+                    self.recorder.record_sample(axis, value, target, velocity)
+                    self.update_polarization_status()
+                    self._notify_state()
+                    update_count += 1
+
+                if abs(getattr(self, attribute) - target) < 0.001:
+                    try:
+                        with drive.bus.request(PRIO_MOTION):
+                            pos_reached = \
+                                drive.get_target_position_reached()
+                    except Exception as e:
+                        logger.debug("Falied to read target position reached bit.")
+                    if True:
+                        if not pos_reached:
+                            logger.debug(f"Position reached status is FALSE.")
+                        else:
+                            logger.debug(f"Position reached status is TRUE.")
+                        start_event.clear()
+                        setattr(self, f"{attribute}_is_moving", False)
+                        end_reason = "target reached"
+                        end = time.monotonic()
+                        logger.info(
+                            f"{logger_message} finished. Update rate: {int(update_count / (end - start))}"
+                        )
+
+                if loop_count >= 10:
+                    if getattr(self, attribute) == prev_value:
                         try:
-                            pos_reached = drive.get_target_position_reached()
+                            with drive.bus.request(PRIO_MOTION):
+                                pos_reached = \
+                                    drive.get_target_position_reached()
                         except Exception as e:
-                            logger.debug("Falied to read target position reached bit.")
+                            logger.debug(
+                                f"Falied to read target position reached bit."
+                            )
+                            logger.debug(e)
                         if True:
                             if not pos_reached:
                                 logger.debug(f"Position reached status is FALSE.")
                             else:
                                 logger.debug(f"Position reached status is TRUE.")
+                            logger.warning(
+                                f"{logger_message} stopped because {attribute} has not changed after 10 loops."
+                            )
                             start_event.clear()
                             setattr(self, f"{attribute}_is_moving", False)
-                            end = time.monotonic()
-                            logger.info(
-                                f"{logger_message} finished. Update rate: {int(update_count / (end - start))}"
-                            )
+                            end_reason = "stalled"
+                    loop_count = 0
+                    prev_value = getattr(self, attribute)
+                else:
+                    loop_count += 1
 
-                    if loop_count >= 10:
-                        if getattr(self, attribute) == prev_value:
-                            try:
-                                pos_reached = drive.get_target_position_reached()
-                            except Exception as e:
-                                logger.debug(
-                                    f"Falied to read target position reached bit."
-                                )
-                                logger.debug(e)
-                            if True:
-                                if not pos_reached:
-                                    logger.debug(f"Position reached status is FALSE.")
-                                else:
-                                    logger.debug(f"Position reached status is TRUE.")
-                                logger.warning(
-                                    f"{logger_message} stopped because {attribute} has not changed after 10 loops."
-                                )
-                                start_event.clear()
-                                setattr(self, f"{attribute}_is_moving", False)
-                        loop_count = 0
-                        prev_value = getattr(self, attribute)
-                    else:
-                        loop_count += 1
+            self.recorder.record_event(
+                axis, _recorder.EVENT_MOVE_END,
+                f"{end_reason} at {getattr(self, attribute)}")
+            # resolver and targets may have changed during motion
+            self._wake_standstill_poller(*self._axis_drives[attribute])
+            self._notify_state()
+            self.callback_status()
 
     def _monitor_gap_movement(self):
         self._monitor_movement(
@@ -471,19 +546,92 @@ class Epu:
             self.phase_start_event, self.i_drive, "phase", "Phase movement"
         )
 
-    @utils.run_periodically_in_detached_thread(interval=2)
     def _standstill_monitoring(self):
-        """Read sensor data and monitor the communications."""
-        self._check_allowed_to_change()
-        self._reconnect_io_serial()
-
-        # read data and save it as attributes
-        self._read_drive_a()
-        self._read_drive_b()
-        self._read_drive_i()
-        self._read_drive_s()
+        """Start the standstill poller thread."""
+        self._standstill_thread = Thread(
+            target=self._standstill_poller, daemon=True)
+        self._standstill_thread.start()
+
+    def _standstill_poller(self):
+        """Read sensor data and monitor the communications.
+
+        Position readbacks and diagnostic codes are polled at a fast rate.
+        Target positions and velocities only change on writes and the other
+        position reading of each drive is static at standstill, so they are
+        read after writes, after motion and at a slow heartbeat. The fast
+        interval backs off while the serial link is busy with higher
+        priority requests and recovers once it is free again.
+        """
+        interval = _cte.standstill_fast_interval
+        while True:
+            self._check_allowed_to_change()
+            self._reconnect_io_serial()
+
+            now = time.monotonic()
+            if now - self._static_timestamp >= _cte.standstill_slow_interval:
+                self._static_timestamp = now
+                self._request_static_refresh(*self._drives)
+            busy = self._poll_drives()
+            self._update_axes_status()
+            self._notify_state()
+            self.callback_status()
+
+            if busy:
+                interval = min(2 * interval, _cte.standstill_max_interval)
+            else:
+                interval = max(interval / 2, _cte.standstill_fast_interval)
+            self._standstill_wakeup.wait(interval)
+            self._standstill_wakeup.clear()
+
+    def _notify_state(self):
+        """Wake up threads waiting for a state change."""
+        with self._state_cond:
+            self._state_cond.notify_all()
+
+    def _wait_for_state(self, predicate, timeout) -> bool:
+        """Wait until predicate is true, re-evaluating on state changes."""
+        with self._state_cond:
+            return self._state_cond.wait_for(predicate, timeout)
+
+    def _request_static_refresh(self, *drives):
+        """Mark static values of drives to be read on next poll cycle."""
+        with self._static_lock:
+            self._static_pending.update(drive.ADDRESS for drive in drives)
+
+    def _wake_standstill_poller(self, *drives):
+        """Refresh static values of drives as soon as possible."""
+        self._request_static_refresh(*drives)
+        self._standstill_wakeup.set()
+
+    def _poll_drives(self) -> bool:
+        """Read all drives and return whether the serial link was busy."""
+        busy = False
+        for drive in self._drives:
+            with self._static_lock:
+                read_static = drive.ADDRESS in self._static_pending
+                self._static_pending.discard(drive.ADDRESS)
+            try:
+                values, waited = self._read_drive(drive, read_static)
+            except (ValueError, TypeError):
+                if read_static:
+                    self._request_static_refresh(drive)
+                continue
+            busy |= waited > _cte.standstill_busy_wait
+            attrs = self._drive_attrs[drive.ADDRESS]
+            diag_code = values.get("diag_code")
+            if diag_code is not None and \
+                    diag_code != getattr(self, attrs["diag_code"], None):
+                self.recorder.record_event(
+                    self._drive_axis[drive.ADDRESS], _recorder.EVENT_DIAG,
+                    f"{drive.DRIVE_NAME}: {diag_code}")
+            for name, value in values.items():
+                setattr(self, attrs[name], value)
+        self.gap_target_velocity = self.a_target_velocity
+        self.phase_target_velocity = self.i_target_velocity
+        return busy
 
-        # get gap and phase info from respective encoders and drives
+    def _update_axes_status(self):
+        """Update gap and phase info from respective encoders and drives."""
         self.gap_target = self.a_target_position
         self.gap = self.a_encoder_gap
         self.gap_enable_and_halt_released = \
@@ -525,25 +673,44 @@ class Epu:
             self._gpio_socket.connected and self._serial_socket.connected
         )
 
-    def _read_drive(self, drive):
+    def _read_drive(self, drive, read_static=True):
         """
         Read the sensor data from a drive.
+
+        Concurrent requests for the same drive are coalesced into a single
+        bus transaction sequence. Returns the readings and the time waited
+        for the serial link.
         """
-        with self._epu_lock:
+        return drive.bus.coalesce(
+            ("standstill", drive.ADDRESS, read_static),
+            self._read_drive_sequence, drive, read_static)
+
+    def _read_drive_sequence(self, drive, read_static):
+        # the bus is held across the sequence since only the first
+        # request addresses the drive
+        t0_ = time.monotonic()
+        with drive.bus.request(PRIO_POLL):
+            waited = time.monotonic() - t0_
+            # NOTE: at standstill the phase readback comes from drive I
+            # resolver, the other drives use their encoders
+            if drive.ADDRESS == self.i_drive.ADDRESS:
+                fast, slow = "resolver", "encoder"
+            else:
+                fast, slow = "encoder", "resolver"
+            read = {
+                "resolver": drive.read_resolver,
+                "encoder": drive.read_encoder}
             try:
-                drive_resolver_gap = drive.read_resolver(True)
-                drive_encoder_gap = drive.read_encoder(False)
-                drive_target_position = drive.get_target_position(False)
-                drive_diag_code = drive.get_diagnostic_code(False)
-                drive_target_velocity = drive.get_max_velocity(False)
-
-                return (
-                    drive_resolver_gap,
-                    drive_encoder_gap,
-                    drive_target_position,
-                    drive_diag_code,
-                    drive_target_velocity,
-                )
+                values = {
+                    fast: read[fast](True),
+                    "diag_code": drive.get_diagnostic_code(False),
+                }
+                if read_static:
+                    values[slow] = read[slow](False)
+                    values["target_position"] = \
+                        drive.get_target_position(False)
+                    values["target_velocity"] = drive.get_max_velocity(False)
+                return values, waited
 
             except (ValueError, TypeError) as e:
                 logger.debug(
@@ -552,62 +719,31 @@ class Epu:
                 logger.debug(e)
                 raise
 
-    def _read_drive_a(self):
-        try:
-            (
-                self.a_resolver_gap,
-                self.a_encoder_gap,
-                self.a_target_position,
-                self.a_diag_code,
-                self.a_target_velocity,
-            ) = self._read_drive(self.a_drive)
-            self.gap_target_velocity = self.a_target_velocity
-        except (ValueError, TypeError):
-            pass
-
-    def _read_drive_b(self):
-        try:
-            (
-                self.b_resolver_gap,
-                self.b_encoder_gap,
-                self.b_target_position,
-                self.b_diag_code,
-                self.b_target_velocity,
-            ) = self._read_drive(self.b_drive)
-        except (ValueError, TypeError):
-            pass
-
-    def _read_drive_i(self):
-        try:
-            (
-                self.i_encoder_phase,
-                self.i_resolver_phase,
-                self.i_target_position,
-                self.i_diag_code,
-                self.i_target_velocity,
-            ) = self._read_drive(self.i_drive)
-            self.phase_target_velocity = self.i_target_velocity
-        except (ValueError, TypeError):
-            pass
-
-    def _read_drive_s(self):
-        try:
-            (
-                self.s_resolver_phase,
-                self.s_encoder_phase,
-                self.s_target_position,
-                self.s_diag_code,
-                self.s_target_velocity,
-            ) = self._read_drive(self.s_drive)
-        except (ValueError, TypeError):
-            pass
+    def _get_drive_attrs(self):
+        """Map drive readings to Epu attribute names, by drive address."""
+        drive_attrs = dict()
+        for drive, var, axis in (
+                (self.a_drive, "a", "gap"), (self.b_drive, "b", "gap"),
+                (self.i_drive, "i", "phase"), (self.s_drive, "s", "phase")):
+            drive_attrs[drive.ADDRESS] = {
+                "resolver": f"{var}_resolver_{axis}",
+                "encoder": f"{var}_encoder_{axis}",
+                "diag_code": f"{var}_diag_code",
+                "target_position": f"{var}_target_position",
+                "target_velocity": f"{var}_target_velocity",
+            }
+        # NOTE: at standstill the phase readback comes from drive I resolver
+        attrs = drive_attrs[self.i_drive.ADDRESS]
+        attrs["resolver"], attrs["encoder"] = \
+            attrs["encoder"], attrs["resolver"]
+        return drive_attrs
 
     @property
     def gap_setpoint(self):
         """
         Returns the target position of the drives for a gap operation.
         """
-        with self._epu_lock:
+        with self._gap_lock:
             try:
                 return get_setpoint(self.a_drive, self.b_drive)
             except RuntimeError:
@@ -619,7 +755,7 @@ class Epu:
         """
         Returns the target position of the drives for a phase operation.
         """
-        with self._epu_lock:
+        with self._phase_lock:
             try:
                 return get_setpoint(self.i_drive, self.s_drive)
             except RuntimeError:
@@ -629,62 +765,72 @@ class Epu:
     def _set_drive_values(self, value: float, func: callable) -> bool:
         attempts = 0
         while attempts < 3:
-            with self._epu_lock:
-                try:
-                    return func(value)
-                except (utils.DriveCOMError, ValueError):
-                    logger.error("Could not set drive value.")
-                    time.sleep(0.5)
-                    attempts += 1
-                    logger.error("Could not set drive value.")
-                    raise
+            try:
+                return func(value)
+            except (utils.DriveCOMError, ValueError):
+                logger.error("Could not set drive value.")
+                time.sleep(0.5)
+                attempts += 1
+                logger.error("Could not set drive value.")
+                raise
 
     def _set_undulator_property(
         self, movement_property, value, undulator_property
     ) -> bool:
-        with self._epu_lock:
-            drive_funcs = {
-                ("position", "gap"): (
-                    self.a_drive.set_target_position,
-                    self.b_drive.set_target_position,
-                ),
-                ("velocity", "gap"): (
-                    self.a_drive.set_target_velocity,
-                    self.b_drive.set_target_velocity,
-                ),
-                ("position", "phase"): (
-                    self.i_drive.set_target_position,
-                    self.s_drive.set_target_position,
-                ),
-                ("velocity", "phase"): (
-                    self.i_drive.set_target_velocity,
-                    self.s_drive.set_target_velocity,
-                ),
-            }
-
-            func1, func2 = drive_funcs.get((movement_property, undulator_property))
-            if func1 is not None:
-                try:
-                    self._set_drive_values(value, func1)
-                except (utils.DriveCOMError, ValueError):
-                    logger.error("Could not set drive value.")
-                    return False
-                else:
+        axis_lock = \
+            self._gap_lock if undulator_property == "gap" else self._phase_lock
+        self.recorder.record_event(
+            self._AXIS_IDS[undulator_property], _recorder.EVENT_COMMAND,
+            f"set {movement_property} {value}")
+        with axis_lock:
+            try:
+                drive_funcs = {
+                    ("position", "gap"): (
+                        self.a_drive.set_target_position,
+                        self.b_drive.set_target_position,
+                    ),
+                    ("velocity", "gap"): (
+                        self.a_drive.set_target_velocity,
+                        self.b_drive.set_target_velocity,
+                    ),
+                    ("position", "phase"): (
+                        self.i_drive.set_target_position,
+                        self.s_drive.set_target_position,
+                    ),
+                    ("velocity", "phase"): (
+                        self.i_drive.set_target_velocity,
+                        self.s_drive.set_target_velocity,
+                    ),
+                }
+
+                func1, func2 = drive_funcs.get((movement_property, undulator_property))
+                if func1 is not None:
                     try:
-                        self._set_drive_values(value, func2)
+                        self._set_drive_values(value, func1)
                     except (utils.DriveCOMError, ValueError):
-                        logger.warning(
-                            f"Could not set {undulator_property} {movement_property} on drive B. \
-                            {undulator_property} {movement_property} drives may have different target values."
-                        )
-                        self.message = f"{undulator_property} {movement_property} drives may have different target values."
-                        self.gap_change_allowed = False
+                        logger.error("Could not set drive value.")
                         return False
+                    else:
+                        try:
+                            self._set_drive_values(value, func2)
+                        except (utils.DriveCOMError, ValueError):
+                            logger.warning(
+                                f"Could not set {undulator_property} {movement_property} on drive B. \
+                                {undulator_property} {movement_property} drives may have different target values."
+                            )
+                            self.message = f"{undulator_property} {movement_property} drives may have different target values."
+                            self.gap_change_allowed = False
+                            return False
+                return True
+            finally:
+                # read back the new targets on the next standstill poll
+                self._wake_standstill_poller(
+                    *self._axis_drives[undulator_property])
 
     def gap_set(self, target: float) -> bool:
         """."""
         if self.idparams.KPARAM_MIN <= target <= self.idparams.KPARAM_MAX:
-            self._set_undulator_property("position", target, "gap")
+            return self._set_undulator_property("position", target, "gap")
         else:
             logger.error(f"Gap value given, ({target}), is out of range.")
             return False
@@ -694,7 +840,7 @@ class Epu:
         min_vel = _cte.minimum_velo_mm_per_min
         max_vel = _cte.maximum_velo_mm_per_min
         if min_vel <= target <= max_vel:
-            self._set_undulator_property("velocity", target, "gap")
+            return self._set_undulator_property("velocity", target, "gap")
         else:
             logger.error(
                 f"Velocity ({target}) mm/s is out of range \
@@ -704,14 +850,14 @@ class Epu:
 
     def phase_set(self, target: float) -> bool:
         if self.idparams.PPARAM_MIN <= target <= self.idparams.PPARAM_MAX:
-            self._set_undulator_property("position", target, "phase")
+            return self._set_undulator_property("position", target, "phase")
         else:
             logger.error(f"Phase value given, ({target}), is out of range.")
             return False
 
     def phase_set_velocity(self, target: float) -> bool:
         if _cte.minimum_velo_mm_per_min <= target <= _cte.maximum_velo_mm_per_min:
-            self._set_undulator_property("velocity", target, "phase")
+            return self._set_undulator_property("velocity", target, "phase")
         else:
             logger.error(
                 f"Velocity ({target}) mm/s is out of range \
@@ -721,15 +867,22 @@ class Epu:
 
     def _gap_check_for_move(self) -> bool:
         retry_count = 3
-        with self._epu_lock:
+        bus = self.a_drive.bus
+        with self._gap_lock:
             while retry_count > 0:
                 try:
-                    drive_a_max_velocity = self.a_drive.get_max_velocity(True)
-                    drive_a_target_position = self.a_drive.get_target_position(False)
-                    drive_a_diag_code = self.a_drive.get_diagnostic_code(False)
-                    drive_b_max_velocity = self.b_drive.get_max_velocity(True)
-                    drive_b_target_position = self.b_drive.get_target_position(False)
-                    drive_b_diag_code = self.b_drive.get_diagnostic_code(False)
+                    with bus.request(PRIO_COMMAND):
+                        drive_a_max_velocity = self.a_drive.get_max_velocity(
+                            True, _cte.param_cache_max_age)
+                        drive_a_target_position = self.a_drive.get_target_position(
+                            False, _cte.param_cache_max_age)
+                        drive_a_diag_code = self.a_drive.get_diagnostic_code(False)
+                    with bus.request(PRIO_COMMAND):
+                        drive_b_max_velocity = self.b_drive.get_max_velocity(
+                            True, _cte.param_cache_max_age)
+                        drive_b_target_position = self.b_drive.get_target_position(
+                            False, _cte.param_cache_max_age)
+                        drive_b_diag_code = self.b_drive.get_diagnostic_code(False)
 
                     if drive_a_max_velocity != drive_b_max_velocity:
                         logger.warning("Gap drives have different maximum velocities.")
@@ -782,15 +935,22 @@ class Epu:
 
     def _phase_check_for_move(self) -> bool:
         retry_count = 3
-        with self._epu_lock:
+        bus = self.i_drive.bus
+        with self._phase_lock:
             while retry_count > 0:
                 try:
-                    drive_i_max_velocity = self.i_drive.get_max_velocity(True)
-                    drive_i_target_position = self.i_drive.get_target_position(False)
-                    drive_i_diag_code = self.i_drive.get_diagnostic_code(False)
-                    drive_s_max_velocity = self.s_drive.get_max_velocity(True)
-                    drive_s_target_position = self.s_drive.get_target_position(False)
-                    drive_s_diag_code = self.s_drive.get_diagnostic_code(False)
+                    with bus.request(PRIO_COMMAND):
+                        drive_i_max_velocity = self.i_drive.get_max_velocity(
+                            True, _cte.param_cache_max_age)
+                        drive_i_target_position = self.i_drive.get_target_position(
+                            False, _cte.param_cache_max_age)
+                        drive_i_diag_code = self.i_drive.get_diagnostic_code(False)
+                    with bus.request(PRIO_COMMAND):
+                        drive_s_max_velocity = self.s_drive.get_max_velocity(
+                            True, _cte.param_cache_max_age)
+                        drive_s_target_position = self.s_drive.get_target_position(
+                            False, _cte.param_cache_max_age)
+                        drive_s_diag_code = self.s_drive.get_diagnostic_code(False)
 
                     if drive_i_max_velocity != drive_s_max_velocity:
                         logger.warning(
@@ -845,11 +1005,18 @@ class Epu:
 
     # GPIO gap functions
 
+    def _axis_lock_for(self, axis, val):
+        """Return the axis lock, or a null context for stop actions."""
+        if not val:
+            return contextlib.nullcontext()
+        return self._gap_lock if axis == "gap" else self._phase_lock
+
     def gap_set_enable(self, val: bool):
         """
         Enables or disables gap motors.
         """
-        with self._epu_lock:
+        # disabling/halting is a stop action and must not wait for the axis
+        with self._axis_lock_for("gap", val):
             if not val and self.gap_halt_status():
                 self.message = "Gap is not halted."
                 logger.info("To disable the gap, it must be halted first.")
@@ -872,7 +1039,8 @@ class Epu:
         """
         Halts or releases gap motors.
         """
-        with self._epu_lock:
+        # disabling/halting is a stop action and must not wait for the axis
+        with self._axis_lock_for("gap", val):
             if val and not self.gap_enable_status():
                 self.message = "Gap is not enabled."
                 logger.info("To halt the gap, it must be enabled.")
@@ -895,8 +1063,9 @@ class Epu:
 
     def gap_start(self, val: bool) -> bool:
         logger.debug("Gap start function called.")
-        with self._epu_lock:
-            allow_move = self._gap_check_for_move()
+        self.recorder.record_event(
+            _recorder.AXIS_GAP, _recorder.EVENT_COMMAND, f"start {val}")
+        allow_move = self._gap_check_for_move()
 
         if allow_move:
             logger.debug("Gap is ok to move.")
@@ -923,48 +1092,50 @@ class Epu:
         self.gap_set_halt(val)
 
     def gap_enable_status(self) -> bool:
-        with self._epu_lock:
-            try:
-                status = bool(
-                    read_digital_status(self._gpio_socket, _cte.ENABLE_CH_AB)[-2]
-                )
+        try:
+            status = bool(
+                read_digital_status(self._gpio_socket, _cte.ENABLE_CH_AB)[-2]
+            )
 
-            except (IndexError, TypeError):
-                status = False
+        except (IndexError, TypeError):
+            status = False
 
-            return status
+        return status
 
     def gap_halt_status(self) -> bool:
-        with self._epu_lock:
-            try:
-                status = bool(
-                    read_digital_status(self._gpio_socket, _cte.HALT_CH_AB)[-2]
-                )
+        try:
+            status = bool(
+                read_digital_status(self._gpio_socket, _cte.HALT_CH_AB)[-2]
+            )
 
-            except (IndexError, TypeError):
-                status = False
+        except (IndexError, TypeError):
+            status = False
 
-            return status
+        return status
 
     gap_halt_release_status = gap_halt_status
 
     def gap_stop(self) -> None:
-        timeout_count = 10
-        while self.gap_halt_release_status():
-            self.gap_release_halt(False)
-            timeout_count -= 1
-            if not timeout_count:
-                break
-
-        timeout_count = 10
-        while self.gap_enable_status():
-            self.gap_set_enable(False)
-            timeout_count -= 1
-            if not timeout_count:
-                break
+        self.recorder.record_event(
+            _recorder.AXIS_GAP, _recorder.EVENT_COMMAND, "stop")
+        # stop pre-empts any pending GPIO request
+        with self._gpio_socket.bus.request(PRIO_MOTION):
+            timeout_count = 10
+            while self.gap_halt_release_status():
+                self.gap_release_halt(False)
+                timeout_count -= 1
+                if not timeout_count:
+                    break
+
+            timeout_count = 10
+            while self.gap_enable_status():
+                self.gap_set_enable(False)
+                timeout_count -= 1
+                if not timeout_count:
+                    break
 
     def gap_turn_on(self) -> bool:
-        with self._epu_lock:
+        with self._gap_lock:
             bsmp_enable_message = utils.bsmp_send(
                 _cte.BSMP_WRITE, variableID=_cte.RESET_CH_AB, value=1
             ).encode()
@@ -977,7 +1148,8 @@ class Epu:
         """
         Enables or disables phase motors.
         """
-        with self._epu_lock:
+        # disabling/halting is a stop action and must not wait for the axis
+        with self._axis_lock_for("phase", val):
             if not val and self.phase_halt_status():
                 self.message = "Phase is not halted."
                 return False
@@ -999,7 +1171,8 @@ class Epu:
         """
         Halts or releases phase motors.
         """
-        with self._epu_lock:
+        # disabling/halting is a stop action and must not wait for the axis
+        with self._axis_lock_for("phase", val):
             if val and not self.phase_enable_status():
                 self.message = "Phase is not halted."
                 return False
@@ -1021,7 +1194,9 @@ class Epu:
 
     def phase_start(self, val: bool) -> bool:
         logger.debug("Phase start function called.")
-        with self._epu_lock:
+        self.recorder.record_event(
+            _recorder.AXIS_PHASE, _recorder.EVENT_COMMAND, f"start {val}")
+        with self._phase_lock:
             if self._phase_check_for_move():
                 logger.debug("Phase is ok to move.")
                 bsmp_enable_message = utils.bsmp_send(
@@ -1052,50 +1227,52 @@ class Epu:
             self.phase_set_halt(val)
 
     def phase_enable_status(self):
-        with self._epu_lock:
-            try:
-                status = bool(
-                    read_digital_status(self._gpio_socket, _cte.ENABLE_CH_SI)[-2]
-                )
+        try:
+            status = bool(
+                read_digital_status(self._gpio_socket, _cte.ENABLE_CH_SI)[-2]
+            )
 
-            except (IndexError, TypeError):
-                status = False
+        except (IndexError, TypeError):
+            status = False
 
-            return status
+        return status
 
     def phase_halt_status(self):
-        with self._epu_lock:
-            try:
-                status = bool(
-                    read_digital_status(self._gpio_socket, _cte.HALT_CH_SI)[-2]
-                )
+        try:
+            status = bool(
+                read_digital_status(self._gpio_socket, _cte.HALT_CH_SI)[-2]
+            )
 
-            except (IndexError, TypeError):
-                status = False
+        except (IndexError, TypeError):
+            status = False
 
-            return status
+        return status
 
     phase_halt_release_status = phase_halt_status
 
     def phase_stop(self):
-        timeout_count = 10
-        while self.phase_halt_release_status():
-            self.phase_release_halt(False)
-            time.sleep(0.1)
-            timeout_count -= 1
-            if not timeout_count:
-                break
-        timeout_count = 10
+        self.recorder.record_event(
+            _recorder.AXIS_PHASE, _recorder.EVENT_COMMAND, "stop")
+        # stop pre-empts any pending GPIO request
+        with self._gpio_socket.bus.request(PRIO_MOTION):
+            timeout_count = 10
+            while self.phase_halt_release_status():
+                self.phase_release_halt(False)
+                time.sleep(0.1)
+                timeout_count -= 1
+                if not timeout_count:
+                    break
+            timeout_count = 10
 
-        while self.phase_enable_status():
-            self.phase_set_enable(False)
-            time.sleep(0.1)
-            timeout_count -= 1
-            if not timeout_count:
-                break
+            while self.phase_enable_status():
+                self.phase_set_enable(False)
+                time.sleep(0.1)
+                timeout_count -= 1
+                if not timeout_count:
+                    break
 
     def phase_turn_on(self) -> bool:
-        with self._epu_lock:
+        with self._phase_lock:
             bsmp_enable_message = utils.bsmp_send(
                 _cte.BSMP_WRITE, variableID=_cte.RESET_CH_SI, value=1
             ).encode()
@@ -1113,6 +1290,20 @@ class Epu:
         self.gap_stop()
         self.phase_stop()
 
+    def clear_error_all(self):
+        """Clear errors of all drives, even if some of them fail."""
+        failed = []
+        for drive in (
+                self.a_drive, self.b_drive, self.s_drive, self.i_drive):
+            try:
+                drive.clear_error()
+            except utils.DriveCOMError as e:
+                logger.error(e)
+                failed.append(drive.DRIVE_NAME)
+        if failed:
+            raise utils.DriveCOMError(
+                f"Could not clear errors of drives {', '.join(failed)}.")
+
     def set_polarization(self, mode: int) -> bool:
         """Set polarization.
             circular negative (mode=0),
@@ -1127,35 +1318,94 @@ class Epu:
         return True
 
     def polarization_motion(self, start: bool = False) -> None:
-        """Open gap to parked gap and go to <phase>."""
+        """Open gap to parked gap and go to <phase>.
+
+        The phase starts moving as soon as the gap is open beyond the
+        polarization change gap, overlapping the end of the gap motion.
+        """
         if not start:
             return
 
         self.pol_is_moving = True
+        steps = _StepLog("Polarization change")
+        try:
+            self._polarization_sequence(steps)
+        finally:
+            # finalize polarization movement
+            self.pol_is_moving = False
+            self.pol_step_log = steps.steps
+            steps.log()
+
+    def _polarization_sequence(self, steps: _StepLog) -> bool:
+        params = self.idparams
+        target_gap = params.KPARAM_PARKED
+        pol_change_gap = params.KPARAM_POL_CHANGE
+        if pol_change_gap is None:
+            pol_change_gap = target_gap
+        target_phase = _IDSearch.conv_idname_2_polarization_pparameter(
+            self.args.pv_prefix, self.polarization_mode)
+
+        def gap_open():
+            return self.gap is not None and \
+                self.gap >= pol_change_gap - params.KPARAM_TOL
+
+        def references_read():
+            return (
+                self.gap_target is not None
+                and self.phase_target is not None
+                and abs(self.gap_target - target_gap) <= params.KPARAM_TOL
+                and abs(self.phase_target - target_phase) <= params.PPARAM_TOL
+            )
 
         # set references
-        idname = self.args.pv_prefix
-        idparams = _IDSearch.conv_idname_2_parameters(idname)
-        target_gap = idparams.KPARAM_PARKED
-        target_phase = _IDSearch.conv_idname_2_polarization_pparameter(
-            idname, self.polarization_mode)
-        self.gap_set(target_gap)
-        self.phase_set(target_phase)
-        time.sleep(2)  # TODO: implement checking RB
+        if not self.gap_set(target_gap) or not self.phase_set(target_phase):
+            logger.error("Polarization change: could not set references.")
+            return False
+        steps.mark("set references")
+        if not self._wait_for_state(
+                references_read, _cte.pol_readback_timeout):
+            logger.error("Polarization change: references not read back.")
+            return False
+        steps.mark("read back references")
 
-        # gap movement
-        self.gap_start(True)
-        while self.gap_is_moving:
-            time.sleep(0.2)
+        # gap movement, phase may start once the gap is open enough
+        if not gap_open():
+            if not self.gap_start(True):
+                logger.error("Polarization change: gap did not start.")
+                return False
+            steps.mark("start gap")
+            self._wait_for_state(
+                lambda: gap_open() or not self.gap_start_event.is_set(),
+                _cte.pol_motion_timeout)
+            if not gap_open():
+                logger.error(
+                    "Polarization change: gap did not reach %s mm.",
+                    pol_change_gap)
+                return False
+            steps.mark("open gap")
 
         # phase movement
-        self.phase_start(True)
+        if not self.phase_start(True):
+            logger.error("Polarization change: phase did not start.")
+            return False
         self.polarization = self._pol_none
-        while self.phase_is_moving:
-            time.sleep(0.2)
+        steps.mark("start phase")
+        if not self._wait_for_state(
+                lambda: not (
+                    self.gap_start_event.is_set()
+                    or self.phase_start_event.is_set()),
+                _cte.pol_motion_timeout):
+            logger.error("Polarization change: motion timed out.")
+            return False
+        steps.mark("finish motion")
+        return True
 
-        # finalize polarization movement
-        self.pol_is_moving = False
+    def get_bus_stats(self, reset: bool = False) -> dict:
+        """Return wait/hold time statistics of the serial and GPIO links."""
+        return {
+            "serial": self._serial_socket.bus.get_stats(reset=reset),
+            "gpio": self._gpio_socket.bus.get_stats(reset=reset),
+        }
 
     def update_polarization_status(self) -> int:
         """Update polarization status."""
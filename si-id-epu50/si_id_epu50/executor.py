@@ -0,0 +1,136 @@
+"""Command executor module.
+
+Operator commands are executed by one worker thread per lane (axis), in
+arrival order. Each lane has a bounded queue; a command identical to one
+already waiting in the queue is not queued again, so repeated button
+presses do not multiply serial traffic. Stop commands cancel the commands
+waiting in the lanes they stop.
+"""
+
+import collections
+import threading
+import time
+import traceback
+
+# command completion status
+STATUS_DONE = "Done"
+STATUS_FAILED = "Failed"
+STATUS_CANCELLED = "Cancelled"
+
+
+class Command:
+    """Command waiting for or under execution."""
+
+    def __init__(self, reason, func, args):
+        """."""
+        self.reason = reason
+        self.func = func
+        self.args = args
+        self.key = (reason, func, args)
+        self.submitted = time.monotonic()
+        self.status = None
+        self.elapsed = None
+        self.error = None
+
+
+class _Lane:
+    """Bounded command queue served by a worker thread."""
+
+    def __init__(self, executor, name, maxsize):
+        self.executor = executor
+        self.name = name
+        self.maxsize = maxsize
+        self.pending = collections.deque()
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(
+            target=self._worker, name=f"cmd-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, command):
+        with self.cond:
+            if any(cmd.key == command.key for cmd in self.pending):
+                return True
+            if len(self.pending) >= self.maxsize:
+                return False
+            self.pending.append(command)
+            self.cond.notify()
+        self.executor.on_queue(self.name, len(self.pending))
+        return True
+
+    def cancel(self):
+        with self.cond:
+            cancelled = list(self.pending)
+            self.pending.clear()
+        for command in cancelled:
+            self.executor.finish(self.name, command, STATUS_CANCELLED)
+        if cancelled:
+            self.executor.on_queue(self.name, 0)
+        return len(cancelled)
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                command = self.pending.popleft()
+            self.executor.on_queue(self.name, len(self.pending))
+            self.executor.run(self.name, command)
+
+
+class CommandExecutor:
+    """Execute commands in per-lane worker threads.
+
+    on_start(lane, command) and on_done(lane, command) are called before
+    and after each command execution; on_done is also called for
+    cancelled commands. on_queue(lane, length) is called when the number
+    of waiting commands of a lane changes.
+    """
+
+    def __init__(
+        self, lanes, maxsize=4,
+        on_start=lambda lane, cmd: 1,
+        on_done=lambda lane, cmd: 1,
+        on_queue=lambda lane, length: 1,
+    ):
+        """."""
+        self.on_start = on_start
+        self.on_done = on_done
+        self.on_queue = on_queue
+        self._lanes = {name: _Lane(self, name, maxsize) for name in lanes}
+
+    def submit(self, lane, reason, func, *args):
+        """Queue command, return False if the lane queue is full."""
+        return self._lanes[lane].submit(Command(reason, func, args))
+
+    def cancel(self, *lanes):
+        """Cancel commands waiting in lanes, return number cancelled."""
+        return sum(self._lanes[lane].cancel() for lane in lanes)
+
+    def execute_now(self, lane, reason, func, *args):
+        """Execute command immediately in a new thread, bypassing queues."""
+        command = Command(reason, func, args)
+        threading.Thread(
+            target=self.run, args=(lane, command), daemon=True).start()
+        return True
+
+    def queue_length(self, lane):
+        """Number of commands waiting in lane."""
+        return len(self._lanes[lane].pending)
+
+    def run(self, lane, command):
+        """Execute command and report its completion."""
+        self.on_start(lane, command)
+        status = STATUS_DONE
+        try:
+            if command.func(*command.args) is False:
+                status = STATUS_FAILED
+        except Exception:
+            command.error = traceback.format_exc()
+            status = STATUS_FAILED
+        self.finish(lane, command, status)
+
+    def finish(self, lane, command, status):
+        """Set command completion status and report it."""
+        command.status = status
+        command.elapsed = time.monotonic() - command.submitted
+        self.on_done(lane, command)
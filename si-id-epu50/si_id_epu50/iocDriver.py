@@ -1,8 +1,8 @@
 """IOC driver module."""
 
 
+import functools
 import threading
-import traceback
 import time
 import pcaspy
 
@@ -11,31 +11,198 @@ from siriuspy.search import IDSearch as _IDSearch
 from . import constants as _cte
 from . import csdev as _db
 from . import epu as _epu
+from . import executor as _executor
+
+
+_NOT_PUBLISHED = object()
+
+# command lanes and their last command, elapsed time and queue length PVs
+_GAP = "Gap"
+_PHASE = "Phase"
+_DRIVES = "Drives"
+_CMD_PVS = {
+    _GAP: (_db.pv_gap_cmd_last_mon, _db.pv_gap_cmd_elapsed_mon,
+           _db.pv_gap_cmd_queue_mon),
+    _PHASE: (_db.pv_phase_cmd_last_mon, _db.pv_phase_cmd_elapsed_mon,
+             _db.pv_phase_cmd_queue_mon),
+    _DRIVES: (_db.pv_drives_cmd_last_mon, _db.pv_drives_cmd_elapsed_mon,
+              _db.pv_drives_cmd_queue_mon),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _diag_msg(diag_code):
+    """Return the diagnostic message of a drive diagnostic code."""
+    return _cte.drive_diag_msgs.get(diag_code, _cte.default_unknown_diag_msg)
+
+
+def _bool_num(value):
+    """Convert a truth value to bool enum value."""
+    return _cte.bool_yes if value else _cte.bool_no
+
+
+def _velo(value):
+    """Convert velocity from mm/min to mm/s."""
+    return None if value is None else value / 60
+
+
+def _epu_connected(drv):
+    return _bool_num(
+        drv.tcp_connected
+        and drv.gpio_connected
+        and drv.a_drive.rs485_connected
+        and drv.b_drive.rs485_connected
+        and drv.s_drive.rs485_connected
+        and drv.i_drive.rs485_connected
+    )
+
+
+def _not_operational(code_1, code_2):
+    return not (
+        code_1 in _cte.operational_diag_codes
+        and code_2 in _cte.operational_diag_codes
+    )
+
+
+def _powered_on(code_1, code_2):
+    return _bool_num(
+        code_1 in _cte.powered_on_diag_codes
+        and code_2 in _cte.powered_on_diag_codes
+    )
+
+
+def _diag(code):
+    return None if code is None else _diag_msg(code)
+
+
+def _is_moving(drv):
+    if drv.gap_is_moving is None or drv.phase_is_moving is None:
+        return None
+    return _bool_num(
+        drv.gap_is_moving or drv.phase_is_moving or drv.pol_is_moving)
+
+
+# map of status PVs to functions of the EPU driver returning their values;
+# PVs whose function returns None are left untouched
+_STATUS_PVS = (
+    # connection status
+    (_db.pv_tcp_connected_mon, lambda drv: drv.tcp_connected),
+    (_db.pv_gpio_connected_mon, lambda drv: drv.gpio_connected),
+    (_db.pv_drive_a_connected_mon, lambda drv: drv.a_drive.rs485_connected),
+    (_db.pv_drive_b_connected_mon, lambda drv: drv.b_drive.rs485_connected),
+    (_db.pv_drive_s_connected_mon, lambda drv: drv.s_drive.rs485_connected),
+    (_db.pv_drive_i_connected_mon, lambda drv: drv.i_drive.rs485_connected),
+    (_db.pv_epu_connected_mon, _epu_connected),
+    # polarization and allowed to move status
+    (_db.pv_polarization_mon, lambda drv: drv.polarization),
+    (_db.pv_allowed_change_gap_mon,
+        lambda drv: _bool_num(drv.gap_change_allowed)),
+    (_db.pv_allowed_change_phase_mon,
+        lambda drv: _bool_num(drv.phase_change_allowed)),
+    # combined positions, gap and phase update only by callback during motion
+    (_db.pv_gap_rb, lambda drv: drv.gap_target),
+    (_db.pv_gap_mon, lambda drv: None if drv.gap_is_moving else drv.gap),
+    (_db.pv_phase_rb, lambda drv: drv.phase_target),
+    (_db.pv_phase_mon,
+        lambda drv: None if drv.phase_is_moving else drv.phase),
+    # target speeds
+    (_db.pv_gap_velo_rb, lambda drv: _velo(drv.gap_target_velocity)),
+    (_db.pv_phase_velo_rb, lambda drv: _velo(drv.phase_target_velocity)),
+    (_db.pv_a_target_velo_mon, lambda drv: _velo(drv.a_target_velocity)),
+    (_db.pv_b_target_velo_mon, lambda drv: _velo(drv.b_target_velocity)),
+    (_db.pv_s_target_velo_mon, lambda drv: _velo(drv.s_target_velocity)),
+    (_db.pv_i_target_velo_mon, lambda drv: _velo(drv.i_target_velocity)),
+    # resolver readings
+    (_db.pv_drive_a_resolver_pos_mon, lambda drv: drv.a_resolver_gap),
+    (_db.pv_drive_b_resolver_pos_mon, lambda drv: drv.b_resolver_gap),
+    (_db.pv_drive_s_resolver_pos_mon, lambda drv: drv.s_resolver_phase),
+    (_db.pv_drive_i_resolver_pos_mon, lambda drv: drv.i_resolver_phase),
+    # encoder readings
+    (_db.pv_drive_a_encoder_pos_mon, lambda drv: drv.a_encoder_gap),
+    (_db.pv_drive_b_encoder_pos_mon, lambda drv: drv.b_encoder_gap),
+    (_db.pv_drive_s_encoder_pos_mon, lambda drv: drv.s_encoder_phase),
+    (_db.pv_drive_i_encoder_pos_mon, lambda drv: drv.i_encoder_phase),
+    # enable and halt status
+    (_db.pv_enbl_ab_sts, lambda drv: drv.gap_enable),
+    (_db.pv_enbl_si_sts, lambda drv: drv.phase_enable),
+    (_db.pv_release_ab_sts, lambda drv: drv.gap_halt_released),
+    (_db.pv_release_si_sts, lambda drv: drv.phase_halt_released),
+    (_db.pv_enbl_and_release_ab_sts,
+        lambda drv: drv.gap_enable_and_halt_released),
+    (_db.pv_enbl_and_release_si_sts,
+        lambda drv: drv.phase_enable_and_halt_released),
+    # diagnostic codes and messages
+    (_db.pv_drive_a_diag_code_mon, lambda drv: drv.a_diag_code),
+    (_db.pv_drive_b_diag_code_mon, lambda drv: drv.b_diag_code),
+    (_db.pv_drive_s_diag_code_mon, lambda drv: drv.s_diag_code),
+    (_db.pv_drive_i_diag_code_mon, lambda drv: drv.i_diag_code),
+    (_db.pv_drive_a_diag_msg_mon, lambda drv: _diag(drv.a_diag_code)),
+    (_db.pv_drive_b_diag_msg_mon, lambda drv: _diag(drv.b_diag_code)),
+    (_db.pv_drive_s_diag_msg_mon, lambda drv: _diag(drv.s_diag_code)),
+    (_db.pv_drive_i_diag_msg_mon, lambda drv: _diag(drv.i_diag_code)),
+    # overall fault state
+    (_db.pv_gap_status_mon,
+        lambda drv: _not_operational(drv.a_diag_code, drv.b_diag_code)),
+    (_db.pv_phase_status_mon,
+        lambda drv: _not_operational(drv.s_diag_code, drv.i_diag_code)),
+    (_db.pv_status_mon,
+        lambda drv: _not_operational(drv.a_diag_code, drv.b_diag_code)
+        or _not_operational(drv.s_diag_code, drv.i_diag_code)),
+    # drives powered on
+    (_db.pv_pwr_ab_mon,
+        lambda drv: _powered_on(drv.a_diag_code, drv.b_diag_code)),
+    (_db.pv_pwr_si_mon,
+        lambda drv: _powered_on(drv.s_diag_code, drv.i_diag_code)),
+    # moving status
+    (_db.pv_drive_a_is_moving_mon, lambda drv: drv.gap_is_moving),
+    (_db.pv_drive_b_is_moving_mon, lambda drv: drv.gap_is_moving),
+    (_db.pv_drive_s_is_moving_mon, lambda drv: drv.phase_is_moving),
+    (_db.pv_drive_i_is_moving_mon, lambda drv: drv.phase_is_moving),
+    (_db.pv_is_moving_mon, _is_moving),
+)
 
 
 class EPUSupport(pcaspy.Driver):
     """EPU device support for the pcaspy server."""
 
-    def __init__(self, args):
+    def __new__(cls, args, port="default"):
+        """."""
+        # pcaspy registers the driver under its port before __init__ runs
+        self = super(EPUSupport, cls).__new__(cls)
+        self.port = port
+        return self
+
+    def __init__(self, args, port="default"):
         """."""
         self.args = args
+        # set once the links of the device are connected
+        self.epu_driver = None
         super(EPUSupport, self).__init__()
 
-        # lock for critical operations
-        self.lock = threading.Lock()
+        # publication wakeup event and last published values of status PVs
+        self.eid = threading.Event()
+        self._publish_lock = threading.RLock()
+        self._published = dict()
+        self._changed = False
         # EPU driver will manage and control
         # main features of device operation
         try:
             self.epu_driver = _epu.Epu(
-                args=args, callback_update=self.priority_call)
+                args=args, callback_update=self.priority_call,
+                callback_status=self.status_call)
             print("Epu driver initialized")
 
         except Exception:
             print("Could not init epu driver")
             raise
 
+        # commands are executed in order by one worker per lane
+        self.executor = _executor.CommandExecutor(
+            _CMD_PVS, maxsize=_cte.cmd_queue_size,
+            on_start=self._cmd_started, on_done=self._cmd_done,
+            on_queue=self._cmd_queued)
+
         # start periodic polling function
-        self.eid = threading.Event()
         self.init_vars()
         self.tid_periodic = threading.Thread(target=self.periodic, daemon=True)
         self.tid_periodic.start()
@@ -48,6 +215,7 @@ class EPUSupport(pcaspy.Driver):
         self._old_phase = self.epu_driver.phase
         self._old_phase_sample_timestamp = time.time()
         self._busy_counter = 0
+        self._bus_stats_timestamp = time.monotonic()
 
         # init set point pv values
         self.setParam(_db.pv_gap_sp, self.epu_driver.gap_target)
@@ -77,302 +245,104 @@ class EPUSupport(pcaspy.Driver):
     def priority_call(self):
         """Priority callback."""
         # update encoder readings
-        self.setParam(_db.pv_gap_mon, self.epu_driver.gap)
-        self.setParam(_db.pv_phase_mon, self.epu_driver.phase)
-        self.setParam(_db.pv_polarization_mon, self.epu_driver.polarization)
-        # update PVs
-        self.updatePVs()
+        with self._publish_lock:
+            self._publish(_db.pv_gap_mon, self.epu_driver.gap)
+            self._publish(_db.pv_phase_mon, self.epu_driver.phase)
+            self._publish(
+                _db.pv_polarization_mon, self.epu_driver.polarization)
+            self._flush()
+        # speeds and moving status follow on the periodic publication
+        self.eid.set()
+
+    def status_call(self):
+        """Status callback, called when driver status may have changed."""
+        self.eid.set()
 
     def periodic(self):
-        """Periodic function."""
-        while True:
-            self.eid.wait(_cte.poll_interval)
-            driver = self.epu_driver
-            # update connection status
-            if EPUSupport.isValid(driver.tcp_connected):
-                self.setParam(_db.pv_tcp_connected_mon, driver.tcp_connected)
-
-            if EPUSupport.isValid(driver.gpio_connected):
-                self.setParam(_db.pv_gpio_connected_mon, driver.gpio_connected)
-
-            if EPUSupport.isValid(driver.a_drive.rs485_connected):
-                self.setParam(_db.pv_drive_a_connected_mon,
-                              driver.a_drive.rs485_connected)
-
-            if EPUSupport.isValid(driver.b_drive.rs485_connected):
-                self.setParam(_db.pv_drive_b_connected_mon,
-                              driver.b_drive.rs485_connected)
-
-            if EPUSupport.isValid(driver.s_drive.rs485_connected):
-                self.setParam(_db.pv_drive_s_connected_mon,
-                              driver.s_drive.rs485_connected)
-
-            if EPUSupport.isValid(driver.i_drive.rs485_connected):
-                self.setParam(_db.pv_drive_i_connected_mon,
-                              driver.i_drive.rs485_connected)
-
-            if (
-                EPUSupport.isValid(driver.tcp_connected)
-                and EPUSupport.isValid(driver.gpio_connected)
-                and EPUSupport.isValid(driver.a_drive.rs485_connected)
-                and EPUSupport.isValid(driver.b_drive.rs485_connected)
-                and EPUSupport.isValid(driver.s_drive.rs485_connected)
-                and EPUSupport.isValid(driver.i_drive.rs485_connected)
-            ):
-
-                if (
-                    driver.tcp_connected
-                    and driver.gpio_connected
-                    and driver.a_drive.rs485_connected
-                    and driver.b_drive.rs485_connected
-                    and driver.s_drive.rs485_connected
-                    and driver.i_drive.rs485_connected
-                ):
-                    self.setParam(_db.pv_epu_connected_mon, _cte.bool_yes)
-
-                else:
-                    self.setParam(_db.pv_epu_connected_mon, _cte.bool_no)
-
-            else:
-                self.setParam(_db.pv_epu_connected_mon, _cte.bool_no)
-
-            # update polarization monitor
-            if EPUSupport.isValid(driver.polarization):
-                self.setParam(_db.pv_polarization_mon, driver.polarization)
-
-            # update allowed to move status
-            if (
-                EPUSupport.isValid(driver.gap_change_allowed)
-                and driver.gap_change_allowed
-            ):
-                self.setParam(_db.pv_allowed_change_gap_mon, _cte.bool_yes)
-
-            else:
-                self.setParam(_db.pv_allowed_change_gap_mon, _cte.bool_no)
+        """Periodic function.
 
-            if (
-                EPUSupport.isValid(driver.phase_change_allowed)
-                and driver.phase_change_allowed
-            ):
-                self.setParam(_db.pv_allowed_change_phase_mon, _cte.bool_yes)
+        Publication is triggered by driver callbacks and by a heartbeat,
+        and is rate limited by the poll interval.
+        """
+        while True:
+            self.eid.wait(_cte.publish_heartbeat)
+            self.eid.clear()
+            self.publish_status()
+            time.sleep(_cte.poll_interval)
 
-            else:
-                self.setParam(_db.pv_allowed_change_phase_mon, _cte.bool_no)
-
-            # --- update combined position pvs
-
-            # gap pos
-            if EPUSupport.isValid(driver.gap_target):
-                self.setParam(_db.pv_gap_rb, driver.gap_target)
-
-            # gap updates only by callback during motion
-            if not driver.gap_is_moving:
-                if EPUSupport.isValid(driver.gap):
-                    self.setParam(_db.pv_gap_mon, driver.gap)
-
-            # phase pos
-            if EPUSupport.isValid(driver.phase_target):
-                self.setParam(_db.pv_phase_rb, driver.phase_target)
-
-            # phase updates only by callback during motion
-            if not driver.phase_is_moving:
-                if EPUSupport.isValid(driver.phase):
-                    self.setParam(_db.pv_phase_mon, driver.phase)
-
-            # --- update speed pvs
-
-            # gap target speed
-            if EPUSupport.isValid(driver.gap_target_velocity):
-                self.setParam(_db.pv_gap_velo_rb,
-                              driver.gap_target_velocity / 60)
-            # phase target speed
-            if EPUSupport.isValid(driver.phase_target_velocity):
-                self.setParam(_db.pv_phase_velo_rb,
-                              driver.phase_target_velocity / 60)
-            # individual axes target speed
-            if EPUSupport.isValid(driver.a_target_velocity):
-                self.setParam(_db.pv_a_target_velo_mon,
-                              driver.a_target_velocity / 60)
-            if EPUSupport.isValid(driver.b_target_velocity):
-                self.setParam(_db.pv_b_target_velo_mon,
-                              driver.b_target_velocity / 60)
-            if EPUSupport.isValid(driver.s_target_velocity):
-                self.setParam(_db.pv_s_target_velo_mon,
-                              driver.s_target_velocity / 60)
-            if EPUSupport.isValid(driver.i_target_velocity):
-                self.setParam(_db.pv_i_target_velo_mon,
-                              driver.i_target_velocity / 60)
-            # gap speed
-            if EPUSupport.isValid(driver.gap):
-                _time_now = time.time()
-                _gap_now = driver.gap
-                self.setParam(
-                    _db.pv_gap_velo_mon,
-                    (_gap_now - self._old_gap)
-                    / (_time_now - self._old_gap_sample_timestamp),
-                )
-                self._old_gap = _gap_now
-                self._old_gap_sample_timestamp = _time_now
-            # phase speed
-            if EPUSupport.isValid(driver.phase):
-                _time_now = time.time()
-                _phase_now = driver.phase
-                self.setParam(
-                    _db.pv_phase_velo_mon,
-                    (_phase_now - self._old_phase)
-                    / (_time_now - self._old_phase_sample_timestamp),
-                )
-                self.old_phase = _phase_now
-                self.old_phase_sample_timestamp = _time_now
-            # update resolver readings
-            if EPUSupport.isValid(driver.a_resolver_gap):
-                self.setParam(_db.pv_drive_a_resolver_pos_mon,
-                              driver.a_resolver_gap)
-            if EPUSupport.isValid(driver.b_resolver_gap):
-                self.setParam(_db.pv_drive_b_resolver_pos_mon,
-                              driver.b_resolver_gap)
-            if EPUSupport.isValid(driver.s_resolver_phase):
-                self.setParam(_db.pv_drive_s_resolver_pos_mon,
-                              driver.s_resolver_phase)
-            if EPUSupport.isValid(driver.i_resolver_phase):
-                self.setParam(_db.pv_drive_i_resolver_pos_mon,
-                              driver.i_resolver_phase)
-            # update encoder readings
-            if EPUSupport.isValid(driver.a_encoder_gap):
-                self.setParam(_db.pv_drive_a_encoder_pos_mon,
-                              driver.a_encoder_gap)
-            if EPUSupport.isValid(driver.b_encoder_gap):
-                self.setParam(_db.pv_drive_b_encoder_pos_mon,
-                              driver.b_encoder_gap)
-            if EPUSupport.isValid(driver.s_encoder_phase):
-                self.setParam(_db.pv_drive_s_encoder_pos_mon,
-                              driver.s_encoder_phase)
-            if EPUSupport.isValid(driver.i_encoder_phase):
-                self.setParam(_db.pv_drive_i_encoder_pos_mon,
-                              driver.i_encoder_phase)
-            # update enable and halt status
-            if EPUSupport.isValid(driver.gap_enable):
-                self.setParam(_db.pv_enbl_ab_sts,
-                              driver.gap_enable)
-            if EPUSupport.isValid(driver.phase_enable):
-                self.setParam(_db.pv_enbl_si_sts,
-                              driver.phase_enable)
-            if EPUSupport.isValid(driver.gap_halt_released):
-                self.setParam(_db.pv_release_ab_sts,
-                              driver.gap_halt_released)
-            if EPUSupport.isValid(driver.phase_halt_released):
-                self.setParam(_db.pv_release_si_sts,
-                              driver.phase_halt_released)
-            if EPUSupport.isValid(driver.gap_enable_and_halt_released):
-                self.setParam(_db.pv_enbl_and_release_ab_sts,
-                              driver.gap_enable_and_halt_released)
-            if EPUSupport.isValid(driver.phase_enable_and_halt_released):
-                self.setParam(_db.pv_enbl_and_release_si_sts,
-                              driver.phase_enable_and_halt_released)
-            # update diagnostic codes and messages
-            if EPUSupport.isValid(driver.a_diag_code):
-                self.setParam(_db.pv_drive_a_diag_code_mon, driver.a_diag_code)
-                self.setParam(
-                    _db.pv_drive_a_diag_msg_mon,
-                    _cte.drive_diag_msgs.get(
-                        driver.a_diag_code, _cte.default_unknown_diag_msg
-                    ),
-                )
-            if EPUSupport.isValid(driver.b_diag_code):
-                self.setParam(_db.pv_drive_b_diag_code_mon, driver.b_diag_code)
-                self.setParam(
-                    _db.pv_drive_b_diag_msg_mon,
-                    _cte.drive_diag_msgs.get(
-                        driver.b_diag_code, _cte.default_unknown_diag_msg
-                    ),
-                )
-            if EPUSupport.isValid(driver.s_diag_code):
-                self.setParam(_db.pv_drive_s_diag_code_mon, driver.s_diag_code)
-                self.setParam(
-                    _db.pv_drive_s_diag_msg_mon,
-                    _cte.drive_diag_msgs.get(
-                        driver.s_diag_code, _cte.default_unknown_diag_msg
-                    ),
-                )
-            if EPUSupport.isValid(driver.i_diag_code):
-                self.setParam(_db.pv_drive_i_diag_code_mon, driver.i_diag_code)
-                self.setParam(
-                    _db.pv_drive_i_diag_msg_mon,
-                    _cte.drive_diag_msgs.get(
-                        driver.i_diag_code, _cte.default_unknown_diag_msg
-                    ),
-                )
-            # check overall fault state
-            ## gap
-            if EPUSupport.isValid(driver.a_diag_code) and EPUSupport.isValid(
-                driver.b_diag_code
-            ):
-                gap_not_ok = not (
-                    driver.a_diag_code in _cte.operational_diag_codes
-                    and driver.b_diag_code in _cte.operational_diag_codes
-                )
-            else:
-                gap_not_ok = True
-            self.setParam(_db.pv_gap_status_mon, gap_not_ok)
-            ## phase
-            if EPUSupport.isValid(driver.s_diag_code) and EPUSupport.isValid(
-                driver.i_diag_code
-            ):
-                phase_not_ok = not (
-                    driver.s_diag_code in _cte.operational_diag_codes
-                    and driver.i_diag_code in _cte.operational_diag_codes
-                )
-            else:
-                phase_not_ok = True
-            self.setParam(_db.pv_status_mon, phase_not_ok)
-            ## both
-            not_ok = gap_not_ok or phase_not_ok
-            self.setParam(_db.pv_status_mon, not_ok)
-            # check if drives are powered on
-            if (
-                EPUSupport.isValid(driver.a_diag_code)
-                and EPUSupport.isValid(driver.b_diag_code)
-                and driver.a_diag_code in _cte.powered_on_diag_codes
-                and driver.b_diag_code in _cte.powered_on_diag_codes
-            ):
-                self.setParam(_db.pv_pwr_ab_mon, _cte.bool_yes)
-            else:
-                self.setParam(_db.pv_pwr_ab_mon, _cte.bool_no)
-            if (
-                EPUSupport.isValid(driver.s_diag_code)
-                and EPUSupport.isValid(driver.i_diag_code)
-                and driver.s_diag_code in _cte.powered_on_diag_codes
-                and driver.i_diag_code in _cte.powered_on_diag_codes
-            ):
-                self.setParam(_db.pv_pwr_si_mon, _cte.bool_yes)
-            else:
-                self.setParam(_db.pv_pwr_si_mon, _cte.bool_no)
-            # update moving status
-            if EPUSupport.isValid(driver.gap_is_moving):
-                self.setParam(_db.pv_drive_a_is_moving_mon,
-                              driver.gap_is_moving)
-                self.setParam(_db.pv_drive_b_is_moving_mon,
-                              driver.gap_is_moving)
-            if EPUSupport.isValid(driver.phase_is_moving):
-                self.setParam(_db.pv_drive_s_is_moving_mon,
-                              driver.phase_is_moving)
-                self.setParam(_db.pv_drive_i_is_moving_mon,
-                              driver.phase_is_moving)
-            if EPUSupport.isValid(driver.gap_is_moving) and EPUSupport.isValid(
-                driver.phase_is_moving
-            ):
-                if driver.gap_is_moving or driver.phase_is_moving or \
-                        driver.pol_is_moving:
-                    self.setParam(_db.pv_is_moving_mon, _cte.bool_yes)
-                else:
-                    self.setParam(_db.pv_is_moving_mon, _cte.bool_no)
+    def publish_status(self):
+        """Publish driver status PVs that changed since last publication."""
+        driver = self.epu_driver
+        with self._publish_lock:
+            for pvname, getter in _STATUS_PVS:
+                self._publish(pvname, getter(driver))
+            self._publish_speeds(driver)
+            # update link scheduling statistics
+            if time.monotonic() - self._bus_stats_timestamp >= \
+                    _cte.bus_stats_interval:
+                self._bus_stats_timestamp = time.monotonic()
+                self.update_bus_stats()
             # update read-only PVs
+            self._flush()
+
+    def _publish_speeds(self, driver):
+        _time_now = time.time()
+        # gap speed
+        if EPUSupport.isValid(driver.gap):
+            _gap_now = driver.gap
+            self._publish(
+                _db.pv_gap_velo_mon,
+                (_gap_now - self._old_gap)
+                / (_time_now - self._old_gap_sample_timestamp),
+            )
+            self._old_gap = _gap_now
+            self._old_gap_sample_timestamp = _time_now
+        # phase speed
+        if EPUSupport.isValid(driver.phase):
+            _phase_now = driver.phase
+            self._publish(
+                _db.pv_phase_velo_mon,
+                (_phase_now - self._old_phase)
+                / (_time_now - self._old_phase_sample_timestamp),
+            )
+            self._old_phase = _phase_now
+            self._old_phase_sample_timestamp = _time_now
+
+    def _publish(self, pvname, value):
+        """Set PV value if it is valid and differs from last published."""
+        if not EPUSupport.isValid(value):
+            return
+        if self._published.get(pvname, _NOT_PUBLISHED) == value:
+            return
+        self.setParam(pvname, value)
+        self._published[pvname] = value
+        self._changed = True
+
+    def _flush(self):
+        """Post updates of changed PVs."""
+        if self._changed:
+            self._changed = False
             self.updatePVs()
 
+    def update_bus_stats(self):
+        """Update serial and GPIO link statistics PVs."""
+        stats = self.epu_driver.get_bus_stats(reset=True)
+        serial, gpio = stats["serial"], stats["gpio"]
+        self._publish(_db.pv_serial_wait_time_mean_mon, serial["wait_mean"])
+        self._publish(_db.pv_serial_wait_time_max_mon, serial["wait_max"])
+        self._publish(_db.pv_serial_hold_time_mean_mon, serial["hold_mean"])
+        self._publish(_db.pv_serial_hold_time_max_mon, serial["hold_max"])
+        self._publish(_db.pv_serial_queue_mon, serial["queue_length"])
+        self._publish(_db.pv_gpio_wait_time_max_mon, gpio["wait_max"])
+        self._publish(_db.pv_gpio_hold_time_max_mon, gpio["hold_max"])
+
     def write(self, reason, value):
         """EPICS write."""
         status = True
         driver = self.epu_driver
+        if driver is None:
+            print(f"{reason}: device is not connected yet.")
+            return False
         idparams = driver.idparams
 
         # ---take action according to PV name
@@ -380,7 +350,7 @@ class EPUSupport(pcaspy.Driver):
         # set polarity
         if EPUSupport.isPvName(reason, _db.pv_polarization_sel):
             if value >= 0 and value <= 4:
-                status = self.asynExec(reason, driver.set_polarization, value)
+                status = self.execCmd(_DRIVES, reason, driver.set_polarization, value)
                 if status:
                     self.setParam(_db.pv_polarization_sel, value)
                     self.setParam(_db.pv_polarization_sts, value)
@@ -409,10 +379,7 @@ class EPUSupport(pcaspy.Driver):
         # clear drive errors
         elif EPUSupport.isPvName(reason, _db.pv_clear_error_cmd):
             # clear driver errors
-            status = self.asynExec(reason, driver.a_drive.clear_error)
-            status = self.asynExec(reason, driver.b_drive.clear_error)
-            status = self.asynExec(reason, driver.s_drive.clear_error)
-            status = self.asynExec(reason, driver.i_drive.clear_error)
+            status = self.execCmd(_DRIVES, reason, driver.clear_error_all)
             # increment cmd pv
             self.incParam(_db.pv_clear_error_cmd)
             self.updatePVs()
@@ -420,7 +387,7 @@ class EPUSupport(pcaspy.Driver):
         # change gap set point
         elif EPUSupport.isPvName(reason, _db.pv_gap_sp):
             if value >= idparams.KPARAM_MIN and value <= idparams.KPARAM_MAX:
-                status = self.asynExec(reason, driver.gap_set, value)
+                status = self.execCmd(_GAP, reason, driver.gap_set, value)
                 if status:
                     self.setParam(_db.pv_gap_sp, value)
                     self.updatePVs()
@@ -430,7 +397,7 @@ class EPUSupport(pcaspy.Driver):
         # change phase set point
         elif EPUSupport.isPvName(reason, _db.pv_phase_sp):
             if value >= idparams.PPARAM_MIN and value <= idparams.PPARAM_MAX:
-                status = self.asynExec(reason, driver.phase_set, value)
+                status = self.execCmd(_PHASE, reason, driver.phase_set, value)
                 if status:
                     self.setParam(_db.pv_phase_sp, value)
                     self.updatePVs()
@@ -447,8 +414,8 @@ class EPUSupport(pcaspy.Driver):
                 self.setParam(_db.pv_gap_max_velo_rb, value)
                 if value < self.getParam(_db.pv_gap_velo_sp):
                     _val_per_min = value * 60
-                    status = self.asynExec(
-                        reason, driver.gap_set_velocity, _val_per_min
+                    status = self.execCmd(
+                        _GAP, reason, driver.gap_set_velocity, _val_per_min
                     )
                     if status:
                         self.setParam(_db.pv_gap_velo_sp, value)
@@ -466,8 +433,8 @@ class EPUSupport(pcaspy.Driver):
                 self.setParam(_db.pv_phase_max_velo_rb, value)
                 if value < self.getParam(_db.pv_phase_velo_sp):
                     _val_per_min = value * 60
-                    status = self.asynExec(
-                        reason, driver.phase_set_velocity, _val_per_min
+                    status = self.execCmd(
+                        _PHASE, reason, driver.phase_set_velocity, _val_per_min
                     )
                     if status:
                         self.setParam(_db.pv_phase_velo_sp, value)
@@ -485,8 +452,8 @@ class EPUSupport(pcaspy.Driver):
             ):
                 # convert velocity to mm/min
                 _val_per_min = value * 60
-                status = self.asynExec(reason, driver.gap_set_velocity,
-                                       _val_per_min)
+                status = self.execCmd(_GAP, reason, driver.gap_set_velocity,
+                                      _val_per_min)
                 if status:
                     self.setParam(_db.pv_gap_velo_sp, value)
                     self.updatePVs()
@@ -503,8 +470,8 @@ class EPUSupport(pcaspy.Driver):
             ):
                 # convert velocity to mm/min
                 _val_per_min = value * 60
-                status = self.asynExec(reason, driver.phase_set_velocity,
-                                       _val_per_min)
+                status = self.execCmd(_PHASE, reason, driver.phase_set_velocity,
+                                      _val_per_min)
                 if status:
                     self.setParam(_db.pv_phase_velo_sp, value)
                     self.updatePVs()
@@ -517,7 +484,8 @@ class EPUSupport(pcaspy.Driver):
                 not driver.gap_is_moving
                 and self.getParam(_db.pv_allowed_change_gap_mon) == _cte.bool_yes
             ):
-                status = self.asynExec(reason, driver.gap_start, _cte.bool_yes)
+                status = self.execCmd(
+                    _GAP, reason, driver.gap_start, _cte.bool_yes)
                 # increment cmd pv
                 self.incParam(_db.pv_change_gap_cmd)
                 self.updatePVs()
@@ -532,7 +500,7 @@ class EPUSupport(pcaspy.Driver):
                 and self.getParam(_db.pv_allowed_change_gap_mon) == _cte.bool_yes
                 and self.getParam(_db.pv_allowed_change_phase_mon) == _cte.bool_yes
             ):
-                idname = self.args.prefix_pv
+                idname = self.args.pv_prefix
                 idparams = _IDSearch.conv_idname_2_parameters(idname)
                 pol_change_gap = idparams.KPARAM_POL_CHANGE
                 pol_idx = self.getParam(_db.pv_polarization_sel)
@@ -542,8 +510,8 @@ class EPUSupport(pcaspy.Driver):
                 driver.gap_set(pol_change_gap)
                 self.setParam(_db.pv_phase_sp, phase)
                 driver.phase_set(phase)
-                status = self.asynExec(
-                    reason, driver.polarization_motion, value)
+                status = self.execCmd(
+                    _DRIVES, reason, driver.polarization_motion, value)
                 # increment cmd pv
                 self.incParam(_db.pv_change_polarization_cmd)
                 self.updatePVs()
@@ -556,8 +524,8 @@ class EPUSupport(pcaspy.Driver):
                 not driver.phase_is_moving
                 and self.getParam(_db.pv_allowed_change_phase_mon) == _cte.bool_yes
             ):
-                status = self.asynExec(reason, driver.phase_start,
-                                       _cte.bool_yes)
+                status = self.execCmd(_PHASE, reason, driver.phase_start,
+                                      _cte.bool_yes)
                 # increment cmd pv
                 self.incParam(_db.pv_change_phase_cmd)
                 self.updatePVs()
@@ -567,8 +535,8 @@ class EPUSupport(pcaspy.Driver):
         # select to enable/disable A and B drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_ab_sel):
             if EPUSupport.isBoolNum(value):
-                status = self.asynExec(reason, driver.gap_set_enable,
-                                       bool(value))
+                status = self.execCmd(_GAP, reason, driver.gap_set_enable,
+                                      bool(value))
                 if status:
                     self.setParam(_db.pv_enbl_ab_sel, value)
                     self.updatePVs()
@@ -578,8 +546,8 @@ class EPUSupport(pcaspy.Driver):
         # select to enable/disable S and I drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_si_sel):
             if EPUSupport.isBoolNum(value):
-                status = self.asynExec(reason, driver.phase_set_enable,
-                                       bool(value))
+                status = self.execCmd(_PHASE, reason, driver.phase_set_enable,
+                                      bool(value))
                 if status:
                     self.setParam(_db.pv_enbl_si_sel, value)
                     self.updatePVs()
@@ -589,8 +557,8 @@ class EPUSupport(pcaspy.Driver):
         # select to release/halt A and B drives
         elif EPUSupport.isPvName(reason, _db.pv_release_ab_sel):
             if EPUSupport.isBoolNum(value):
-                status = self.asynExec(reason, driver.gap_release_halt,
-                                       bool(value))
+                status = self.execCmd(_GAP, reason, driver.gap_release_halt,
+                                      bool(value))
                 if status:
                     self.setParam(_db.pv_release_ab_sel, value)
                     self.updatePVs()
@@ -600,8 +568,8 @@ class EPUSupport(pcaspy.Driver):
         # select to release/halt S and I drives
         elif EPUSupport.isPvName(reason, _db.pv_release_si_sel):
             if EPUSupport.isBoolNum(value):
-                status = self.asynExec(reason, driver.phase_release_halt,
-                                       bool(value))
+                status = self.execCmd(_PHASE, reason, driver.phase_release_halt,
+                                      bool(value))
                 if status:
                     self.setParam(_db.pv_release_si_sel, value)
                     self.updatePVs()
@@ -611,8 +579,9 @@ class EPUSupport(pcaspy.Driver):
         # cmd to enable and release A and B drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_and_release_ab_sel):
             if EPUSupport.isBoolNum(value):
-                status = self.asynExec(
-                    reason, driver.gap_enable_and_release_halt, bool(value)
+                status = self.execCmd(
+                    _GAP, reason, driver.gap_enable_and_release_halt,
+                    bool(value)
                 )
                 if status:
                     # update enbl and release pvs
@@ -627,8 +596,9 @@ class EPUSupport(pcaspy.Driver):
         # cmd to enable and release S and I drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_and_release_si_sel):
             if EPUSupport.isBoolNum(value):
-                status = self.asynExec(
-                    reason, driver.phase_enable_and_release_halt, bool(value)
+                status = self.execCmd(
+                    _PHASE, reason, driver.phase_enable_and_release_halt,
+                    bool(value)
                 )
                 if status:
                     # update enbl and release pvs
@@ -640,7 +610,8 @@ class EPUSupport(pcaspy.Driver):
             else:
                 status = False
         elif EPUSupport.isPvName(reason, _db.pv_stop_cmd):
-            status = self.asynExec(reason, driver.stop_all)
+            status = self.stopCmd(
+                reason, driver.stop_all, _GAP, _PHASE, _DRIVES)
             # increment cmd pv
             self.incParam(_db.pv_stop_cmd)
             # halt motor drives
@@ -649,7 +620,7 @@ class EPUSupport(pcaspy.Driver):
             # update pvs
             self.updatePVs()
         elif EPUSupport.isPvName(reason, _db.pv_stop_ab_cmd):
-            status = self.asynExec(reason, driver.gap_stop)
+            status = self.stopCmd(reason, driver.gap_stop, _GAP)
             # increment cmd pv
             self.incParam(_db.pv_stop_ab_cmd)
             # halt motor drives
@@ -657,7 +628,7 @@ class EPUSupport(pcaspy.Driver):
             # update pvs
             self.updatePVs()
         elif EPUSupport.isPvName(reason, _db.pv_stop_si_cmd):
-            status = self.asynExec(reason, driver.phase_stop)
+            status = self.stopCmd(reason, driver.phase_stop, _PHASE)
             # increment cmd pv
             self.incParam(_db.pv_stop_si_cmd)
             # halt motor drives
@@ -667,7 +638,7 @@ class EPUSupport(pcaspy.Driver):
 
         # cmd to turn on power of A and B drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_pwr_ab_cmd):
-            status = self.asynExec(reason, driver.gap_turn_on)
+            status = self.execCmd(_GAP, reason, driver.gap_turn_on)
             # increment cmd pv
             self.incParam(_db.pv_enbl_pwr_ab_cmd)
             # update pvs
@@ -675,7 +646,7 @@ class EPUSupport(pcaspy.Driver):
 
         # cmd to turn on power of S and I drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_pwr_si_cmd):
-            status = self.asynExec(reason, driver.phase_turn_on)
+            status = self.execCmd(_PHASE, reason, driver.phase_turn_on)
             # increment cmd pv
             self.incParam(_db.pv_enbl_pwr_si_cmd)
             # update pvs
@@ -683,7 +654,7 @@ class EPUSupport(pcaspy.Driver):
 
         # cmd to turn on power of all drives
         elif EPUSupport.isPvName(reason, _db.pv_enbl_pwr_all_cmd):
-            status = self.asynExec(reason, driver.turn_on_all)
+            status = self.execCmd(_DRIVES, reason, driver.turn_on_all)
             # increment cmd pv
             self.incParam(_db.pv_enbl_pwr_all_cmd)
             # update pvs
@@ -695,70 +666,47 @@ class EPUSupport(pcaspy.Driver):
         # end of write
         return status
 
-    def asynExec(self, reason, func, *args, **kwargs):
-        """Call function in new thread and send callback for reason pv."""
-
-        def execAndNotify(reason, func, *args, **kwargs):
-            """Call function and then callback after completion"""
-            # set busy status
-            self._busy_counter += 1
-            self.setParam(_db.pv_is_busy_mon, _cte.bool_yes)
-            self.updatePVs()
-            # call function
-            try:
-                func(*args, **kwargs)
-            except Exception:
-                self.setParam(_db.pv_ioc_msg_mon, str(traceback.format_exc()))
-            self.callbackPV(reason)
-            # clear busy status
-            self._busy_counter -= 1
-            if self._busy_counter == 0:
-                self.setParam(_db.pv_is_busy_mon, _cte.bool_no)
-            self.updatePVs()
-
-        tid = threading.Thread(
-            target=execAndNotify, args=(reason, func, *args),
-            kwargs=kwargs, daemon=True
-        )
-        tid.start()
-        return True
+    def execCmd(self, lane, reason, func, *args):
+        """Queue command in lane and send callback for reason pv when done."""
+        if self.executor.submit(lane, reason, func, *args):
+            return True
+        # inform that device is busy
+        self.setParam(_db.pv_ioc_msg_mon, _cte.msg_device_busy)
+        self.updatePVs()
+        return False
 
-    def asynExecWithLock(self, reason, func, *args, **kwargs):
-        """Call function in new thread, using lock, and send callback for pv specified by reason."""
+    def stopCmd(self, reason, func, *lanes):
+        """Cancel commands waiting in lanes and execute stop immediately."""
+        self.executor.cancel(*lanes)
+        return self.executor.execute_now(lanes[0], reason, func)
 
-        def execNotifyAndUnlock(reason, func, *args, **kwargs):
-            """Call function and then callback after completion"""
-            # set busy status
+    def _cmd_started(self, lane, command):
+        with self._publish_lock:
             self._busy_counter += 1
             self.setParam(_db.pv_is_busy_mon, _cte.bool_yes)
             self.updatePVs()
-            # call function
-            try:
-                func(*args, **kwargs)
-            except Exception:
-                self.setParam(_db.pv_ioc_msg_mon, str(traceback.format_exc()))
-            self.callbackPV(reason)
-            # clear busy status
-            self._busy_counter -= 1
-            if self._busy_counter == 0:
-                self.setParam(_db.pv_is_busy_mon, _cte.bool_no)
+
+    def _cmd_done(self, lane, command):
+        last_pv, elapsed_pv, _ = _CMD_PVS[lane]
+        # cancelled commands also complete, so that clients are not
+        # left waiting for the callback
+        self.callbackPV(command.reason)
+        with self._publish_lock:
+            if command.error is not None:
+                self.setParam(_db.pv_ioc_msg_mon, command.error)
+            if command.status != _executor.STATUS_CANCELLED:
+                self._busy_counter -= 1
+                if self._busy_counter == 0:
+                    self.setParam(_db.pv_is_busy_mon, _cte.bool_no)
+            self.setParam(last_pv, f"{command.reason} {command.status}")
+            # elapsed time since submission, including queue wait
+            self.setParam(elapsed_pv, 1e3 * command.elapsed)
             self.updatePVs()
-            self.lock.release()
-
-        if self.lock.acquire(blocking=False):
-            tid = threading.Thread(
-                target=execNotifyAndUnlock,
-                args=(reason, func, *args),
-                kwargs=kwargs,
-                daemon=True,
-            )
-            tid.start()
-            return True
-        else:
-            # inform that device is busy
-            self.setParam(_db.pv_ioc_msg_mon, _cte.msg_device_busy)
+
+    def _cmd_queued(self, lane, length):
+        with self._publish_lock:
+            self.setParam(_CMD_PVS[lane][2], length)
             self.updatePVs()
-            return False
 
     @staticmethod
     def isPvName(reason, pvname):
@@ -0,0 +1,99 @@
+"""EcoDrive parameter parsing module.
+
+A read request '<param>,7,R' is answered with the frame
+'<echo>\\r\\n<data>\\r\\nE<address>>'. The data field is parsed straight
+from the received bytes according to the parameter schema.
+"""
+
+import time
+
+from .utils import ParameterParseError
+
+_SEPARATOR = b"\r\n"
+_STATUS_BITS = frozenset(b"01")
+
+
+def parse_float(data: bytes) -> float:
+    """Parse decimal number."""
+    try:
+        return float(data)
+    except ValueError:
+        raise ParameterParseError(f"Invalid number {data!r}.") from None
+
+
+def parse_diag_code(data: bytes) -> str:
+    """Parse diagnostic code, dropping its trailing type character."""
+    if len(data) < 2:
+        raise ParameterParseError(f"Invalid diagnostic code {data!r}.")
+    return data[:-1].decode("ascii", errors="replace")
+
+
+def parse_status_word(data: bytes) -> tuple:
+    """Parse binary status word '0110...b' into a tuple of bits."""
+    if data.endswith(b"b"):
+        data = data[:-1]
+    if not data or not _STATUS_BITS.issuperset(data):
+        raise ParameterParseError(f"Invalid status word {data!r}.")
+    return tuple(byte - 48 for byte in data)
+
+
+# parser of the data field of each parameter
+SCHEMAS = {
+    "S-0-0013": parse_status_word,  # status word (bit 1: in target position)
+    "S-0-0051": parse_float,  # position feedback 1 (resolver) [mm]
+    "S-0-0053": parse_float,  # position feedback 2 (encoder) [mm]
+    "S-0-0134": parse_status_word,  # control word (bits 1, 2: enable, halt)
+    "S-0-0390": parse_diag_code,  # diagnostic code
+    "P-0-4006": parse_float,  # target position [mm]
+    "P-0-4007": parse_float,  # maximum velocity [mm/min]
+    "P-0-4050": parse_float,  # answer delay [ms]
+}
+
+
+def extract_data(reply: bytes, address: int) -> bytes:
+    """Return data field of a read reply of drive at address."""
+    if not reply:
+        raise ParameterParseError("No reply.")
+    start = reply.find(_SEPARATOR)
+    end = reply.rfind(_SEPARATOR)
+    if start < 0 or end <= start:
+        raise ParameterParseError(f"Malformed reply {reply!r}.")
+    if reply.find(b"E%d" % address, end) < 0:
+        raise ParameterParseError(f"Address not found in reply {reply!r}.")
+    return reply[start + len(_SEPARATOR):end]
+
+
+def parse_reply(parameter: str, reply: bytes, address: int):
+    """Return typed value of parameter read reply."""
+    data = extract_data(reply, address)
+    parser = SCHEMAS.get(parameter)
+    return data if parser is None else parser(data)
+
+
+class ParameterCache:
+    """Last parsed value of each parameter with its timestamp."""
+
+    def __init__(self):
+        """."""
+        self._values = dict()
+
+    def get(self, parameter: str, max_age: float):
+        """Return value read less than max_age seconds ago, or None."""
+        entry = self._values.get(parameter)
+        if entry is None or max_age <= 0:
+            return None
+        value, timestamp = entry
+        if time.monotonic() - timestamp > max_age:
+            return None
+        return value
+
+    def set(self, parameter: str, value):
+        """Store value of parameter."""
+        self._values[parameter] = (value, time.monotonic())
+
+    def invalidate(self, parameter: str = None):
+        """Discard value of parameter, or of all parameters."""
+        if parameter is None:
+            self._values.clear()
+        else:
+            self._values.pop(parameter, None)
@@ -0,0 +1,276 @@
+"""Motion recorder module.
+
+Records timestamped position samples and events (motion start and end,
+operator commands, diagnostic code changes) of the EPU axes in an
+append-only binary file.
+
+The file is a sequence of chunks. Each chunk has a fixed header
+(magic, number of samples, number of events, compressed payload size)
+followed by a zlib-compressed payload holding the columns of its
+samples and events, one after the other:
+
+    samples: time (d), axis (B), position (d), target (d), velocity (d)
+    events:  time (d), axis (B), kind (B), text length (H), text (bytes)
+
+Dump the last moves with:
+    python -m si_id_epu50.recorder <file> [--last 5] [--samples]
+"""
+
+import argparse
+import array
+import os as _os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# axes
+AXIS_GAP = 0
+AXIS_PHASE = 1
+AXES = ("gap", "phase")
+
+# event kinds
+EVENT_MOVE_START = 0
+EVENT_MOVE_END = 1
+EVENT_COMMAND = 2
+EVENT_DIAG = 3
+EVENT_NAMES = ("MoveStart", "MoveEnd", "Command", "Diag")
+
+_MAGIC = b"EPUR"
+_HEADER = struct.Struct("<4sIII")
+_SAMPLE_COLUMNS = (
+    ("time", "d"), ("axis", "B"), ("position", "d"), ("target", "d"),
+    ("velocity", "d"))
+_EVENT_COLUMNS = (
+    ("time", "d"), ("axis", "B"), ("kind", "B"), ("length", "H"))
+_NAN = float("nan")
+
+
+def _new_columns(columns):
+    return {name: array.array(code) for name, code in columns}
+
+
+def _column_bytes(column):
+    if sys.byteorder != "little":
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+class MotionRecorder:
+    """Buffer motion samples and events and append them as chunks.
+
+    If path is None records are kept in memory only.
+    """
+
+    def __init__(
+        self, path=None, chunk_size=2048, max_bytes=50_000_000,
+        backup_count=5
+    ):
+        """."""
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._samples = _new_columns(_SAMPLE_COLUMNS)
+        self._events = _new_columns(_EVENT_COLUMNS)
+        self._texts = bytearray()
+        self._chunks = []  # in-memory chunks when there is no file
+
+    def record_sample(
+        self, axis, position, target=_NAN, velocity=_NAN, timestamp=None
+    ):
+        """Record axis position sample."""
+        with self._lock:
+            samples = self._samples
+            samples["time"].append(time.time() if timestamp is None
+                                   else timestamp)
+            samples["axis"].append(axis)
+            samples["position"].append(position)
+            samples["target"].append(_NAN if target is None else target)
+            samples["velocity"].append(_NAN if velocity is None else velocity)
+            full = len(samples["time"]) >= self.chunk_size
+        if full:
+            self.flush()
+
+    def record_event(self, axis, kind, text="", timestamp=None):
+        """Record event of axis."""
+        text = text.encode()[:0xFFFF]
+        with self._lock:
+            events = self._events
+            events["time"].append(time.time() if timestamp is None
+                                  else timestamp)
+            events["axis"].append(axis)
+            events["kind"].append(kind)
+            events["length"].append(len(text))
+            self._texts += text
+        if kind == EVENT_MOVE_END:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records as a new chunk."""
+        with self._lock:
+            nsamples = len(self._samples["time"])
+            nevents = len(self._events["time"])
+            if not nsamples and not nevents:
+                return
+            payload = b"".join(
+                [_column_bytes(self._samples[name])
+                 for name, _ in _SAMPLE_COLUMNS]
+                + [_column_bytes(self._events[name])
+                   for name, _ in _EVENT_COLUMNS]
+                + [bytes(self._texts)])
+            self._samples = _new_columns(_SAMPLE_COLUMNS)
+            self._events = _new_columns(_EVENT_COLUMNS)
+            self._texts = bytearray()
+            data = zlib.compress(payload)
+            chunk = _HEADER.pack(_MAGIC, nsamples, nevents, len(data)) + data
+            if self.path is None:
+                self._chunks.append(chunk)
+                while len(self._chunks) > self.backup_count * 16:
+                    self._chunks.pop(0)
+                return
+            self._rotate(len(chunk))
+            with open(self.path, "ab") as file:
+                file.write(chunk)
+
+    def read(self):
+        """Return recorded samples and events, including buffered ones."""
+        self.flush()
+        if self.path is None:
+            with self._lock:
+                data = b"".join(self._chunks)
+            return _decode(data)
+        return load(self.path)
+
+    def last_moves(self, num=1, axis=None):
+        """Return the last num moves."""
+        samples, events = self.read()
+        return find_moves(samples, events, num, axis)
+
+    def _rotate(self, size):
+        try:
+            if _os.path.getsize(self.path) + size <= self.max_bytes:
+                return
+        except OSError:
+            return
+        for idx in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{idx}"
+            if _os.path.exists(src):
+                _os.replace(src, f"{self.path}.{idx + 1}")
+        _os.replace(self.path, self.path + ".1")
+
+
+def _decode(data):
+    """Decode chunks into sample and event columns."""
+    samples = _new_columns(_SAMPLE_COLUMNS)
+    events = _new_columns(_EVENT_COLUMNS)
+    events["text"] = []
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        magic, nsamples, nevents, size = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        if magic != _MAGIC or offset + size > len(data):
+            # truncated or corrupted tail
+            break
+        payload = zlib.decompress(data[offset:offset + size])
+        offset += size
+        pos = 0
+        for columns, target, num in (
+                (_SAMPLE_COLUMNS, samples, nsamples),
+                (_EVENT_COLUMNS, events, nevents)):
+            for name, code in columns:
+                column = array.array(code)
+                nbytes = column.itemsize * num
+                column.frombytes(payload[pos:pos + nbytes])
+                if sys.byteorder != "little":
+                    column.byteswap()
+                target[name].extend(column)
+                pos += nbytes
+        for length in events["length"][-nevents:] if nevents else []:
+            events["text"].append(payload[pos:pos + length].decode())
+            pos += length
+    return samples, events
+
+
+def load(path):
+    """Load samples and events from recorder file."""
+    with open(path, "rb") as file:
+        return _decode(file.read())
+
+
+def find_moves(samples, events, num=1, axis=None):
+    """Return the last num moves, optionally of a single axis.
+
+    Each move is a dict with its axis, start and end times, events and
+    position samples.
+    """
+    moves = []
+    starts = dict()
+    for idx, kind in enumerate(events["kind"]):
+        ax_ = events["axis"][idx]
+        if axis is not None and ax_ != axis:
+            continue
+        tstamp = events["time"][idx]
+        if kind == EVENT_MOVE_START:
+            starts[ax_] = (tstamp, events["text"][idx])
+        elif kind == EVENT_MOVE_END and ax_ in starts:
+            start, text = starts.pop(ax_)
+            moves.append({
+                "axis": ax_, "start": start, "end": tstamp,
+                "start_text": text, "end_text": events["text"][idx]})
+    moves = moves[-num:] if num else moves
+    for move in moves:
+        move["samples"] = [
+            (tstamp, samples["position"][idx], samples["target"][idx],
+             samples["velocity"][idx])
+            for idx, tstamp in enumerate(samples["time"])
+            if samples["axis"][idx] == move["axis"]
+            and move["start"] <= tstamp <= move["end"]]
+        move["events"] = [
+            (tstamp, EVENT_NAMES[events["kind"][idx]], events["text"][idx])
+            for idx, tstamp in enumerate(events["time"])
+            if events["axis"][idx] == move["axis"]
+            and move["start"] <= tstamp <= move["end"]]
+    return moves
+
+
+def _format_time(tstamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(tstamp)) + \
+        f".{int(1e3 * (tstamp % 1)):03d}"
+
+
+def main():
+    """Dump last moves of a recorder file."""
+    parser = argparse.ArgumentParser(description="Dump EPU motion history.")
+    parser.add_argument("path", help="recorder file")
+    parser.add_argument(
+        "--last", type=int, default=5, help="number of moves to dump")
+    parser.add_argument("--axis", choices=AXES, default=None)
+    parser.add_argument(
+        "--samples", action="store_true", help="dump position samples")
+    args = parser.parse_args()
+
+    axis = None if args.axis is None else AXES.index(args.axis)
+    samples, events = load(args.path)
+    for move in find_moves(samples, events, args.last, axis):
+        positions = [smp[1] for smp in move["samples"]]
+        span = f"{positions[0]:.4f} -> {positions[-1]:.4f} mm" \
+            if positions else "no samples"
+        print(
+            f"{_format_time(move['start'])} {AXES[move['axis']]:5s} "
+            f"{move['end'] - move['start']:7.2f} s  {span}  "
+            f"({len(positions)} samples) {move['end_text']}")
+        for tstamp, name, text in move["events"]:
+            print(f"    {_format_time(tstamp)} {name:9s} {text}")
+        if args.samples:
+            for tstamp, pos, target, velo in move["samples"]:
+                print(
+                    f"    {_format_time(tstamp)} {pos:10.4f} "
+                    f"{target:10.4f} {velo:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,50 @@
-"""Save restore module."""
+"""Save restore module.
+
+Saved values are kept in snapshot files named
+'<request name>__<timestamp>__.sav', with one 'PVNAME VALUE' line per PV.
+An index file '<request name>.idx' lists the snapshots from oldest to
+newest, so restoration does not need to scan the save directory.
+"""
 
 import re
 import os as _os
-from os.path import exists as _exists
-from os.path import basename as _basename
-from os import remove as _remove
-import sys
-import threading
+import json as _json
 import glob
-import shutil
+import tempfile as _tempfile
+import threading
+from os.path import basename as _basename
+from os.path import join as _join
+from os.path import splitext as _splitext
 from datetime import datetime as _date
 from time import sleep as _sleep
 
-from epics import caget as _caget
-from epics import caput as _caput
+from epics import caput_many as _caput_many
 
 
 _TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+_PVNAME_REGEX = re.compile(r"[a-zA-Z0-9:_-]*")
+
+
+def read_request_file(req_file):
+    """Return list of PV names in request file."""
+    if not str(req_file).endswith(".req"):
+        raise RuntimeError("Save-restore: Error. File must end with .req")
+    pv_list = []
+    try:
+        with open(req_file, "r") as file:
+            lines = file.readlines()
+    except Exception:
+        raise RuntimeError("Save-restore: Failed to read save request file")
+    for lin in lines:
+        pvname = lin.replace("\n", "").replace("\r", "").replace(" ", "")
+        if pvname == "" or pvname[0] == "#":
+            continue
+        if _PVNAME_REGEX.fullmatch(pvname):
+            pv_list.append(pvname)
+        else:
+            strf = "Save-restore: Invalid name for PV {}"
+            print(strf.format(pvname))
+    return pv_list
 
 
 def restore_after_delay(req_file, pv_prefix="", save_location="", delay=10.0):
@@ -26,143 +54,210 @@ def restore_after_delay(req_file, pv_prefix="", save_location="", delay=10.0):
 
 
 def restore_pvs(req_file, pv_prefix="", save_location=""):
-    """."""
-    if not str(req_file).endswith(".req"):
-        raise RuntimeError("Save-restore: Error. File must end with .req")
-    filename = _basename(req_file.rstrip(".req"))
-    if save_location != "":
-        save_location = save_location.rstrip("/")
-        save_location = save_location.rstrip("\\")
-
-    # find most recent save file
-    max_timestamp = _date.min
-    save_file = ""
-    for f_name in glob.glob(save_location + "/" + filename + "*" + ".sav*"):
-        canditate_file = _basename(f_name)
-        # search_res = re.search(filename+'__(.*)__*', canditate_file)
-        # timestamp_str = search_res.group(1)
-        timestamp_str = canditate_file.split("__")[1]
-        timestamp = _date.strptime(timestamp_str, _TIMESTAMP_FORMAT)
-        if timestamp > max_timestamp:
-            save_file = f_name
-    if save_file != "":
-        with open(save_file, "r") as file:
-            lines = file.readlines()
-            for lin in lines:
-                try:
-                    if lin == "":
-                        continue
-                    if lin[0] == "#":
-                        continue
-                    l_str = lin.replace("\n", "").replace("\r", "")
-                    l_data = l_str.split(" ")
-                    pv_name = l_data[0]
-                    pv_val = l_data[1]
-                    if bool(re.fullmatch(r"[a-zA-Z0-9:_-]*", pv_name)):
-                        _caput(pv_prefix + pv_name, pv_val)
-                except Exception:
-                    strf = "Save-restore: Failed to restore PV {}"
-                    print(strf.format(pv_prefix + pv_name))
-    else:
+    """Restore PVs from most recent snapshot with a batched put."""
+    name = _request_name(req_file)
+    save_file = _SnapshotIndex(save_location, name).latest()
+    if save_file is None:
         print("Save-restore: No file found for restoration")
+        return
+    values = read_save_file(save_file)
+    if not values:
+        return
+    pvnames = [pv_prefix + pvname for pvname in values]
+    status = _caput_many(pvnames, list(values.values()), wait="all")
+    for pvname, stat in zip(pvnames, status):
+        if stat != 1:
+            print("Save-restore: Failed to restore PV {}".format(pvname))
 
 
-def save_monitor_with_delay(
-    req_file,
-    pv_prefix="",
-    save_location="",
-    period=10.0,
-    num_backup_files=10,
-    delay=10.0,
-):
-    """."""
-    _sleep(delay)
-    save_monitor(req_file, pv_prefix, save_location, period, num_backup_files)
+def read_save_file(save_file):
+    """Return dict of PV values saved in snapshot file."""
+    values = dict()
+    with open(save_file, "r") as file:
+        lines = file.readlines()
+    for lin in lines:
+        l_str = lin.replace("\n", "").replace("\r", "")
+        if l_str == "" or l_str[0] == "#":
+            continue
+        pvname, _, value = l_str.partition(" ")
+        if not _PVNAME_REGEX.fullmatch(pvname):
+            continue
+        values[pvname] = _decode_value(value)
+    return values
 
 
-def save_monitor(
-    req_file, pv_prefix="", save_location="", period=10.0, num_backup_files=10
-):
-    """."""
-    if not str(req_file).endswith(".req"):
-        print("Save-restore: Error. File must end with .req")
-        sys.exit()
-    _now = _date.now().strftime(_TIMESTAMP_FORMAT)
-    filename = _basename(req_file.rstrip(".req"))
-    if save_location != "":
-        save_location = save_location.rstrip("/")
-        save_location = save_location.rstrip("\\")
-        save_location = save_location + "/"
-
-    # remove oldest file if backup count exceeded
-    save_list = sorted(glob.glob(save_location + filename + "*" + ".sav*"))
-    if len(save_list) >= num_backup_files:
-        _remove(save_list[0])
-
-    # define new save file name
-    save_file = save_location + filename.rstrip(".req") + "__" + _now + "__.sav"
-    backup_file = save_file.rstrip(".sav") + "_Backup.sav"
-    eid = threading.Event()
-    pv_list = []
+class AutosaveEngine:
+    """Save PV values of a pcaspy driver whenever they change.
 
-    # read request file
-    try:
-        with open(req_file, "r") as file:
-            lines = file.readlines()
-            for lin in lines:
-                if lin == "":
-                    continue
-                if lin[0] == "#":
-                    continue
-                pvname = lin.replace("\n", "").replace("\r", "").replace(" ", "")
-                if bool(re.fullmatch(r"[a-zA-Z0-9:_-]*", pvname)):
-                    pv_list.append(pvname)
-                else:
-                    strf = "Save-restore: Invalid name for PV {}"
-                    print(strf.format(pvname))
-    except Exception:
-        raise RuntimeError("Save-restore: Failed to read save request file")
+    Values are read from the driver parameter store, so saving does not
+    go through Channel Access. A new snapshot is only written when some
+    value differs from the last snapshot; files are written to a temporary
+    file and renamed, so a snapshot is never left partially written.
+    """
+
+    def __init__(
+        self,
+        driver,
+        req_file,
+        save_location="",
+        period=10.0,
+        num_backup_files=10,
+    ):
+        """."""
+        self.driver = driver
+        self.pv_list = read_request_file(req_file)
+        self.period = period
+        self.name = _request_name(req_file)
+        self._index = _SnapshotIndex(
+            save_location, self.name, num_backup_files)
+        self._last_values = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self):
+        """Return dict of current PV values in the driver."""
+        values = dict()
+        for pvname in self.pv_list:
+            try:
+                values[pvname] = self.driver.getParam(pvname)
+            except Exception:
+                strf = "Save-restore: Failed to read PV {}"
+                print(strf.format(pvname))
+        return values
+
+    def save(self, force=False):
+        """Write a new snapshot if PV values changed.
+
+        Returns True if a snapshot was written.
+        """
+        values = self.snapshot()
+        if not force and values == self._last_values:
+            return False
+        lines = [
+            pvname + " " + _encode_value(value) + "\n"
+            for pvname, value in values.items()
+        ]
+        self._index.add("".join(lines))
+        self._last_values = values
+        return True
+
+    def monitor(self, delay=0.0):
+        """Save PV values periodically until stopped."""
+        if self._stop.wait(delay):
+            return
+        while True:
+            try:
+                self.save()
+            except Exception:
+                print("Save-restore: Error while trying to update save file")
+            if self._stop.wait(self.period):
+                return
+
+    def start(self, delay=0.0):
+        """Start monitoring thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.monitor, args=(delay, ), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop monitoring thread, saving pending changes."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
+
+
+class _SnapshotIndex:
+    """Snapshot files of a request and their index file."""
+
+    def __init__(self, save_location, name, num_backup_files=10):
+        self.save_location = save_location
+        self.name = name
+        self.num_backup_files = num_backup_files
+        self.index_file = _join(save_location, name + ".idx")
+        self._lock = threading.Lock()
+
+    def latest(self):
+        """Return path of most recent snapshot or None."""
+        files = self._load()
+        return _join(self.save_location, files[-1]) if files else None
+
+    def add(self, content):
+        """Write new snapshot file and update the index."""
+        with self._lock:
+            _os.makedirs(self.save_location or ".", exist_ok=True)
+            _now = _date.now().strftime(_TIMESTAMP_FORMAT)
+            fname = self.name + "__" + _now + "__.sav"
+            _write_atomic(_join(self.save_location, fname), content)
+            files = [f for f in self._load() if f != fname] + [fname]
+            # remove oldest files if backup count exceeded
+            while len(files) > self.num_backup_files:
+                self._remove(files.pop(0))
+            _write_atomic(self.index_file, _json.dumps(files, indent=0))
 
-    # create save file
+    def _load(self):
+        """Return list of existing snapshot file names, oldest first."""
+        try:
+            with open(self.index_file, "r") as file:
+                files = _json.load(file)
+        except (OSError, ValueError):
+            # no index yet, find files written by previous versions
+            files = self._scan()
+        return [
+            fname for fname in files
+            if _os.path.isfile(_join(self.save_location, fname))]
+
+    def _scan(self):
+        pattern = _join(self.save_location, self.name + "__*__.sav")
+        stamped = []
+        for f_name in glob.glob(pattern):
+            fname = _basename(f_name)
+            try:
+                timestamp = _date.strptime(
+                    fname.split("__")[1], _TIMESTAMP_FORMAT)
+            except (IndexError, ValueError):
+                continue
+            stamped.append((timestamp, fname))
+        return [fname for _, fname in sorted(stamped)]
+
+    def _remove(self, fname):
+        try:
+            _os.remove(_join(self.save_location, fname))
+        except OSError:
+            strf = "Save-restore: Failed to remove file {}"
+            print(strf.format(fname))
+
+
+def _request_name(req_file):
+    return _splitext(_basename(req_file))[0]
+
+
+def _write_atomic(path, content):
+    """Write file contents to temporary file and rename it."""
+    dirname = _os.path.dirname(path) or "."
+    fd, tmp_path = _tempfile.mkstemp(dir=dirname, suffix=".tmp")
     try:
-        _os.makedirs(save_location, exist_ok=True)
-        with open(save_file, "w+") as file:
-            for pvname in pv_list:
-                try:
-                    pv_val = _caget(pv_prefix + pvname, as_string=True)
-                    file.write(pvname + " " + pv_val + "\n")
-                except Exception:
-                    strf = "Save-restore: Failed to save PV {}"
-                    print(strf.format(pv_prefix + pvname))
+        with _os.fdopen(fd, "w") as file:
+            file.write(content)
+            file.flush()
+            _os.fsync(file.fileno())
+        _os.replace(tmp_path, path)
     except Exception:
-        raise RuntimeError("Save-restore: Failed to create save file")
+        _os.remove(tmp_path)
+        raise
 
-    # update save file periodically
-    while True:
-        eid.wait(period)
-        try:
-            # if backup file exists, keep it for now
-            # otherwise, create backup
-            if not _exists(backup_file):
-                shutil.copyfile(save_file, backup_file)
-            # save PVs from list
-            all_pvs_updated = True
-            with open(save_file, "w+") as file:
-                for pvname in pv_list:
-                    try:
-                        pv_val = _caget(
-                            pv_prefix + pvname, as_string=True, use_monitor=False
-                        )
-                    except Exception:
-                        all_pvs_updated = False
-                        strf = "Save-restore: Failed to caget PV {}"
-                        print(strf.format(pv_prefix + pvname))
-                    else:
-                        # write pv value to file
-                        file.write(pvname + " " + pv_val + "\n")
-            # erase backup file if save file
-            # is fully up-to-date
-            if _exists(backup_file) and all_pvs_updated:
-                _remove(backup_file)
-        except Exception:
-            print("Save-restore: Error while trying to update save file")
+
+def _encode_value(value):
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    return _json.dumps(value)
+
+
+def _decode_value(value):
+    # files written by previous versions hold values as CA strings
+    try:
+        return _json.loads(value)
+    except ValueError:
+        return value
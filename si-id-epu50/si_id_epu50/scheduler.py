@@ -0,0 +1,187 @@
+"""Bus scheduler module.
+
+The RS485 bridge and the GPIO server are each reached through a single TCP
+link, so transactions on a link must be serialized. The scheduler grants the
+link to waiting threads by priority instead of arrival order, coalesces
+identical background requests and keeps wait/hold time statistics.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+# request priorities (lower value is served first)
+PRIO_MOTION = 0  # motion-critical reads and stop commands
+PRIO_COMMAND = 1  # operator commands and set point checks
+PRIO_POLL = 2  # background polling
+PRIORITIES = (PRIO_MOTION, PRIO_COMMAND, PRIO_POLL)
+PRIORITY_NAMES = ("Motion", "Command", "Poll")
+
+
+class _TimeStats:
+    """Accumulate count, mean and max of time intervals."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Reset accumulators."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """Add interval [s]."""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        """Mean interval [s]."""
+        return self.total / self.count if self.count else 0.0
+
+
+class _Pending:
+    """Result holder shared by coalesced requests."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BusScheduler:
+    """Reentrant priority lock for a shared communication link.
+
+    Usage:
+        with bus.request(PRIO_MOTION):
+            ...  # exclusive access to the link
+
+    A thread that already owns the link may request it again (the nested
+    request keeps the outer priority), so lower level methods can protect
+    single transactions while callers hold the link across a sequence of
+    transactions that depend on each other.
+    """
+
+    def __init__(self, name="bus"):
+        """."""
+        self.name = name
+        self._cond = threading.Condition(threading.Lock())
+        self._waiting = []
+        self._counter = itertools.count()
+        self._owner = None
+        self._depth = 0
+        self._owner_priority = None
+        self._acquired_at = 0.0
+        self._wait_stats = {prio: _TimeStats() for prio in PRIORITIES}
+        self._hold_stats = {prio: _TimeStats() for prio in PRIORITIES}
+        self._pending = dict()
+        self._pending_lock = threading.Lock()
+        # drive currently addressed on the link (used by RS485 clients)
+        self.selected_address = None
+
+    @property
+    def queue_length(self):
+        """Number of threads waiting for the link."""
+        return len(self._waiting)
+
+    def acquire(self, priority=PRIO_COMMAND):
+        """Acquire the link, waiting behind higher priority requests."""
+        ident = threading.get_ident()
+        with self._cond:
+            if self._owner == ident:
+                self._depth += 1
+                return
+            t0_ = time.monotonic()
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            while self._owner is not None or self._waiting[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._owner = ident
+            self._depth = 1
+            self._owner_priority = priority
+            self._acquired_at = time.monotonic()
+            self._wait_stats[priority].add(self._acquired_at - t0_)
+
+    def release(self):
+        """Release the link."""
+        with self._cond:
+            if self._owner != threading.get_ident():
+                raise RuntimeError(f"{self.name}: release of unowned link.")
+            self._depth -= 1
+            if self._depth:
+                return
+            self._hold_stats[self._owner_priority].add(
+                time.monotonic() - self._acquired_at)
+            self._owner = None
+            self._owner_priority = None
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self, priority=PRIO_COMMAND):
+        """Context manager for exclusive access to the link."""
+        self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def coalesce(self, key, func, *args, **kwargs):
+        """Run func once for concurrent requests sharing the same key.
+
+        Requests arriving while a request with the same key is in progress
+        do not touch the link; they wait and receive the same result.
+        """
+        with self._pending_lock:
+            entry = self._pending.get(key)
+            leader = entry is None
+            if leader:
+                entry = _Pending()
+                self._pending[key] = entry
+
+        if not leader:
+            entry.done.wait()
+            if entry.error is not None:
+                raise entry.error
+            return entry.result
+
+        try:
+            entry.result = func(*args, **kwargs)
+            return entry.result
+        except Exception as err:
+            entry.error = err
+            raise
+        finally:
+            with self._pending_lock:
+                del self._pending[key]
+            entry.done.set()
+
+    def get_stats(self, reset=False):
+        """Return wait and hold time statistics per priority.
+
+        Returns a dict with lists indexed by priority, times in [ms]:
+            wait_mean, wait_max, hold_mean, hold_max, count.
+        """
+        with self._cond:
+            stats = {
+                "wait_mean": [
+                    1e3 * self._wait_stats[p].mean for p in PRIORITIES],
+                "wait_max": [
+                    1e3 * self._wait_stats[p].max for p in PRIORITIES],
+                "hold_mean": [
+                    1e3 * self._hold_stats[p].mean for p in PRIORITIES],
+                "hold_max": [
+                    1e3 * self._hold_stats[p].max for p in PRIORITIES],
+                "count": [self._wait_stats[p].count for p in PRIORITIES],
+                "queue_length": len(self._waiting),
+            }
+            if reset:
+                for prio in PRIORITIES:
+                    self._wait_stats[prio].reset()
+                    self._hold_stats[prio].reset()
+        return stats
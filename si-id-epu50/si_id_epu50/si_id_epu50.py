@@ -1,9 +1,10 @@
 """Main IOC module."""
 
+import argparse as _argparse
 import sys
 import os
 import traceback
-from threading import Thread as _Thread
+from threading import Event as _Event, Thread as _Thread
 import pcaspy
 
 from . import constants as _cte
@@ -12,55 +13,109 @@ from . import csdev as _csdev
 from . import save_restore as _save_restore
 
 
-def run(args):
-    """."""
-    # create CA server
-    server = pcaspy.SimpleServer()
+def device_args(args):
+    """Return arguments of each device served by the IOC.
 
-    # config access security
-    server.initAccessSecurityFile(
-        _cte.access_security_filename, PREFIX=args.pv_prefix)
+    Devices are given as 'PV_PREFIX,BBB_ADDR[,MSG_PORT,IO_PORT]' strings in
+    args.devices. Without them the IOC serves the single device described
+    by args. The first device keeps the autosave directory and recorder
+    file of args, so single device installs keep their files, and those
+    of extra devices are kept apart.
+    """
+    devices = getattr(args, "devices", None)
+    if not devices:
+        return [args]
+    dev_args = []
+    for idx, spec in enumerate(devices):
+        fields = spec.split(",")
+        if len(fields) not in (2, 4):
+            raise ValueError(f"Invalid device specification {spec!r}.")
+        dev = _argparse.Namespace(**vars(args))
+        dev.pv_prefix, dev.beaglebone_addr = fields[:2]
+        if len(fields) == 4:
+            dev.msg_port, dev.io_port = int(fields[2]), int(fields[3])
+        if not idx:
+            dev_args.append(dev)
+            continue
+        name = dev.pv_prefix.strip(":").replace(":", "_")
+        dev.autosave_dir = os.path.join(args.autosave_dir, name)
+        os.makedirs(dev.autosave_dir, exist_ok=True)
+        if getattr(args, "recorder_file", None):
+            root, ext = os.path.splitext(args.recorder_file)
+            dev.recorder_file = f"{root}_{name}{ext}"
+        dev_args.append(dev)
+    return dev_args
 
-    # instantiate PV database
+
+def create_device(server, args, processing):
+    """Create PVs of a device and return the thread that starts it.
+
+    The thread starts when the caller starts it, once the PVs of all
+    devices exist.
+    """
+    # each device is served by its own driver, under its own port
     idname = args.pv_prefix
     pvdb = _csdev.get_pvdb(idname)
+    for pvinfo in pvdb.values():
+        pvinfo["port"] = idname
     server.createPV(idname, pvdb)
+    return _Thread(
+        target=start_device, args=(args, idname, processing), daemon=True)
+
 
+def start_device(args, port, processing):
+    """Create driver of a device, restore its PVs and start its autosave.
+
+    The driver connects the links of the device, retrying until the bridge
+    answers, so each device is started in its own thread and an unreachable
+    one does not keep the others from being served. Saved values are
+    restored through CA, so only once the CA server is processing.
+    """
     # create pcaspy driver
-    driver = _iocDriver.EPUSupport(args)
+    driver = _iocDriver.EPUSupport(args, port=port)
+    processing.wait()
 
     # restore saved PV values
-    restore = _Thread(
-        target=_save_restore.restore_after_delay,
-        args=(
-            args.autosave_request_file,  # request file name
-            args.pv_prefix,  # pv prefix
-            args.autosave_dir,  # save directory
-            5.0,  # delay before restoring
-        ),
-        daemon=True,
+    _save_restore.restore_pvs(
+        args.autosave_request_file,  # request file name
+        args.pv_prefix,  # pv prefix
+        args.autosave_dir,  # save directory
     )
-    restore.start()
 
     # start autosave
-    autosave = _Thread(
-        target=_save_restore.save_monitor_with_delay,
-        args=(
-            args.autosave_request_file,  # request file name
-            args.pv_prefix,  # pv prefix
-            args.autosave_dir,  # save directory
-            _cte.autosave_update_rate,  # save update period
-            _cte.autosave_num_backup_files,  # max number of backup files
-            10.0,  # delay before monitoring start
-        ),
-        daemon=True,
+    autosave = _save_restore.AutosaveEngine(
+        driver,
+        args.autosave_request_file,  # request file name
+        args.autosave_dir,  # save directory
+        _cte.autosave_update_rate,  # save update period
+        _cte.autosave_num_backup_files,  # max number of backup files
     )
-    autosave.start()
+    autosave.start(delay=5.0)  # delay before monitoring start
+
+
+def run(args):
+    """."""
+    dev_args = device_args(args)
+
+    # create CA server
+    server = pcaspy.SimpleServer()
+
+    # config access security
+    server.initAccessSecurityFile(
+        _cte.access_security_filename, PREFIX=dev_args[0].pv_prefix)
+
+    # devices are started concurrently, each with its own links, while the
+    # server is processing
+    processing = _Event()
+    threads = [create_device(server, dev, processing) for dev in dev_args]
+    for thread in threads:
+        thread.start()
 
     while True:
         try:
             # process CA transactions
             server.process(_cte.ca_process_rate)
+            processing.set()
         except Exception:
             traceback.print_exc(file=sys.stdout)
             os._exit(0)
@@ -0,0 +1,382 @@
+"""EPU50 bridge simulator.
+
+Emulates the BeagleBone bridge of the EPU50: the RS485 link to the four
+EcoDrive controllers (ASCII protocol) and the GPIO server (BSMP protocol),
+each on its own TCP port. Drive positions follow simple trapezoidal motion
+dynamics. Response delays and dropped bytes can be injected to exercise
+the IOC timing and error paths without the undulator.
+
+Run with:
+    python -m si_id_epu50.simulator [--delay 0.01] [--drop-rate 0.001]
+"""
+
+import argparse
+import logging
+import random
+import socketserver
+import threading
+import time
+
+from . import constants as _cte
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+# BSMP answer to a successful write
+_BSMP_OK = 0xE0
+_BSMP_READ_ANSWER = 0x11
+
+
+class SimulatedDrive:
+    """EcoDrive controller model."""
+
+    def __init__(self, address, axis, position=0.0, max_velocity=300.0):
+        """."""
+        self.address = address
+        self.axis = axis
+        self.position = position
+        self.target_position = position
+        self.max_velocity = max_velocity  # [mm/min]
+        self.velocity = 0.0  # [mm/s]
+        self.moving = False
+        self.enabled = False
+        self.halt_released = False
+        self._write_param = None
+
+    @property
+    def diag_code(self):
+        """Diagnostic code of the drive state."""
+        if not self.enabled:
+            return "A012"
+        return "A211" if self.halt_released else "A010"
+
+    @property
+    def target_reached(self):
+        """Target position reached."""
+        return not self.moving and \
+            abs(self.position - self.target_position) < 1e-6
+
+    def start(self):
+        """Start motion to target position."""
+        if self.diag_code == "A211":
+            self.moving = True
+
+    def stop(self):
+        """Stop motion."""
+        self.moving = False
+        self.velocity = 0.0
+
+    def step(self, dtime, accel):
+        """Advance motion by dtime [s] with acceleration accel [mm/s²]."""
+        if not self.moving:
+            return
+        if self.diag_code != "A211":
+            self.stop()
+            return
+        dist = self.target_position - self.position
+        vmax = self.max_velocity / 60
+        # decelerate to stop at target
+        vmax = min(vmax, (2 * accel * abs(dist)) ** 0.5)
+        speed = min(abs(self.velocity) + accel * dtime, vmax)
+        delta = speed * dtime
+        if delta >= abs(dist):
+            self.position = self.target_position
+            self.stop()
+            return
+        self.velocity = speed if dist > 0 else -speed
+        self.position += self.velocity * dtime
+
+    def read(self, param):
+        """Return data of parameter, or None if unknown."""
+        if param in ("S-0-0051", "S-0-0053"):
+            return f"{self.position:.4f}"
+        if param == "P-0-4006":
+            return f"{self.target_position:.4f}"
+        if param == "P-0-4007":
+            return f"{self.max_velocity:.4f}"
+        if param == "S-0-0390":
+            return self.diag_code + "h"
+        if param == "S-0-0134":
+            return f"0{int(self.enabled)}{int(self.halt_released)}" + \
+                "0" * 13 + "b"
+        if param == "S-0-0013":
+            return f"0{int(self.target_reached)}" + "0" * 14 + "b"
+        if param in ("S-0-0014", "S-0-0099"):
+            return "0" * 16 + "b"
+        if param == "S-0-0095":
+            return "A211 Ready for operation"
+        return None
+
+    def write(self, param, value):
+        """Write parameter, return False if it is not accepted."""
+        try:
+            value = float(value)
+        except ValueError:
+            return False
+        if param == "P-0-4006":
+            self.target_position = value
+        elif param == "P-0-4007":
+            self.max_velocity = value
+        return True
+
+
+class _Config:
+    """Fault injection settings shared by the servers."""
+
+    def __init__(self, delay=0.0, jitter=0.0, drop_rate=0.0, seed=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def distort(self, data):
+        """Delay answer and drop bytes from it."""
+        with self.lock:
+            delay = self.delay + self.jitter * self.random.random()
+            if self.drop_rate:
+                data = bytes(
+                    byte for byte in data
+                    if self.random.random() >= self.drop_rate)
+        if delay > 0:
+            time.sleep(delay)
+        return data
+
+
+class _SerialHandler(socketserver.BaseRequestHandler):
+    """RS485 bridge connection handler."""
+
+    def handle(self):
+        sim = self.server.simulator
+        buffer = b""
+        selected = None
+        while True:
+            data = self.request.recv(1024)
+            if not data:
+                return
+            buffer += data
+            while b"\r" in buffer:
+                line, buffer = buffer.split(b"\r", 1)
+                message = line.decode(errors="ignore")
+                selected, answer = sim.serial_answer(selected, message)
+                if answer is not None:
+                    self.request.sendall(
+                        sim.config.distort(answer.encode()))
+
+
+class _GPIOHandler(socketserver.BaseRequestHandler):
+    """GPIO server connection handler."""
+
+    def handle(self):
+        sim = self.server.simulator
+        while True:
+            data = self.request.recv(64)
+            if not data:
+                return
+            # messages are built as chr strings and sent UTF-8 encoded
+            values = [ord(char) for char in data.decode(errors="ignore")]
+            answer = sim.gpio_answer(values)
+            if answer is not None:
+                self.request.sendall(sim.config.distort(answer))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, handler, simulator):
+        self.simulator = simulator
+        super().__init__(address, handler)
+
+
+class EpuSimulator:
+    """Simulated EPU50 bridge with RS485 and GPIO servers."""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        msg_port=_cte.RS485_TCP_DEFAULT_PORT,
+        io_port=_cte.GPIO_TCP_DEFAULT_PORT,
+        delay=0.0,
+        jitter=0.0,
+        drop_rate=0.0,
+        accel=10.0,
+        update_rate=100.0,
+        seed=None,
+    ):
+        """."""
+        self.host = host
+        self.msg_port = msg_port
+        self.io_port = io_port
+        self.config = _Config(delay, jitter, drop_rate, seed)
+        self.accel = accel  # [mm/s²]
+        self.update_rate = update_rate  # [Hz]
+        self.lock = threading.Lock()
+        self.drives = {
+            _cte.a_drive_address: SimulatedDrive(
+                _cte.a_drive_address, "gap", position=300.0),
+            _cte.b_drive_address: SimulatedDrive(
+                _cte.b_drive_address, "gap", position=300.0),
+            _cte.i_drive_address: SimulatedDrive(
+                _cte.i_drive_address, "phase"),
+            _cte.s_drive_address: SimulatedDrive(
+                _cte.s_drive_address, "phase"),
+        }
+        self.gpio = {
+            var: 0 for var in (
+                _cte.HALT_CH_AB, _cte.START_CH_AB, _cte.ENABLE_CH_AB,
+                _cte.RESET_CH_AB, _cte.HALT_CH_SI, _cte.START_CH_SI,
+                _cte.ENABLE_CH_SI, _cte.RESET_CH_SI)}
+        self._servers = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start servers and motion thread."""
+        self._stop.clear()
+        for port, handler in (
+                (self.msg_port, _SerialHandler), (self.io_port, _GPIOHandler)):
+            server = _Server((self.host, port), handler, self)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        threading.Thread(target=self._motion_loop, daemon=True).start()
+        logger.info(
+            "Simulator listening on %s:%s (RS485) and %s:%s (GPIO).",
+            self.host, self.msg_port, self.host, self.io_port)
+
+    def stop(self):
+        """Stop servers and motion thread."""
+        self._stop.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def axis_drives(self, axis):
+        """Return drives of axis ('gap' or 'phase')."""
+        return [drv for drv in self.drives.values() if drv.axis == axis]
+
+    def serial_answer(self, selected, message):
+        """Return selected drive address and answer to ASCII message."""
+        if message.startswith("BCD:"):
+            try:
+                address = int(message[4:])
+            except ValueError:
+                return selected, None
+            if address not in self.drives:
+                # no drive on the bus answers
+                return selected, None
+            return address, f"{message}\r\nE{address}>"
+
+        drive = self.drives.get(selected)
+        if drive is None:
+            return selected, None
+        prompt = f"E{drive.address}>"
+        with self.lock:
+            # second and third steps of a parameter write
+            if drive._write_param is not None:
+                if message == "<":
+                    drive._write_param = None
+                    return selected, f"{message}\r\n{prompt}"
+                if drive.write(drive._write_param, message):
+                    return selected, f"{message}\r\n?"
+                drive._write_param = None
+                return selected, f"{message}\r\n!{prompt}"
+
+            fields = message.split(",")
+            if len(fields) >= 3 and fields[2].upper() == "R":
+                data = drive.read(fields[0])
+                if data is None:
+                    data = "!"
+                return selected, f"{message}\r\n{data}\r\n{prompt}"
+            if len(fields) == 4 and fields[3] == ">":
+                drive._write_param = fields[0]
+                return selected, f"{message}\r\n?"
+            # other writes (e.g. error clearing) are acknowledged
+            return selected, f"{message}\r\n{prompt}"
+
+    def gpio_answer(self, values):
+        """Return answer to BSMP message given as a list of byte values."""
+        if len(values) < 5:
+            return None
+        command, var = values[1], values[4]
+        if var not in self.gpio:
+            return None
+        if command == _cte.BSMP_WRITE and len(values) >= 6:
+            with self.lock:
+                self._set_gpio(var, values[5])
+            answer = [0x00, _BSMP_OK, 0x00, 0x00]
+        elif command == _cte.BSMP_READ:
+            answer = [0x00, _BSMP_READ_ANSWER, 0x00, 0x01, self.gpio[var]]
+        else:
+            return None
+        return bytes(utils.include_checksum(answer))
+
+    def _set_gpio(self, var, value):
+        value = 1 if value else 0
+        self.gpio[var] = value
+        channels = {
+            "gap": (_cte.ENABLE_CH_AB, _cte.HALT_CH_AB, _cte.START_CH_AB),
+            "phase": (_cte.ENABLE_CH_SI, _cte.HALT_CH_SI, _cte.START_CH_SI),
+        }
+        for axis, (enable, halt, start) in channels.items():
+            if var not in (enable, halt, start):
+                continue
+            for drive in self.axis_drives(axis):
+                drive.enabled = bool(self.gpio[enable])
+                drive.halt_released = bool(self.gpio[halt])
+                if var == start and value:
+                    drive.start()
+
+    def _motion_loop(self):
+        period = 1 / self.update_rate
+        last = time.monotonic()
+        while not self._stop.wait(period):
+            now = time.monotonic()
+            with self.lock:
+                for drive in self.drives.values():
+                    drive.step(now - last, self.accel)
+            last = now
+
+
+def get_args():
+    """Return command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument(
+        "--drive-msg-port", dest="msg_port", type=int,
+        default=_cte.RS485_TCP_DEFAULT_PORT)
+    parser.add_argument(
+        "--drive-io-port", dest="io_port", type=int,
+        default=_cte.GPIO_TCP_DEFAULT_PORT)
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="answer delay [s]")
+    parser.add_argument(
+        "--jitter", type=float, default=0.0,
+        help="maximum random extra answer delay [s]")
+    parser.add_argument(
+        "--drop-rate", dest="drop_rate", type=float, default=0.0,
+        help="probability of dropping each answer byte")
+    parser.add_argument(
+        "--accel", type=float, default=10.0, help="acceleration [mm/s²]")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def main():
+    """Run simulator until interrupted."""
+    args = get_args()
+    logging.basicConfig(level=logging.INFO)
+    sim = EpuSimulator(
+        host=args.host, msg_port=args.msg_port, io_port=args.io_port,
+        delay=args.delay, jitter=args.jitter, drop_rate=args.drop_rate,
+        accel=args.accel, seed=args.seed)
+    sim.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,10 @@ class DriveCOMError(Exception):
     "Raised when the drive does not respond as expected to a command."
 
 
+class ParameterParseError(ValueError):
+    "Raised when a drive parameter reply cannot be parsed."
+
+
 def run_periodically_in_detached_thread(interval):
     """
     Decorator to run a function periodically in a separate thread detached from terminal.